@@ -0,0 +1,188 @@
+'''
+    Headless benchmark of FlowLayout.
+
+    For every requested item count the window of main.py is filled with that many generated
+    buttons and resized through a sweep of widths. By default the window sits in a
+    resizable QScrollArea, which (like any parent layout would) asks the flow layout for
+    heightForWidth as well as setting its geometry.
+
+    Reported per item count (one JSON object per line):
+      - the time per resize step (event processing included),
+      - the number of calls to and the time spent in FlowLayout.setGeometry and
+        FlowLayout.heightForWidth,
+      - the number of sizeHint calls of the buttons and of QStyle.layoutSpacing calls,
+        in total and per layout pass.
+
+        python benchmark.py --items 100 --items 1000 --items 5000
+        python benchmark.py --items 5000 --profile flow.prof
+'''
+
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import cProfile
+import json
+import random
+import string
+import sys
+import time
+
+from PyQt5.QtWidgets import QApplication, QProxyStyle, QPushButton, QScrollArea
+
+import flow_layout
+import main
+
+DEFAULT_ITEMS = (100, 1000, 3000)
+
+
+class Counters(object):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.size_hint = 0
+        self.layout_spacing = 0
+        self.set_geometry = 0
+        self.set_geometry_s = 0.0
+        self.height_for_width = 0
+        self.height_for_width_s = 0.0
+
+counters = Counters()
+
+
+class CountingButton(QPushButton):
+    def sizeHint(self):
+        counters.size_hint += 1
+        return QPushButton.sizeHint(self)
+
+
+class CountingStyle(QProxyStyle):
+    def layoutSpacing(self, control1, control2, orientation, option=None, widget=None):
+        counters.layout_spacing += 1
+        return QProxyStyle.layoutSpacing(self, control1, control2, orientation, option, widget)
+
+
+def _instrument():
+    ''' Wraps the FlowLayout entry points that Qt calls to count and time them. '''
+    set_geometry = flow_layout.FlowLayout.setGeometry
+    height_for_width = flow_layout.FlowLayout.heightForWidth
+
+    def timedSetGeometry(self, rect):
+        start = time.perf_counter()
+        set_geometry(self, rect)
+        counters.set_geometry += 1
+        counters.set_geometry_s += time.perf_counter() - start
+
+    def timedHeightForWidth(self, width):
+        start = time.perf_counter()
+        height = height_for_width(self, width)
+        counters.height_for_width += 1
+        counters.height_for_width_s += time.perf_counter() - start
+        return height
+
+    flow_layout.FlowLayout.setGeometry = timedSetGeometry
+    flow_layout.FlowLayout.heightForWidth = timedHeightForWidth
+
+
+def sweepWidths(lo, hi, step):
+    up = list(range(lo, hi + 1, step))
+    return up + up[-2::-1]
+
+
+def runItems(app, count, widths, use_scroll_area, height=600):
+    rng = random.Random(count)
+    window = main.Window()
+    layout = window.layout()
+    for _ in range(count):
+        text = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 15)))
+        layout.addWidget(CountingButton(text))
+
+    if use_scroll_area:
+        top = QScrollArea()
+        top.setWidgetResizable(True)
+        top.setWidget(window)
+    else:
+        top = window
+    top.resize(widths[0], height)
+    top.show()
+
+    start = time.perf_counter()
+    app.processEvents()
+    first_s = time.perf_counter() - start
+
+    counters.reset()
+    steps = []
+    for width in widths:
+        start = time.perf_counter()
+        top.resize(width, height)
+        app.processEvents()
+        steps.append(time.perf_counter() - start)
+
+    passes = max(counters.set_geometry, 1)
+    steps.sort()
+    result = {
+        'items': count,
+        'steps': len(widths),
+        'first_layout_s': first_s,
+        'step_ms': {'mean': 1000 * sum(steps) / len(steps),
+                    'median': 1000 * steps[len(steps) // 2],
+                    'max': 1000 * steps[-1]},
+        'set_geometry': {'calls': counters.set_geometry,
+                         'mean_ms': 1000 * counters.set_geometry_s / passes},
+        'height_for_width': {'calls': counters.height_for_width,
+                             'mean_ms': 1000 * counters.height_for_width_s /
+                                        max(counters.height_for_width, 1)},
+        'size_hint_calls': counters.size_hint,
+        'layout_spacing_calls': counters.layout_spacing,
+        'size_hint_per_pass': counters.size_hint / passes,
+        'layout_spacing_per_pass': counters.layout_spacing / passes,
+    }
+
+    top.close()
+    top.deleteLater()
+    app.processEvents()
+    return result
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--items', type=int, action='append', default=[],
+                        help="Number of buttons (can be given several times)")
+    parser.add_argument('--min-width', type=int, default=300)
+    parser.add_argument('--max-width', type=int, default=1500)
+    parser.add_argument('--step', type=int, default=50, help="Width change per resize step")
+    parser.add_argument('--no-scroll-area', action='store_true',
+                        help="Resize the window itself instead of a scroll area around it")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="Write cProfile statistics of the last item count to FILE")
+    parser.add_argument('-o', '--output', help="Append the results to this file")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication([])
+    app.setStyle(CountingStyle())
+    _instrument()
+
+    widths = sweepWidths(args.min_width, args.max_width, args.step)
+    counts = args.items or DEFAULT_ITEMS
+    for idx, count in enumerate(counts):
+        profiler = None
+        if args.profile and idx == len(counts) - 1:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        result = runItems(app, count, widths, not args.no_scroll_area)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+
+        line = json.dumps(result)
+        if args.output:
+            with open(args.output, 'a') as fp:
+                fp.write(line + '\n')
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -1,10 +1,62 @@
 # Ported from the C++ implementation found here:
 #  https://doc.qt.io/qt-5/qtwidgets-layouts-flowlayout-example.html
 
+from bisect import bisect_right
+
 from PyQt5.QtWidgets import QLayout, QStyle, QLayoutItem, QSizePolicy
 from PyQt5.QtCore import Qt, QPoint, QRect, QSize
 
+
+def flowItems(sizes, spacings, left, right, y, start=0):
+    '''
+        The wrapping rule of FlowLayout, shared with anything else that lays out items the
+        same way. 'sizes' holds the (width, height) and 'spacings' the (horizontal,
+        vertical) spacing of every item. The items from 'start' on are placed in rows
+        between 'left' and 'right', beginning with a new row at 'y'.
+
+        Returns (positions, rows, bottom): the (x, y) of every placed item, one
+        (first item, y, height) tuple per row and the bottom of the last row.
+    '''
+    positions = []
+    rows = []
+    x = left
+    line_height = 0
+    row_first = start
+    row_y = y
+
+    for idx in range(start, len(sizes)):
+        width, height = sizes[idx]
+        space_x, space_y = spacings[idx]
+        next_x = x + width + space_x
+        if next_x - space_x > right and line_height > 0:
+            rows.append((row_first, row_y, line_height))
+            x = left
+            y = y + line_height + space_y
+            next_x = x + width + space_x
+            line_height = 0
+            row_first = idx
+            row_y = y
+
+        positions.append((x, y))
+        x = next_x
+        line_height = max(line_height, height)
+
+    if start < len(sizes):
+        rows.append((row_first, row_y, line_height))
+    return positions, rows, y + line_height
+
+
 class FlowLayout(QLayout):
+    '''
+        Arranges its items left to right, wrapping to a new row when the next one doesn't
+        fit.
+
+        The size hint and spacing of every item are cached and only queried again after the
+        layout was invalidated (which Qt does when a child changes its size hint) or the
+        item was added. The positions of the last layout pass are kept as well, so a pass
+        for the same width only re-flows from the first row that holds a changed item, and
+        the results of heightForWidth are memoized per width.
+    '''
 
     def __init__(self, parent=None, margin=-1, h_spacing=-1, v_spacing=-1):
         QLayout.__init__(self, parent)
@@ -14,6 +66,23 @@ class FlowLayout(QLayout):
 
         self._item_list = []
 
+        # Per item (width, height) of the size hint and (horizontal, vertical) spacing. None
+        # for items that were added since the cache was last filled.
+        self._sizes = []
+        self._spacings = []
+        self._hints_stale = True
+        # Index of the first item whose position may have changed since the last pass.
+        self._dirty_from = 0
+        self._min_size = None
+        self._height_for_width = {}
+
+        # Result of the last layout pass.
+        self._flow_key = None
+        self._positions = []
+        self._rows = []
+        self._flow_bottom = 0
+        self._applied = []
+
         self.setContentsMargins(margin, margin, margin, margin)
 
     # Do we need to delete the items in the widget on deletion?
@@ -24,6 +93,9 @@ class FlowLayout(QLayout):
 
     def addItem(self, item):
         self._item_list.append(item)
+        self._sizes.append(None)
+        self._spacings.append(None)
+        self._itemsChanged(len(self._item_list) - 1)
 
     def horizontalSpacing(self):
         if self._h_space >= 0:
@@ -56,14 +128,25 @@ class FlowLayout(QLayout):
         except IndexError:
             return None
 
+    def invalidate(self):
+        # Called by Qt when the size hint of a child (or the style) changed. Which item
+        # changed isn't known, so all hints are queried again on the next pass and the
+        # re-flow starts at the first one that actually differs.
+        self._hints_stale = True
+        self._min_size = None
+        self._height_for_width.clear()
+        super().invalidate()
+
     def minimumsize(self):
-        size = QSize()
-        for item in self._item_list:
-            size = size.expandedTo(item.minimumSize())
+        if self._min_size is None:
+            size = QSize()
+            for item in self._item_list:
+                size = size.expandedTo(item.minimumSize())
 
-        margins = self.contentsMargins()
-        size += QSize(margins.left() + margins.right(), margins.top() + margins.bottom())
-        return size
+            margins = self.contentsMargins()
+            size += QSize(margins.left() + margins.right(), margins.top() + margins.bottom())
+            self._min_size = size
+        return QSize(self._min_size)
 
     def setGeometry(self, rect):
         super().setGeometry(rect)
@@ -74,42 +157,121 @@ class FlowLayout(QLayout):
 
     def takeAt(self, idx):
         if idx >= 0 and idx < self.count():
+            del self._sizes[idx]
+            del self._spacings[idx]
+            del self._applied[idx:idx + 1]
+            self._itemsChanged(idx)
             return self._item_list.pop(idx)
         return None
 
+    def _itemsChanged(self, idx):
+        self._dirty_from = min(self._dirty_from, idx)
+        self._min_size = None
+        self._height_for_width.clear()
+
+    def _itemSpacing(self, item, default, orientation):
+        if default != -1:
+            return default
+        widget = item.widget()
+        if widget is None:
+            return 0
+        return widget.style().layoutSpacing(widget.sizePolicy(), widget.sizePolicy(),
+                                            orientation)
+
+    def _updateHints(self):
+        ''' Fills the size hint and spacing caches where needed. '''
+        if self._hints_stale:
+            space_x = self.horizontalSpacing()
+            space_y = self.verticalSpacing()
+            old_sizes = self._sizes
+            old_spacings = self._spacings
+            self._sizes = [None] * len(self._item_list)
+            self._spacings = [None] * len(self._item_list)
+        elif None not in self._sizes:
+            return
+        else:
+            space_x = self.horizontalSpacing()
+            space_y = self.verticalSpacing()
+            old_sizes = old_spacings = None
+
+        first_changed = len(self._item_list)
+        for idx, item in enumerate(self._item_list):
+            if self._sizes[idx] is not None:
+                continue
+            hint = item.sizeHint()
+            self._sizes[idx] = (hint.width(), hint.height())
+            self._spacings[idx] = (self._itemSpacing(item, space_x, Qt.Horizontal),
+                                   self._itemSpacing(item, space_y, Qt.Vertical))
+            if old_sizes is None or old_sizes[idx] != self._sizes[idx] or \
+                    old_spacings[idx] != self._spacings[idx]:
+                first_changed = min(first_changed, idx)
+
+        self._hints_stale = False
+        if first_changed < len(self._item_list):
+            self._itemsChanged(first_changed)
+
+    def _flow(self, left, right, top):
+        '''
+            Updates the cached positions for the given content area and returns the index
+            of the first item whose position was recomputed.
+        '''
+        key = (left, right, top)
+        if key == self._flow_key and self._dirty_from >= len(self._item_list):
+            return len(self._item_list)
+
+        start = 0
+        y = top
+        row = 0
+        if key == self._flow_key and self._rows:
+            # Everything before the row that holds the first changed item stays where it
+            # is, except that the item may now fit at the end of the previous row (if it
+            # shrank or the item before it was removed). The re-flow starts there.
+            row = max(bisect_right(self._rows, (self._dirty_from, float('inf'))) - 2, 0)
+            start, y, _ = self._rows[row]
+        del self._rows[row:]
+        del self._positions[start:]
+
+        positions, rows, _ = flowItems(self._sizes, self._spacings, left, right, y, start)
+        self._positions.extend(positions)
+        self._rows.extend(rows)
+        if self._rows:
+            _, row_y, row_height = self._rows[-1]
+            self._flow_bottom = row_y + row_height
+        else:
+            self._flow_bottom = top
+        self._flow_key = key
+        self._dirty_from = len(self._item_list)
+        return start
+
     def _doLayout(self, rect, test_only):
         left, top, right, bottom = self.getContentsMargins()
         effectiveRect = rect.adjusted(left, top, -right, -bottom)
-        x = effectiveRect.x()
-        y = effectiveRect.y()
-        line_height = 0
+        self._updateHints()
 
-        for item in self._item_list:
-            widget = item.widget()
-            space_x = self.horizontalSpacing()
-            if space_x == -1:
-                space_x = widget.style().layoutSpacing(widget.sizePolicy(),
-                                                       widget.sizePolicy(),
-                                                       Qt.Horizontal)
-            space_y = self.verticalSpacing()
-            if space_y == -1:
-                space_y = widget.style().layoutSpacing(widget.sizePolicy(),
-                                                       widget.sizePolicy(),
-                                                       Qt.Vertical)
-            next_x = x + item.sizeHint().width() + space_x
-            if next_x - space_x > effectiveRect.right() and line_height > 0:
-                x = effectiveRect.x()
-                y = y + line_height + space_y
-                next_x = x + item.sizeHint().width() + space_x
-                line_height = 0
+        if test_only:
+            key = (effectiveRect.x(), effectiveRect.right(), effectiveRect.y())
+            if key == self._flow_key and self._dirty_from >= len(self._item_list):
+                return self._flow_bottom - rect.y() + bottom
+            width = rect.width()
+            if width not in self._height_for_width:
+                _, _, flow_bottom = flowItems(self._sizes, self._spacings, effectiveRect.x(),
+                                              effectiveRect.right(), effectiveRect.y())
+                self._height_for_width[width] = flow_bottom - rect.y() + bottom
+            return self._height_for_width[width]
 
-            if not test_only:
-                item.setGeometry(QRect(QPoint(x, y), item.sizeHint()))
+        start = self._flow(effectiveRect.x(), effectiveRect.right(), effectiveRect.y())
 
-            x = next_x
-            line_height = max(line_height, item.sizeHint().height())
+        del self._applied[len(self._item_list):]
+        self._applied.extend([None] * (len(self._item_list) - len(self._applied)))
+        for idx in range(start, len(self._item_list)):
+            x, y = self._positions[idx]
+            width, height = self._sizes[idx]
+            geometry = (x, y, width, height)
+            if self._applied[idx] != geometry:
+                self._item_list[idx].setGeometry(QRect(x, y, width, height))
+                self._applied[idx] = geometry
 
-        return y + line_height - rect.y() + bottom
+        return self._flow_bottom - rect.y() + bottom
 
     def _smartSpacing(self, pm):
         if not self.parent():
@@ -118,4 +280,4 @@ class FlowLayout(QLayout):
             return self.parent().style().pixelMetric(pm, None, self.parent())
         else:
             return self.parent().spacing()
-    
+
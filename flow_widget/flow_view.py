@@ -0,0 +1,333 @@
+from bisect import bisect_left, bisect_right
+
+from PyQt5.QtWidgets import QAbstractScrollArea, QStyle, QStyledItemDelegate, \
+    QStyleOptionViewItem
+from PyQt5.QtCore import Qt, QModelIndex, QRect, QSize, pyqtSignal
+from PyQt5.QtGui import QPainter
+
+from flow_layout import flowItems
+
+
+class ChipDelegate(QStyledItemDelegate):
+    '''
+        Draws an item as its text in a box with a 1px border, like the labels of the
+        FlowLayout example. The size only depends on the text and the font, so it is
+        cheap to compute for every item of a large model.
+    '''
+
+    def __init__(self, parent=None, padding=4):
+        QStyledItemDelegate.__init__(self, parent)
+        self._padding = padding
+
+    def sizeHint(self, option, index):
+        text = index.data(Qt.DisplayRole)
+        fm = option.fontMetrics
+        return QSize(fm.horizontalAdvance(str(text)) + 2 * self._padding + 2,
+                     fm.height() + 2 * self._padding + 2)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+            painter.setPen(option.palette.highlightedText().color())
+        else:
+            painter.setPen(option.palette.text().color())
+        painter.drawRect(option.rect.adjusted(0, 0, -1, -1))
+        painter.drawText(option.rect, Qt.AlignCenter, str(index.data(Qt.DisplayRole)))
+        painter.restore()
+
+
+class FlowView(QAbstractScrollArea):
+    '''
+        Virtualized counterpart of a FlowLayout filled with labels: it shows the items of
+        a list model (column 0, DisplayRole) in rows using the same wrapping rule
+        (flowItems), but doesn't create a widget per item. The item delegate only sizes
+        every item once (the sizes are cached until the model reports a change) and paints
+        the items of the rows that intersect the viewport.
+
+        Items are sized and laid out in blocks, only as far down as the viewport (or a
+        lookup) needs. A change of width therefore only re-flows the rows down to the
+        bottom of the viewport and a change of the model only the rows from the first
+        changed item on. Until all items have been laid out, the height of the rest is
+        estimated from the average height per item so far.
+    '''
+
+    clicked = pyqtSignal(QModelIndex)
+
+    # Number of items that are sized and laid out in one step
+    LAYOUT_BLOCK = 1024
+
+    def __init__(self, parent=None, margin=-1, h_spacing=-1, v_spacing=-1):
+        QAbstractScrollArea.__init__(self, parent)
+
+        self._margin = margin
+        self._h_space = h_spacing
+        self._v_space = v_spacing
+
+        self._model = None
+        self._delegate = ChipDelegate(self)
+        self._selected = None
+
+        # Per item (width, height), filled lazily, and the layout of the first items for the
+        # current width. The (first item, y, height) of every row, the last one may still
+        # be continued by the next block.
+        self._sizes = []
+        self._positions = []
+        self._rows = []
+        self._row_ys = []
+        self._row_firsts = []
+        self._layout_bottom = 0
+        self._layout_width = None
+
+        self.viewport().setBackgroundRole(self.backgroundRole())
+        self.verticalScrollBar().setSingleStep(20)
+
+    def setModel(self, model):
+        if self._model is not None:
+            self._model.modelReset.disconnect(self._reset)
+            self._model.layoutChanged.disconnect(self._reset)
+            self._model.rowsInserted.disconnect(self._rowsInserted)
+            self._model.rowsRemoved.disconnect(self._rowsRemoved)
+            self._model.dataChanged.disconnect(self._dataChanged)
+        self._model = model
+        self._selected = None
+        if model is not None:
+            model.modelReset.connect(self._reset)
+            model.layoutChanged.connect(self._reset)
+            model.rowsInserted.connect(self._rowsInserted)
+            model.rowsRemoved.connect(self._rowsRemoved)
+            model.dataChanged.connect(self._dataChanged)
+        self._reset()
+
+    def model(self):
+        return self._model
+
+    def setItemDelegate(self, delegate):
+        self._delegate = delegate
+        self._reset()
+
+    def itemDelegate(self):
+        return self._delegate
+
+    def horizontalSpacing(self):
+        if self._h_space >= 0:
+            return self._h_space
+        return self.style().pixelMetric(QStyle.PM_LayoutHorizontalSpacing, None, self)
+
+    def verticalSpacing(self):
+        if self._v_space >= 0:
+            return self._v_space
+        return self.style().pixelMetric(QStyle.PM_LayoutVerticalSpacing, None, self)
+
+    def contentMargin(self):
+        if self._margin >= 0:
+            return self._margin
+        return self.style().pixelMetric(QStyle.PM_LayoutLeftMargin, None, self)
+
+    def contentHeight(self):
+        ''' Height of all items, which lays out all of them. '''
+        self._ensureLayout(item=len(self._sizes) - 1)
+        return self._contentHeight()
+
+    def visualRect(self, index):
+        ''' Rectangle of the item in viewport coordinates. '''
+        row = index.row()
+        self._ensureLayout(item=row)
+        x, y = self._positions[row]
+        width, height = self._sizes[row]
+        return QRect(x, y - self.verticalScrollBar().value(), width, height)
+
+    def indexAt(self, pos):
+        ''' Model index of the item at 'pos' (viewport coordinates), or an invalid index. '''
+        y = pos.y() + self.verticalScrollBar().value()
+        self._ensureLayout(y=y)
+        row = bisect_right(self._row_ys, y) - 1
+        if row < 0:
+            return QModelIndex()
+        first, row_y, row_height = self._rows[row]
+        if y >= row_y + row_height:
+            return QModelIndex()
+        last = self._rows[row + 1][0] if row + 1 < len(self._rows) else len(self._positions)
+        for item in range(first, last):
+            x, item_y = self._positions[item]
+            width, height = self._sizes[item]
+            if x <= pos.x() < x + width and item_y <= y < item_y + height:
+                return self._model.index(item, 0)
+        return QModelIndex()
+
+    def scrollTo(self, index):
+        rect = self.visualRect(index)
+        bar = self.verticalScrollBar()
+        if rect.top() < 0:
+            bar.setValue(bar.value() + rect.top())
+        elif rect.bottom() > self.viewport().height():
+            bar.setValue(bar.value() + rect.bottom() - self.viewport().height())
+
+    def _reset(self):
+        count = self._model.rowCount() if self._model is not None else 0
+        self._sizes = [None] * count
+        self._invalidateLayout(0)
+
+    def _rowsInserted(self, parent, first, last):
+        self._sizes[first:first] = [None] * (last - first + 1)
+        self._selected = None
+        self._invalidateLayout(first)
+
+    def _rowsRemoved(self, parent, first, last):
+        del self._sizes[first:last + 1]
+        self._selected = None
+        self._invalidateLayout(first)
+
+    def _dataChanged(self, top_left, bottom_right, roles=()):
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            self._sizes[row] = None
+        self._invalidateLayout(top_left.row())
+
+    def _invalidateLayout(self, item):
+        ''' Drops the layout from the row that holds 'item' on. '''
+        row = max(bisect_right(self._row_firsts, item) - 1, 0)
+        if row < len(self._rows):
+            del self._positions[self._rows[row][0]:]
+            del self._rows[row:]
+            del self._row_ys[row:]
+            del self._row_firsts[row:]
+        self.viewport().update()
+
+    def _viewOption(self):
+        option = QStyleOptionViewItem()
+        option.initFrom(self)
+        option.font = self.font()
+        option.fontMetrics = self.fontMetrics()
+        return option
+
+    def _ensureLayout(self, y=None, item=None):
+        '''
+            Lays out the items until every row that starts above 'y' is complete and
+            'item' has been placed. Without either, down to the bottom of the viewport.
+        '''
+        width = self.viewport().width()
+        if self._layout_width != width:
+            self._layout_width = width
+            self._invalidateLayout(0)
+        if y is None and item is None:
+            y = self.verticalScrollBar().value() + self.viewport().height()
+
+        # The last row is only complete once the items after it have been laid out.
+        grown = False
+        while len(self._positions) < len(self._sizes) and (
+                not self._rows
+                or (y is not None and self._rows[-1][1] <= y)
+                or (item is not None and len(self._positions) <= item)):
+            self._layoutBlock()
+            grown = True
+        if grown:
+            self._updateScrollBars()
+
+    def _layoutBlock(self):
+        margin = self.contentMargin()
+        laid_out = len(self._positions)
+        if self._rows:
+            # The last row is flowed again, together with the items that may continue it.
+            start, y, _ = self._rows.pop()
+            self._row_ys.pop()
+            self._row_firsts.pop()
+            del self._positions[start:]
+        else:
+            start, y = 0, margin
+        end = min(max(laid_out, start) + FlowView.LAYOUT_BLOCK, len(self._sizes))
+
+        if None in self._sizes[start:end]:
+            option = self._viewOption()
+            for row in range(start, end):
+                if self._sizes[row] is None:
+                    hint = self._delegate.sizeHint(option, self._model.index(row, 0))
+                    self._sizes[row] = (hint.width(), hint.height())
+
+        # All items share the spacing, flowItems takes it per item like FlowLayout.
+        spacing = (self.horizontalSpacing(), self.verticalSpacing())
+        positions, rows, bottom = flowItems(self._sizes[start:end],
+                                            _Repeat(spacing, end - start),
+                                            margin, self._layout_width - 1 - margin, y)
+        self._positions.extend(positions)
+        for first, row_y, row_height in rows:
+            self._rows.append((start + first, row_y, row_height))
+            self._row_ys.append(row_y)
+            self._row_firsts.append(start + first)
+        self._layout_bottom = bottom
+
+    def _contentHeight(self):
+        ''' Height of the laid out items, plus an estimate for the rest. '''
+        if not self._rows:
+            return 0
+        height = self._layout_bottom + self.contentMargin()
+        laid_out = len(self._positions)
+        if laid_out < len(self._sizes):
+            height = int(height * len(self._sizes) / laid_out)
+        return height
+
+    def _updateScrollBars(self):
+        bar = self.verticalScrollBar()
+        page = self.viewport().height()
+        bar.setPageStep(page)
+        bar.setRange(0, max(0, self._contentHeight() - page))
+
+    def resizeEvent(self, event):
+        QAbstractScrollArea.resizeEvent(self, event)
+        self._ensureLayout()
+        self._updateScrollBars()
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def paintEvent(self, event):
+        offset = self.verticalScrollBar().value()
+        exposed = event.rect()
+        top = exposed.top() + offset
+        bottom = exposed.bottom() + offset
+        self._ensureLayout(y=bottom)
+        if not self._rows:
+            return
+
+        # Only the rows that intersect the exposed area are painted. The last row that
+        # starts above it may still reach into it.
+        first_row = max(bisect_left(self._row_ys, top) - 1, 0)
+        painter = QPainter(self.viewport())
+        option = self._viewOption()
+        for row in range(first_row, len(self._rows)):
+            first, row_y, row_height = self._rows[row]
+            if row_y > bottom:
+                break
+            if row_y + row_height < top:
+                continue
+            last = self._rows[row + 1][0] if row + 1 < len(self._rows) else len(self._positions)
+            for item in range(first, last):
+                x, y = self._positions[item]
+                width, height = self._sizes[item]
+                option.rect = QRect(x, y - offset, width, height)
+                if item == self._selected:
+                    option.state |= QStyle.State_Selected
+                else:
+                    option.state &= ~QStyle.State_Selected
+                self._delegate.paint(painter, option, self._model.index(item, 0))
+        painter.end()
+
+    def mousePressEvent(self, event):
+        index = self.indexAt(event.pos())
+        if index.isValid():
+            self._selected = index.row()
+            self.viewport().update()
+            self.clicked.emit(index)
+        QAbstractScrollArea.mousePressEvent(self, event)
+
+
+class _Repeat(object):
+    ''' A read-only sequence of 'count' times the same value. '''
+    def __init__(self, value, count):
+        self._value = value
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        return self._value
@@ -1,6 +1,12 @@
-from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QLabel
+import argparse
+import random
+import string
+
+from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QLabel, QVBoxLayout
+from PyQt5.QtCore import QStringListModel
 
 from flow_layout import FlowLayout
+from flow_view import FlowView
 
 class Window(QWidget):
 
@@ -19,10 +25,38 @@ class Window(QWidget):
 
         self.setWindowTitle("Flow Layout")
 
+class VirtualWindow(QWidget):
+    ''' Shows 'count' generated labels in a FlowView instead of a FlowLayout. '''
+
+    def __init__(self, count):
+        QWidget.__init__(self)
+
+        rng = random.Random(0)
+        labels = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 15)))
+                  for _ in range(count)]
+        self._model = QStringListModel(labels)
+
+        view = FlowView()
+        view.setModel(self._model)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(view)
+
+        self.setWindowTitle(f"Flow View ({count} items)")
+        self.resize(800, 600)
+
 def main():
+    parser = argparse.ArgumentParser(description="Flow layout example")
+    parser.add_argument('--virtual', type=int, metavar='N',
+                        help="Show N generated labels in a virtualized FlowView")
+    args = parser.parse_args()
+
     MainEventThread = QApplication([])
 
-    MainApplication = Window()
+    if args.virtual is not None:
+        MainApplication = VirtualWindow(args.virtual)
+    else:
+        MainApplication = Window()
 
     MainApplication.show()
 
@@ -1,41 +1,132 @@
+from collections import OrderedDict
 
 from PyQt5.QtWidgets import QLabel
 from PyQt5.QtGui import QFont, QFontMetrics, QImage, QColor, QLinearGradient, QPainter, QPixmap
 from PyQt5.QtCore import Qt, QRectF, QRect, QPoint
 
-class DragLabel(QLabel):
 
-    def __init__(self, text, parent):
-        QLabel.__init__(self, parent=parent)
+class LRUCache(object):
+    '''
+        Least recently used cache bounded by the total cost of its entries (e.g. the bytes of
+        the cached images). Adding an entry drops the least recently used ones until the
+        total fits into 'max_cost' again.
+    '''
+
+    def __init__(self, max_cost):
+        self._entries = OrderedDict()
+        self._cost = 0
+        self.max_cost = max_cost
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def totalCost(self):
+        return self._cost
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, cost):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._cost -= old[1]
+        self._entries[key] = (value, cost)
+        self._cost += cost
+        while self._cost > self.max_cost and len(self._entries) > 1:
+            _, (_, dropped) = self._entries.popitem(last=False)
+            self._cost -= dropped
+
+    def clear(self):
+        self._entries.clear()
+        self._cost = 0
+
+
+# Rendered labels, shared by all DragLabels. The same word with the same font at the same
+# device pixel ratio always looks the same, so re-dropping or pasting known words only
+# costs a lookup. The rounded background only depends on the size of the label, it is
+# kept separately so words of the same size share it.
+label_cache = LRUCache(32 * 1024 * 1024)
+background_cache = LRUCache(8 * 1024 * 1024)
+
+
+def _imageCost(width, height):
+    return width * height * 4
 
+
+def _background(width, height, ratio):
+    key = (width, height, ratio)
+    image = background_cache.get(key)
+    if image is not None:
+        return image
+
+    image = QImage(round(width * ratio), round(height * ratio),
+                   QImage.Format_ARGB32_Premultiplied)
+    image.setDevicePixelRatio(ratio)
+    image.fill(QColor(0, 0, 0, 0))
+
+    gradient = QLinearGradient(0, 0, 0, height-1)
+    gradient.setColorAt(0.0, Qt.white)
+    gradient.setColorAt(0.2, QColor(200, 200, 255))
+    gradient.setColorAt(0.8, QColor(200, 200, 255))
+    gradient.setColorAt(1.0, QColor(127, 127, 200))
+
+    painter = QPainter()
+    painter.begin(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setBrush(gradient)
+    painter.drawRoundedRect(QRectF(0.5, 0.5, width-1, height-1), 25, 25, Qt.RelativeSize)
+    painter.end()
+
+    background_cache.put(key, image, _imageCost(image.width(), image.height()))
+    return image
+
+
+def labelPixmap(text, font=None, ratio=1.0):
+    ''' The pixmap of a label showing 'text', rendered once per text, font and pixel ratio. '''
+    if font is None:
         font = QFont()
+    key = (text, font.key(), ratio)
+    pixmap = label_cache.get(key)
+    if pixmap is not None:
+        return pixmap
 
-        metric = QFontMetrics(font)
-        size = metric.size(Qt.TextSingleLine, text)
+    metric = QFontMetrics(font)
+    size = metric.size(Qt.TextSingleLine, text)
 
-        image = QImage(size.width() + 12, size.height() + 12, QImage.Format_ARGB32_Premultiplied)
-        image.fill(QColor(0, 0, 0, 0))
+    # Copy the shared background and draw the text on top of it.
+    image = _background(size.width() + 12, size.height() + 12, ratio).copy()
 
-        font.setStyleStrategy(QFont.ForceOutline)
+    font = QFont(font)
+    font.setStyleStrategy(QFont.ForceOutline)
 
-        gradient = QLinearGradient(0, 0, 0, image.height()-1)
-        gradient.setColorAt(0.0, Qt.white)
-        gradient.setColorAt(0.2, QColor(200, 200, 255))
-        gradient.setColorAt(0.8, QColor(200, 200, 255))
-        gradient.setColorAt(1.0, QColor(127, 127, 200))
+    painter = QPainter()
+    painter.begin(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setFont(font)
+    painter.setBrush(Qt.black)
+    painter.drawText(QRect(QPoint(6, 6), size), Qt.AlignCenter | Qt.AlignVCenter, text)
+    painter.end()
 
-        painter = QPainter()
-        painter.begin(image)
-        painter.setRenderHint(QPainter.Antialiasing)
-        painter.setBrush(gradient)
-        painter.drawRoundedRect(QRectF(0.5, 0.5, image.width()-1, image.height()-1),
-                                25, 25, Qt.RelativeSize)
-        painter.setFont(font)
-        painter.setBrush(Qt.black)
-        painter.drawText(QRect(QPoint(6, 6), size), Qt.AlignCenter | Qt.AlignVCenter, text)
-        painter.end();
+    pixmap = QPixmap.fromImage(image)
+    label_cache.put(key, pixmap, _imageCost(image.width(), image.height()))
+    return pixmap
+
+
+class DragLabel(QLabel):
+
+    def __init__(self, text, parent):
+        QLabel.__init__(self, parent=parent)
 
-        self.setPixmap(QPixmap.fromImage(image))
+        ratio = parent.devicePixelRatioF() if parent is not None else 1.0
+        self.setPixmap(labelPixmap(text, QFont(), ratio))
 
         self._label_text = text
 
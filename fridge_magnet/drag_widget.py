@@ -35,6 +35,11 @@ class DragWidget(QWidget):
         new_palette.setColor(QPalette.Window, Qt.white)
         self.setPalette(new_palette)
 
+        # The label that is being dragged and whether it was dropped on this widget again,
+        # in which case it is moved instead of replaced by a new label.
+        self._drag_child = None
+        self._moved_in_place = False
+
         self.setMinimumSize(400, max(200, y))
         self.setWindowTitle("Fridge Magnets")
         self.setAcceptDrops(True)
@@ -75,12 +80,19 @@ class DragWidget(QWidget):
             offset = QPoint()
             dataStream >> offset
 
-            newLabel = DragLabel(text, self)
-            newLabel.move(event.pos() - offset)
-            newLabel.show()
-            # Apparently `WA_DeleteOnClose` shouldn't be used with python.
-            # See https://stefanoborini.com/pyqt-gotchas/
-            # newLabel.setAttribute(Qt.WA_DeleteOnClose)
+            if event.source() == self and self._drag_child is not None:
+                # Moving a label within this widget, reuse it. A new label would be created
+                # on top of the others, so the moved one is raised to match.
+                self._drag_child.move(event.pos() - offset)
+                self._drag_child.raise_()
+                self._moved_in_place = True
+            else:
+                newLabel = DragLabel(text, self)
+                newLabel.move(event.pos() - offset)
+                newLabel.show()
+                # Apparently `WA_DeleteOnClose` shouldn't be used with python.
+                # See https://stefanoborini.com/pyqt-gotchas/
+                # newLabel.setAttribute(Qt.WA_DeleteOnClose)
 
             if event.source() == self:
                 event.setDropAction(Qt.MoveAction)
@@ -92,15 +104,20 @@ class DragWidget(QWidget):
             pieces = event.mimeData().text().split()
             pos = event.pos()
 
-            for text in pieces:
-                newLabel = DragLabel(text, self)
-                newLabel.move(pos)
-                newLabel.show()
-                # Apparently `WA_DeleteOnClose` shouldn't be used with python.
-                # See https://stefanoborini.com/pyqt-gotchas/
-                # newLabel.setAttribute(Qt.WA_DeleteOnClose)
-
-                pos += QPoint(newLabel.width(), 0)
+            # Create all labels of a (possibly large) paste before repainting anything.
+            self.setUpdatesEnabled(False)
+            try:
+                for text in pieces:
+                    newLabel = DragLabel(text, self)
+                    newLabel.move(pos)
+                    newLabel.show()
+                    # Apparently `WA_DeleteOnClose` shouldn't be used with python.
+                    # See https://stefanoborini.com/pyqt-gotchas/
+                    # newLabel.setAttribute(Qt.WA_DeleteOnClose)
+
+                    pos += QPoint(newLabel.width(), 0)
+            finally:
+                self.setUpdatesEnabled(True)
 
             event.acceptProposedAction()
 
@@ -131,7 +148,14 @@ class DragWidget(QWidget):
 
         child.hide()
 
-        if drag.exec(Qt.MoveAction | Qt.CopyAction, Qt.CopyAction) == Qt.MoveAction:
+        self._drag_child = child
+        self._moved_in_place = False
+        try:
+            result = drag.exec(Qt.MoveAction | Qt.CopyAction, Qt.CopyAction)
+        finally:
+            self._drag_child = None
+
+        if result == Qt.MoveAction and not self._moved_in_place:
             child.close()
         else:
             child.show()
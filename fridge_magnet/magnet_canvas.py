@@ -0,0 +1,279 @@
+from array import array
+
+from PyQt5.QtCore import Qt, QByteArray, QDataStream, QIODevice, QPoint, QRect, QMimeData
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QPalette, QDrag, QFont, QFontMetrics, QPainter
+
+from drag_label import labelPixmap
+from drag_widget import fridgeMagnetsMimeType
+
+# Side length of the cells of the hit-test / repaint grid, a bit larger than a typical
+# magnet so that most of them are registered in a single cell.
+CELL_SIZE = 64
+
+
+class MagnetCanvas(QWidget):
+    '''
+        Alternative to DragWidget for a large number of magnets. Instead of a QLabel per word
+        the magnets are kept in packed arrays (position, size, stacking order and the id of
+        the text) and drawn in one paint pass, using the shared label pixmap cache of
+        drag_label. A grid of CELL_SIZE cells maps every cell to the magnets that overlap
+        it, which is used to find the magnet under the mouse and the magnets to repaint for
+        an exposed area.
+
+        Drags use the same "application/x-fridgemagnet" data as DragWidget (the text and
+        the hot spot), so magnets can be moved between both kinds of widgets.
+    '''
+
+    def __init__(self, words_file="words.txt", wrap_width=245, parent=None):
+        QWidget.__init__(self, parent=parent)
+
+        self._font = QFont()
+        self._metrics = QFontMetrics(self._font)
+
+        # Interned texts and the size of their labels, magnets refer to them by index.
+        self._texts = []
+        self._text_ids = {}
+        self._text_sizes = []
+
+        # One entry per magnet slot. A text id of -1 marks a free slot (listed in _free).
+        self._x = array('i')
+        self._y = array('i')
+        self._w = array('i')
+        self._h = array('i')
+        self._text = array('i')
+        self._free = []
+        # Stacking order: a magnet that is added or moved goes on top of all others.
+        self._z = array('q')
+        self._next_z = 0
+
+        # (column, row) -> list of magnet ids
+        self._grid = {}
+        self._hidden = None
+        self._drag_magnet = None
+        self._moved_in_place = False
+
+        x, y = 5, 5
+        bottom = y
+        with open(words_file) as fp:
+            for line in fp:
+                word = line.strip()
+                if not word:
+                    continue
+                magnet = self.addMagnet(word, QPoint(x, y))
+                bottom = max(bottom, y + self._h[magnet])
+                x += self._w[magnet] + 2
+                if x >= wrap_width:
+                    x = 5
+                    y += self._h[magnet] + 2
+
+        new_palette = self.palette()
+        new_palette.setColor(QPalette.Window, Qt.white)
+        self.setPalette(new_palette)
+        self.setAutoFillBackground(True)
+
+        self.setMinimumSize(max(400, wrap_width + 100), max(200, bottom + 5))
+        self.setWindowTitle("Fridge Magnets")
+        self.setAcceptDrops(True)
+
+    def magnetCount(self):
+        return len(self._text) - len(self._free)
+
+    def magnetText(self, magnet):
+        return self._texts[self._text[magnet]]
+
+    def magnetRect(self, magnet):
+        return QRect(self._x[magnet], self._y[magnet], self._w[magnet], self._h[magnet])
+
+    def addMagnet(self, text, pos):
+        ''' Adds a magnet showing 'text' with its top left corner at 'pos', returns its id. '''
+        text_id = self._text_ids.get(text)
+        if text_id is None:
+            text_id = len(self._texts)
+            self._texts.append(text)
+            self._text_ids[text] = text_id
+            size = self._metrics.size(Qt.TextSingleLine, text)
+            self._text_sizes.append((size.width() + 12, size.height() + 12))
+
+        width, height = self._text_sizes[text_id]
+        if self._free:
+            magnet = self._free.pop()
+            self._x[magnet] = pos.x()
+            self._y[magnet] = pos.y()
+            self._w[magnet] = width
+            self._h[magnet] = height
+            self._text[magnet] = text_id
+        else:
+            magnet = len(self._text)
+            self._x.append(pos.x())
+            self._y.append(pos.y())
+            self._w.append(width)
+            self._h.append(height)
+            self._text.append(text_id)
+            self._z.append(0)
+
+        self._raise(magnet)
+        self._register(magnet)
+        self.update(self.magnetRect(magnet))
+        return magnet
+
+    def removeMagnet(self, magnet):
+        self._unregister(magnet)
+        self.update(self.magnetRect(magnet))
+        self._text[magnet] = -1
+        self._free.append(magnet)
+
+    def moveMagnet(self, magnet, pos):
+        self._unregister(magnet)
+        self.update(self.magnetRect(magnet))
+        self._x[magnet] = pos.x()
+        self._y[magnet] = pos.y()
+        self._raise(magnet)
+        self._register(magnet)
+        self.update(self.magnetRect(magnet))
+
+    def _raise(self, magnet):
+        self._z[magnet] = self._next_z
+        self._next_z += 1
+
+    def _growToFit(self, magnet):
+        ''' Grows the minimum size, if needed, to keep a dropped magnet inside the widget. '''
+        rect = self.magnetRect(magnet)
+        size = self.minimumSize()
+        self.setMinimumSize(max(size.width(), rect.right() + 6),
+                            max(size.height(), rect.bottom() + 6))
+
+    def magnetAt(self, pos):
+        ''' The id of the top-most magnet at 'pos', or None. '''
+        candidates = self._grid.get((pos.x() // CELL_SIZE, pos.y() // CELL_SIZE), ())
+        for magnet in sorted(candidates, key=self._z.__getitem__, reverse=True):
+            if magnet != self._hidden and self.magnetRect(magnet).contains(pos):
+                return magnet
+        return None
+
+    def magnetsIn(self, rect):
+        ''' The ids of the magnets that intersect 'rect', from bottom to top. '''
+        found = set()
+        for cell in self._cells(rect):
+            found.update(self._grid.get(cell, ()))
+        return sorted((magnet for magnet in found if self.magnetRect(magnet).intersects(rect)),
+                      key=self._z.__getitem__)
+
+    def _cells(self, rect):
+        for row in range(rect.top() // CELL_SIZE, rect.bottom() // CELL_SIZE + 1):
+            for column in range(rect.left() // CELL_SIZE, rect.right() // CELL_SIZE + 1):
+                yield (column, row)
+
+    def _register(self, magnet):
+        for cell in self._cells(self.magnetRect(magnet)):
+            self._grid.setdefault(cell, []).append(magnet)
+
+    def _unregister(self, magnet):
+        for cell in self._cells(self.magnetRect(magnet)):
+            magnets = self._grid[cell]
+            magnets.remove(magnet)
+            if not magnets:
+                del self._grid[cell]
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        ratio = self.devicePixelRatioF()
+        for magnet in self.magnetsIn(event.rect()):
+            if magnet == self._hidden:
+                continue
+            pixmap = labelPixmap(self._texts[self._text[magnet]], self._font, ratio)
+            painter.drawPixmap(self._x[magnet], self._y[magnet], pixmap)
+        painter.end()
+
+    def _acceptDrag(self, event):
+        if event.mimeData().hasFormat(fridgeMagnetsMimeType()):
+            if event.source() == self:
+                event.setDropAction(Qt.MoveAction)
+                event.accept()
+            else:
+                event.acceptProposedAction()
+        elif event.mimeData().hasText():
+            event.acceptProposedAction()
+        else:
+            event.ignore()
+
+    def dragEnterEvent(self, event):
+        self._acceptDrag(event)
+
+    def dragMoveEvent(self, event):
+        self._acceptDrag(event)
+
+    def dropEvent(self, event):
+        if event.mimeData().hasFormat(fridgeMagnetsMimeType()):
+            mime = event.mimeData()
+            itemData = mime.data(fridgeMagnetsMimeType())
+            dataStream = QDataStream(itemData, QIODevice.ReadOnly)
+
+            dataStream.startTransaction()
+            text = dataStream.readQString()
+            offset = QPoint()
+            dataStream >> offset
+
+            if event.source() == self and self._drag_magnet is not None:
+                magnet = self._drag_magnet
+                self.moveMagnet(magnet, event.pos() - offset)
+                self._moved_in_place = True
+            else:
+                magnet = self.addMagnet(text, event.pos() - offset)
+            self._growToFit(magnet)
+
+            if event.source() == self:
+                event.setDropAction(Qt.MoveAction)
+                event.accept()
+            else:
+                event.acceptProposedAction()
+
+        elif event.mimeData().hasText():
+            pos = QPoint(event.pos())
+            for text in event.mimeData().text().split():
+                magnet = self.addMagnet(text, pos)
+                self._growToFit(magnet)
+                pos += QPoint(self._w[magnet], 0)
+
+            event.acceptProposedAction()
+
+        else:
+            event.ignore()
+
+    def mousePressEvent(self, event):
+        magnet = self.magnetAt(event.pos())
+
+        if magnet is None:
+            return
+
+        text = self.magnetText(magnet)
+        hotSpot = event.pos() - QPoint(self._x[magnet], self._y[magnet])
+
+        itemData = QByteArray()
+        dataStream = QDataStream(itemData, QIODevice.WriteOnly)
+        dataStream.writeQString(text)
+        dataStream << hotSpot
+
+        mimeData = QMimeData()
+        mimeData.setData(fridgeMagnetsMimeType(), itemData)
+        mimeData.setText(text)
+
+        drag = QDrag(self)
+        drag.setMimeData(mimeData)
+        drag.setPixmap(labelPixmap(text, self._font, self.devicePixelRatioF()))
+        drag.setHotSpot(hotSpot)
+
+        self._hidden = magnet
+        self._drag_magnet = magnet
+        self._moved_in_place = False
+        self.update(self.magnetRect(magnet))
+        try:
+            result = drag.exec(Qt.MoveAction | Qt.CopyAction, Qt.CopyAction)
+        finally:
+            self._hidden = None
+            self._drag_magnet = None
+
+        if result == Qt.MoveAction and not self._moved_in_place:
+            self.removeMagnet(magnet)
+        else:
+            self.update(self.magnetRect(magnet))
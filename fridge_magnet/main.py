@@ -1,11 +1,30 @@
-from PyQt5.QtWidgets import QApplication
+import argparse
+
+from PyQt5.QtWidgets import QApplication, QScrollArea
 
 from drag_widget import DragWidget
+from magnet_canvas import MagnetCanvas
 
 def main():
+    parser = argparse.ArgumentParser(description="Fridge magnets drag and drop example")
+    parser.add_argument('--canvas', action='store_true',
+                        help="Draw the magnets on a single canvas instead of using a label "
+                             "per word (for large word lists)")
+    parser.add_argument('--words', default="words.txt",
+                        help="Word list for --canvas, one word per line")
+    parser.add_argument('--wrap', type=int, default=800,
+                        help="Width at which the words of --canvas wrap to the next row")
+    args = parser.parse_args()
+
     MainEventThread = QApplication([])
 
-    MainApplication = DragWidget()
+    if args.canvas:
+        MainApplication = QScrollArea()
+        MainApplication.setWidget(MagnetCanvas(args.words, args.wrap))
+        MainApplication.setWindowTitle("Fridge Magnets")
+        MainApplication.resize(args.wrap + 150, 600)
+    else:
+        MainApplication = DragWidget()
 
     MainApplication.show()
 
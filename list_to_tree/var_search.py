@@ -0,0 +1,407 @@
+from bisect import bisect_left
+from collections import OrderedDict
+import re
+
+import numpy as np
+
+from var_trie import ROOT
+
+# Characters that make a pattern a glob pattern when no mode is given.
+GLOB_CHARS = '*?['
+
+# Number of recent results kept, so deleting characters again is free.
+RESULT_CACHE_SIZE = 32
+
+# Results with at most this many names are narrowed down in Python when the pattern is
+# extended. Larger ones are searched again in the joined names.
+NARROW_LIMIT = 5000
+
+
+def _parse_glob(pattern):
+    '''
+        Splits the glob 'pattern' into a list of literal characters (str) and wildcards
+        ('*', '?' or a [...] set, given as the regular expression for them, in a tuple).
+    '''
+    tokens = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        idx += 1
+        if char == '*':
+            tokens.append(('[^\n]*',))
+        elif char == '?':
+            tokens.append(('[^\n]',))
+        elif char == '[':
+            end = pattern.find(']', idx + 1 if pattern[idx:idx + 1] in ('!', ']') else idx)
+            if end < 0:
+                tokens.append(char)
+                continue
+            chars = pattern[idx:end].replace('\\', '\\\\')
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            elif chars.startswith('^'):
+                chars = '\\' + chars
+            tokens.append(('[' + chars + ']',))
+            idx = end + 1
+        else:
+            tokens.append(char)
+    return tokens
+
+
+def glob_to_regex(pattern):
+    ''' Regular expression that matches a whole line (re.M) against the glob 'pattern'. '''
+    parts = [re.escape(token) if isinstance(token, str) else token[0]
+             for token in _parse_glob(pattern)]
+    return re.compile('^' + ''.join(parts) + '$', re.M)
+
+
+def _glob_literals(pattern):
+    '''
+        The literal parts of the glob 'pattern': the text before the first wildcard, after
+        each wildcard and after the last one (empty strings where wildcards are adjacent or
+        at either end), and whether all the wildcards are '*'.
+    '''
+    literals = ['']
+    only_stars = True
+    for token in _parse_glob(pattern):
+        if isinstance(token, str):
+            literals[-1] += token
+        else:
+            literals.append('')
+            only_stars = only_stars and token[0] == '[^\n]*'
+    return literals, only_stars
+
+
+class SearchResult(object):
+    '''
+        The variables matching a pattern, as sorted indices into the variables of the
+        VarSearch (which are in the depth first order of the trie).
+    '''
+
+    def __init__(self, search, pattern, mode, indices):
+        self._search = search
+        self.pattern = pattern
+        self.mode = mode
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def names(self):
+        names = self._search.names
+        return [names[idx] for idx in self.indices.tolist()]
+
+    def nodes(self):
+        ''' The trie nodes of the matching variables. '''
+        return self._search.variable_nodes[self.indices]
+
+    def count_below(self, node, include_node=True):
+        ''' The number of matches in the subtree of 'node'. '''
+        first, end = self._search.variable_range(node)
+        if first >= end:
+            return 0
+        if not include_node and self._search.is_variable(node):
+            first += 1
+        return int(np.searchsorted(self.indices, end) - np.searchsorted(self.indices, first))
+
+    def contains(self, node):
+        ''' Whether 'node' or any node below it is a match. '''
+        return self.count_below(node) > 0
+
+
+class VarSearch(object):
+    '''
+        Search index over the variables of a VarTrie, for filtering as you type. Three
+        kinds of patterns are supported:
+
+          prefix      "lemo.FL.H" matches everything below lemo.FL.HX, lemo.FL.HY, ...
+          substring   "HX" or "FL.HX" matches every name that contains it
+          glob        "*.HX.tau" matches the whole name, '*' and '?' also match '.'
+
+        search() picks glob when the pattern contains one of '*?[' and substring
+        otherwise, unless a mode is given.
+
+        The variables are kept in the depth first order of the trie, so the variables of
+        a subtree are a contiguous range. Prefix searches resolve to such a range through
+        the trie. Substring searches match the (interned, few) segments and then take the
+        ranges of all nodes with a matching segment. Globs are narrowed down the same way
+        by their literal start, end and parts in between. A pattern that extends the
+        previous one (the user typed another character) only searches the previous
+        matches, and recent results are cached.
+
+        The index is a snapshot: call rebuild() after the trie changed. Until then, nodes
+        added since are not found and have no variables.
+    '''
+
+    def __init__(self, trie):
+        self.trie = trie
+        self.rebuild()
+
+    def rebuild(self):
+        trie = self.trie
+        num_nodes = trie.num_nodes()
+
+        # The variables of a subtree are [first, end) of the node. 'first' is the number of
+        # variables before the node in depth first order, 'end' the end of its last child
+        # (or just after the node itself).
+        names = []
+        variable_nodes = []
+        first = [0] * num_nodes
+        end = [0] * num_nodes
+        order = []
+        for node, name in trie.iter_items():
+            first[node] = len(names)
+            order.append(node)
+            if trie.is_variable(node):
+                names.append(name)
+                variable_nodes.append(node)
+            end[node] = len(names)
+        for node in reversed(order):
+            parent = trie.parent(node)
+            if end[parent] < end[node]:
+                end[parent] = end[node]
+        end[ROOT] = len(names)
+
+        self.names = names
+        self.variable_nodes = np.array(variable_nodes, dtype=np.int64)
+        self._first = np.array(first, dtype=np.int64)
+        self._end = np.array(end, dtype=np.int64)
+
+        # All names in one string (one per line) for the regular expression searches, and
+        # where every line starts.
+        self._joined = '\n'.join(names)
+        lengths = np.fromiter((len(name) + 1 for name in names), dtype=np.int64,
+                              count=len(names))
+        self._name_lengths = lengths - 1
+        self._line_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) if names \
+            else np.zeros(0, dtype=np.int64)
+
+        # Nodes by segment id and the parents, for the segment based substring search.
+        segments = np.array(trie.segment_ids(), dtype=np.int64)
+        self._segment_of = segments
+        self._parents = np.array([trie.parent(node) for node in range(num_nodes)],
+                                 dtype=np.int64)
+        self._is_variable = np.array([trie.is_variable(node) for node in range(num_nodes)],
+                                     dtype=np.int64)
+        self._nodes_by_segment = np.argsort(segments, kind='stable')
+        self._segment_bounds = np.searchsorted(segments[self._nodes_by_segment],
+                                               np.arange(len(trie.segments()) + 1))
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.names)
+
+    def variable_range(self, node):
+        ''' (first, end) indices of the variables in the subtree of 'node'. '''
+        if node >= len(self._first):
+            return 0, 0
+        return int(self._first[node]), int(self._end[node])
+
+    def is_variable(self, node):
+        ''' Whether 'node' was a variable when the index was built. '''
+        return node < len(self._is_variable) and bool(self._is_variable[node])
+
+    def all(self):
+        return SearchResult(self, '', 'prefix', np.arange(len(self.names)))
+
+    def search(self, pattern, mode=None):
+        if mode is None:
+            mode = 'glob' if any(char in pattern for char in GLOB_CHARS) else 'substring'
+        if mode not in ('prefix', 'substring', 'glob'):
+            raise ValueError(f"Unknown search mode: {mode}")
+        if not pattern or (mode == 'glob' and pattern.strip('*') == ''):
+            return self.all()
+
+        key = (mode, pattern)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            return result
+
+        if mode == 'prefix':
+            indices = self._search_prefix(pattern)
+        elif mode == 'substring':
+            indices = self._search_substring(pattern)
+        else:
+            indices = self._search_glob(pattern)
+
+        result = SearchResult(self, pattern, mode, indices)
+        self._cache[key] = result
+        if len(self._cache) > RESULT_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return result
+
+    def _previous(self, mode, accept):
+        ''' The smallest cached result of 'mode' whose pattern passes 'accept'. '''
+        best = None
+        for (cached_mode, pattern), result in self._cache.items():
+            if cached_mode == mode and accept(pattern) and \
+                    (best is None or len(result) < len(best)):
+                best = result
+        return best
+
+    def _search_prefix(self, pattern):
+        trie = self.trie
+        # The complete segments select a node, the last (partial) one a range of its
+        # children. Their subtrees are contiguous in the variable order.
+        head, dot, partial = pattern.rpartition('.')
+        if dot and not head:
+            # No name starts with a '.'
+            return np.zeros(0, dtype=np.int64)
+        node = trie.find(head) if head else ROOT
+        if node is None:
+            return np.zeros(0, dtype=np.int64)
+        children = trie.children(node)
+        segments = [trie.segment(child) for child in children]
+        lo = bisect_left(segments, partial)
+        hi = lo
+        while hi < len(segments) and segments[hi].startswith(partial):
+            hi += 1
+        if lo == hi:
+            return np.zeros(0, dtype=np.int64)
+        return np.arange(self._first[children[lo]], self._end[children[hi - 1]])
+
+    def _search_substring(self, pattern):
+        previous = self._previous('substring', lambda cached: cached in pattern)
+        if previous is not None and len(previous) <= NARROW_LIMIT:
+            return self._filter(previous.indices, lambda name: pattern in name)
+        return self._search_segments(pattern)
+
+    def _filter(self, indices, accept):
+        names = self.names
+        return np.array([idx for idx in indices.tolist() if accept(names[idx])],
+                        dtype=np.int64)
+
+    def _segment_mask(self, accept):
+        ''' Boolean array over the segment ids, True where 'accept(segment)'. '''
+        return np.array([accept(segment) for segment in self.trie.segments()] + [False],
+                        dtype=bool)
+
+    def _search_segments(self, pattern):
+        '''
+            The substring search. As segments don't contain a '.', a name contains
+            "a.b.c" if it has a segment that ends with "a", followed by the segment "b" and
+            a segment that starts with "c". The nodes of the last segment are found by
+            segment id, then their parents are checked from the last part to the first.
+            A pattern without a '.' is simply a substring of a segment.
+        '''
+        parts = pattern.split('.')
+        # With a trailing '.' only what is below the last segment matches.
+        below = len(parts) > 1 and parts[-1] == ''
+        if below:
+            parts.pop()
+
+        # The nodes of the last part
+        last = parts[-1]
+        if len(parts) == 1:
+            if below:
+                mask = self._segment_mask(lambda segment: segment.endswith(last))
+            else:
+                mask = self._segment_mask(lambda segment: last in segment)
+        elif below:
+            mask = self._segment_mask(lambda segment: segment == last)
+        else:
+            mask = self._segment_mask(lambda segment: segment.startswith(last))
+        nodes = self._path_nodes(parts, mask)
+        first = self._first[nodes]
+        if below:
+            first = first + self._is_variable[nodes]
+
+        # Union of the ranges [first, end) of the nodes
+        count = len(self.names)
+        coverage = np.bincount(first, minlength=count + 1) - \
+            np.bincount(self._end[nodes], minlength=count + 1)
+        return np.flatnonzero(np.cumsum(coverage)[:count] > 0)
+
+    def _path_nodes(self, parts, mask):
+        '''
+            The nodes whose segment passes 'mask' (see _segment_mask) and whose ancestors
+            end with the preceding 'parts': the parent has the segment 'parts[-2]' and so on,
+            the farthest one is a segment that ends with 'parts[0]'.
+        '''
+        segment_ids = np.flatnonzero(mask[:-1])
+        if len(segment_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        nodes = np.concatenate([
+            self._nodes_by_segment[self._segment_bounds[idx]:self._segment_bounds[idx + 1]]
+            for idx in segment_ids.tolist()])
+
+        if len(parts) > 1:
+            # The segment id -1 of the root picks the extra False at the end of the masks.
+            ancestors = self._parents[nodes]
+            for part in reversed(parts[1:-1]):
+                keep = self._segment_mask(lambda segment: segment == part)[
+                    self._segment_of[ancestors]]
+                nodes = nodes[keep]
+                ancestors = self._parents[ancestors[keep]]
+            keep = self._segment_mask(lambda segment: segment.endswith(parts[0]))[
+                self._segment_of[ancestors]]
+            nodes = nodes[keep]
+        return nodes
+
+    def _search_suffix(self, suffix):
+        '''
+            Indices of the names that end with 'suffix'. Its last part is the end of the
+            last segment, or all of it if there is a '.' before it, the parts before that
+            are checked on the parents like in the substring search.
+        '''
+        parts = suffix.split('.')
+        last = parts[-1]
+        if len(parts) == 1:
+            mask = self._segment_mask(lambda segment: segment.endswith(last))
+        else:
+            mask = self._segment_mask(lambda segment: segment == last)
+        nodes = self._path_nodes(parts, mask)
+        return np.sort(self._first[nodes[self._is_variable[nodes] == 1]])
+
+    @staticmethod
+    def _intersect(indices, other):
+        ''' The indices in both sorted arrays, 'indices' may be None for all of them. '''
+        if indices is None:
+            return other
+        if len(indices) > len(other):
+            indices, other = other, indices
+        if len(other) == 0:
+            return other
+        pos = np.minimum(np.searchsorted(other, indices), len(other) - 1)
+        return indices[other[pos] == indices]
+
+    def _search_glob(self, pattern):
+        regex = glob_to_regex(pattern)
+        literals, only_stars = _glob_literals(pattern)
+        if len(literals) == 1:
+            # Without any wildcard only the name itself matches.
+            return self._filter(self._search_prefix(pattern), regex.match)
+
+        # Every match starts with the literal start of the pattern, ends with its literal
+        # end and contains the literal parts in between. The start selects a range of
+        # names, the end and the longest part in between are looked up in the segments,
+        # and only the names that pass all of them are matched name by name. Patterns
+        # without any literal part are matched in one pass over the joined names.
+        start = literals[0]
+        end = literals[-1]
+        middle = [literal for literal in literals[1:-1] if literal]
+        candidates = self._search_prefix(start) if start else None
+        if end:
+            candidates = self._intersect(candidates, self._search_suffix(end))
+        if middle and (candidates is None or len(candidates) > NARROW_LIMIT):
+            longest = self.search(max(middle, key=len), 'substring').indices
+            candidates = self._intersect(candidates, longest)
+        if candidates is None:
+            return self._search_lines(regex)
+        if only_stars and not middle:
+            # "start*end" matches every name that is long enough for both.
+            return candidates[self._name_lengths[candidates] >= len(start) + len(end)]
+        return self._filter(candidates, regex.match)
+
+    def _search_lines(self, regex, first=0, end=None):
+        ''' Indices of the names (in [first, end)) where 'regex' matches at a line start. '''
+        if end is None:
+            end = len(self.names)
+        if first >= end:
+            return np.zeros(0, dtype=np.int64)
+        start = int(self._line_starts[first])
+        stop = int(self._line_starts[end - 1]) + len(self.names[end - 1])
+        starts = np.fromiter((match.start() for match in regex.finditer(self._joined, start, stop)),
+                             dtype=np.int64)
+        return np.searchsorted(self._line_starts, starts)
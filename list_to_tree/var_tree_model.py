@@ -0,0 +1,342 @@
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex
+
+from var_trie import ROOT, VarTrie
+
+
+class _Node(object):
+    '''
+        A row of the model for the trie node 'node'. The rows of the children are only
+        created when the node is expanded.
+    '''
+    __slots__ = ('node', 'parent', 'row', 'children', 'fetched', 'complete', 'shown')
+
+    def __init__(self, node, parent, row):
+        self.node = node
+        self.parent = parent
+        self.row = row
+        self.children = None
+        # The number of children (in the order of _shownChildren()) up to the last one
+        # with a row, fetchMore() continues from there.
+        self.fetched = 0
+        # Whether all children have rows, so children added later need rows right away.
+        self.complete = False
+        # The trie nodes of the children that pass the filter, once they were needed.
+        self.shown = None
+
+
+class VarTreeModel(QAbstractItemModel):
+    '''
+        Tree model of a VarTrie (or of a list of dotted variable names), with the columns
+        of the QTreeWidget of the notebook: 'Var' (the path component) and 'Value' (the
+        full name for the variables).
+
+        Nodes are created lazily: a branch reports that it has children, but its rows are
+        only created when a view asks for them (canFetchMore/fetchMore, i.e. when the
+        branch is expanded), at most 'batch_size' per fetchMore call. Showing the tree only
+        costs the top level, no matter how many variables there are.
+
+        With a filter (a SearchResult of var_search) only the branches that lead to a
+        match are shown.
+
+        addVariables() and removeVariables() change the trie in batches and only notify
+        the views about the rows of the branches that changed (and only for the rows that
+        were already fetched), so expanded branches, the selection and the scroll
+        position are kept. The cost depends on the size of the batch and of the touched
+        branches, not on the size of the tree. A filter is a snapshot of the search index:
+        new variables only show up once the filter is set again with a fresh result.
+    '''
+
+    def __init__(self, trie, parent=None, batch_size=1000):
+        QAbstractItemModel.__init__(self, parent)
+        if not isinstance(trie, VarTrie):
+            trie = VarTrie(trie)
+        self._trie = trie
+        self._batch_size = batch_size
+        self._filter = None
+        # While rows are inserted or removed, fetchMore() is off so a view that fetches
+        # while handling the signals can't nest another change into them.
+        self._updating = False
+        self._resetRoot()
+
+    def _resetRoot(self):
+        self._root = _Node(ROOT, None, 0)
+        self._root.children = []
+        # trie node -> _Node, for the nodes that have a row
+        self._nodes = {ROOT: self._root}
+
+    def trie(self):
+        return self._trie
+
+    def filter(self):
+        return self._filter
+
+    def setFilter(self, result):
+        ''' Only shows the matches of the SearchResult 'result', None shows everything. '''
+        self.beginResetModel()
+        self._filter = result
+        self._resetRoot()
+        self.endResetModel()
+
+    def _shownChildren(self, node):
+        ''' The trie nodes of the children of the _Node 'node' that are shown. '''
+        if self._filter is None:
+            return self._trie.children(node.node)
+        if node.shown is None:
+            node.shown = [child for child in self._trie.children(node.node)
+                          if self._filter.contains(child)]
+        return node.shown
+
+    def _newNode(self, child, parent, row):
+        node = _Node(child, parent, row)
+        if self._filter is None:
+            leaf = not self._trie.has_children(child)
+        else:
+            leaf = self._filter.count_below(child, include_node=False) == 0
+        if leaf:
+            node.children = []
+            node.complete = True
+        self._nodes[child] = node
+        return node
+
+    def _forget(self, node):
+        ''' Drops the _Node 'node' and its fetched descendants from the node map. '''
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            del self._nodes[node.node]
+            if node.children:
+                stack.extend(node.children)
+
+    def _index(self, node):
+        if node is self._root:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def addVariables(self, names):
+        ''' Adds the variables 'names' to the trie and the rows for them. '''
+        trie = self._trie
+        names = list(names)
+        # Existing branches that become variables only change their 'Value' column.
+        flagged = [node for node in map(trie.find, names)
+                   if node is not None and not trie.is_variable(node)]
+        first_new = trie.num_nodes()
+        trie.update(names)
+
+        # Nodes below a new node can't have a row yet, so only the branches that existed
+        # before and got a new child are touched.
+        touched = set()
+        for node in range(first_new, trie.num_nodes()):
+            parent = trie.parent(node)
+            if parent < first_new:
+                touched.add(parent)
+        self._updateBranches(touched)
+
+        for node in flagged:
+            row = self._nodes.get(node)
+            if row is not None:
+                index = self.createIndex(row.row, 1, row)
+                self.dataChanged.emit(index, index)
+
+    def removeVariables(self, names):
+        '''
+            Removes the variables 'names' from the trie and the rows of removed nodes.
+            Raises KeyError, before anything is removed, if one of them is not a variable.
+        '''
+        trie = self._trie
+        # A name that is given twice is removed once.
+        names = list(dict.fromkeys(names))
+        for name in names:
+            if name not in trie:
+                raise KeyError(name)
+
+        touched = set()
+        unflagged = []
+        for name in names:
+            removed = trie.remove(name)
+            if removed is None:
+                unflagged.append(trie.find(name))
+            else:
+                touched.add(trie.parent(removed))
+
+        # Branches that were removed themselves go away with the rows of their ancestors.
+        self._updateBranches(parent for parent in touched if not trie.is_removed(parent))
+
+        for node in unflagged:
+            row = self._nodes.get(node)
+            if row is not None:
+                index = self.createIndex(row.row, 1, row)
+                self.dataChanged.emit(index, index)
+
+    def _updateBranches(self, parents):
+        self._updating = True
+        try:
+            for parent in parents:
+                # An earlier branch may have removed the row of this one.
+                node = self._nodes.get(parent)
+                if node is not None:
+                    self._updateChildren(node)
+        finally:
+            self._updating = False
+
+    def _updateChildren(self, node):
+        '''
+            Removes the rows of the children of the _Node 'node' that are gone from the
+            trie and inserts rows for new children that sort between the fetched ones (or
+            after them if the branch was fetched completely). The others are left to
+            fetchMore().
+        '''
+        if node.children is None:
+            return
+        node.shown = None
+        children = self._shownChildren(node)
+        position = {child: row for row, child in enumerate(children)}
+        parent = self._index(node)
+        rows = node.children
+
+        # New children up to the last fetched one get a row, all of them if the branch
+        # was complete.
+        if node.complete:
+            node.fetched = len(children)
+        else:
+            node.fetched = 0
+            for row in reversed(rows):
+                if row.node in position:
+                    node.fetched = position[row.node] + 1
+                    break
+
+        # Contiguous runs of removed rows, from the last one so the rows before a run
+        # don't change.
+        row = len(rows) - 1
+        while row >= 0:
+            if rows[row].node in position:
+                row -= 1
+                continue
+            last = row
+            while row >= 0 and rows[row].node not in position:
+                row -= 1
+            self.beginRemoveRows(parent, row + 1, last)
+            for removed in rows[row + 1:last + 1]:
+                self._forget(removed)
+            del rows[row + 1:last + 1]
+            self._renumber(rows, row + 1)
+            self.endRemoveRows()
+
+        # The rows left are still in the order of 'children'.
+        end = node.fetched
+        row = 0
+        pos = 0
+        while pos < end:
+            if row < len(rows) and rows[row].node == children[pos]:
+                row += 1
+                pos += 1
+                continue
+            first = pos
+            while pos < end and (row >= len(rows) or rows[row].node != children[pos]):
+                pos += 1
+            self.beginInsertRows(parent, row, row + pos - first - 1)
+            rows[row:row] = [self._newNode(child, node, row + offset)
+                             for offset, child in enumerate(children[first:pos])]
+            self._renumber(rows, row + pos - first)
+            row += pos - first
+            self.endInsertRows()
+        node.complete = node.fetched == len(children)
+
+    @staticmethod
+    def _renumber(rows, first):
+        for row in range(first, len(rows)):
+            rows[row].row = row
+
+    def _node(self, index):
+        if index.isValid():
+            return index.internalPointer()
+        return self._root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self._node(parent)
+        if node.children is None or not (0 <= row < len(node.children)) or \
+                not (0 <= column < 2):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is self._root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self._node(parent)
+        return len(node.children) if node.children is not None else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 2
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        node = self._node(parent)
+        # Rows that are about to be removed still count.
+        if node.children:
+            return True
+        if self._filter is None:
+            return self._trie.has_children(node.node)
+        return self._filter.count_below(node.node, include_node=False) > 0
+
+    def canFetchMore(self, parent):
+        if parent.column() > 0 or self._updating:
+            return False
+        node = self._node(parent)
+        if self._filter is None:
+            return node.fetched < self._trie.num_children(node.node)
+        return node.fetched < len(self._shownChildren(node))
+
+    def fetchMore(self, parent):
+        if self._updating:
+            return
+        node = self._node(parent)
+        if node.children is None:
+            node.children = []
+        children = self._shownChildren(node)
+        first = node.fetched
+        last = min(first + self._batch_size, len(children))
+        if last <= first:
+            return
+        row = len(node.children)
+        node.fetched = last
+        node.complete = last == len(children)
+        self._updating = True
+        try:
+            self.beginInsertRows(parent, row, row + last - first - 1)
+            node.children.extend(self._newNode(child, node, row + offset)
+                                 for offset, child in enumerate(children[first:last]))
+            self.endInsertRows()
+        finally:
+            self._updating = False
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        node = index.internalPointer().node
+        if index.column() == 0:
+            return self._trie.segment(node)
+        if self._trie.is_variable(node):
+            return self._trie.full_name(node)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ('Var', 'Value')[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def fullyQualifiedName(self, index):
+        ''' The dotted name of the variable (or branch) at 'index'. '''
+        return self._trie.full_name(self._node(index).node)
@@ -0,0 +1,339 @@
+from array import array
+from bisect import bisect_left
+
+# Node id of the root of every VarTrie. It has no segment and no parent.
+ROOT = 0
+
+# Number of prefixes update() remembers while adding names.
+PREFIX_CACHE_SIZE = 1 << 20
+
+
+class VarTrie(object):
+    ''' Prefix trie of dotted variable names:
+          e.g. foo.bar.baz.item1
+               foo.bar.baz.item2
+               foo.bar.qux.item1
+               etc...
+        Every node is one path segment (the substrings between the '.'). Nodes are plain
+        integer ids into packed arrays that hold the parent and the segment of every node,
+        and the segments are interned, so "x", "y" and "z" are stored once no matter how
+        many vectors there are. The full names aren't stored at all, they are rebuilt from
+        the parent pointers when needed.
+
+        The child table of a branch is a pair of arrays: the segment ids (sorted) and the
+        matching child nodes. Finding the child for a segment is a binary search, so
+        finding a name costs O(depth). The order of the segment ids is the order in which
+        the segments were first seen, children() sorts by the segment text on demand and
+        keeps that order until the branch changes.
+
+        A node is a variable if a name ends at it. Unlike the nested dict this replaces, a
+        node can be both a variable and a branch (e.g. "foo.bar" and "foo.bar.baz").
+
+        Removing a variable also removes the branches that no longer lead to a variable.
+        Node ids are never reused, a removed node keeps its parent but loses its segment
+        (see is_removed()), so ids held elsewhere stay unambiguous.
+    '''
+
+    def __init__(self, names=()):
+        # Interned segments
+        self._segments = []
+        self._segment_ids = {}
+
+        # Per node
+        self._parent = array('i', [-1])
+        self._segment = array('i', [-1])
+        self._is_variable = bytearray(1)
+        # Child table (None for leaves)
+        self._child_keys = [None]
+        self._child_nodes = [None]
+
+        # node -> children sorted by segment text, see children()
+        self._sorted = {}
+        self._num_variables = 0
+
+        self.update(names)
+
+    def __len__(self):
+        ''' The number of variables (not nodes) in the trie. '''
+        return self._num_variables
+
+    def __contains__(self, name):
+        node = self.find(name)
+        return node is not None and self._is_variable[node]
+
+    def __iter__(self):
+        return self.iter_variables()
+
+    def num_nodes(self):
+        return len(self._parent)
+
+    def segments(self):
+        ''' The interned segments, indexed by segment id. Don't modify the result. '''
+        return self._segments
+
+    def segment_ids(self):
+        '''
+            The segment id of every node (-1 for the root and removed nodes). Don't modify
+            the result.
+        '''
+        return self._segment
+
+    def _intern(self, segment):
+        segment_id = self._segment_ids.get(segment)
+        if segment_id is None:
+            segment_id = len(self._segments)
+            self._segments.append(segment)
+            self._segment_ids[segment] = segment_id
+        return segment_id
+
+    def _add_child(self, node, segment):
+        ''' The child of 'node' for 'segment', created if it doesn't exist yet. '''
+        segment_id = self._intern(segment)
+        keys = self._child_keys[node]
+        if keys is None:
+            keys = self._child_keys[node] = array('i')
+            self._child_nodes[node] = array('i')
+            pos = 0
+        else:
+            pos = bisect_left(keys, segment_id)
+            if pos < len(keys) and keys[pos] == segment_id:
+                return self._child_nodes[node][pos]
+
+        child = len(self._parent)
+        self._parent.append(node)
+        self._segment.append(segment_id)
+        self._is_variable.append(0)
+        self._child_keys.append(None)
+        self._child_nodes.append(None)
+        keys.insert(pos, segment_id)
+        self._child_nodes[node].insert(pos, child)
+        self._sorted.pop(node, None)
+        return child
+
+    def _add_path(self, name):
+        node = ROOT
+        for segment in name.split('.'):
+            node = self._add_child(node, segment)
+        return node
+
+    def _set_variable(self, node):
+        if not self._is_variable[node]:
+            self._is_variable[node] = 1
+            self._num_variables += 1
+
+    def add(self, name):
+        ''' Adds the variable 'name' and returns its node. '''
+        node = self._add_path(name)
+        self._set_variable(node)
+        return node
+
+    def _add_prefix(self, parents, prefix):
+        ''' The node of the branch 'prefix', using and filling the cache of update(). '''
+        node = parents.get(prefix)
+        if node is None:
+            parent, _, segment = prefix.rpartition('.')
+            node = parents[prefix] = self._add_child(self._add_prefix(parents, parent), segment)
+        return node
+
+    def update(self, names):
+        ''' Adds all variables in 'names'. '''
+        # Most names share their parent with other names (the x/y/z of a vector, the
+        # fields of a struct), so the parent nodes are cached by their prefix and usually
+        # only the last segment of a name has to be looked up. The cache only lives for
+        # this call and is cleared when it exceeds PREFIX_CACHE_SIZE entries.
+        parents = {'': ROOT}
+        segment_ids = self._segment_ids
+        parent = self._parent
+        segment = self._segment
+        is_variable = self._is_variable
+        child_keys = self._child_keys
+        child_nodes = self._child_nodes
+        sorted_children = self._sorted
+        added = 0
+
+        for name in names:
+            prefix, _, last = name.rpartition('.')
+            node = parents.get(prefix)
+            if node is None:
+                if len(parents) > PREFIX_CACHE_SIZE:
+                    parents.clear()
+                    parents[''] = ROOT
+                node = self._add_prefix(parents, prefix)
+
+            segment_id = segment_ids.get(last)
+            if segment_id is None:
+                segment_id = self._intern(last)
+
+            # Inlined _add_child, this loop runs once per name.
+            keys = child_keys[node]
+            child = None
+            if keys is None:
+                child_keys[node] = array('i', (segment_id,))
+                child_nodes[node] = array('i', (len(parent),))
+            else:
+                pos = bisect_left(keys, segment_id)
+                if pos < len(keys) and keys[pos] == segment_id:
+                    child = child_nodes[node][pos]
+                else:
+                    keys.insert(pos, segment_id)
+                    child_nodes[node].insert(pos, len(parent))
+                    if sorted_children:
+                        sorted_children.pop(node, None)
+
+            if child is None:
+                parent.append(node)
+                segment.append(segment_id)
+                is_variable.append(1)
+                child_keys.append(None)
+                child_nodes.append(None)
+                added += 1
+            elif not is_variable[child]:
+                is_variable[child] = 1
+                added += 1
+
+        self._num_variables += added
+
+    def remove(self, name):
+        '''
+            Removes the variable 'name' and the branches that only led to it. Returns the
+            topmost removed node (its parent is the branch that lost a child), or None if
+            the node stays because it still has children. Raises KeyError if 'name' is not
+            a variable.
+        '''
+        node = self.find(name)
+        if node is None or not self._is_variable[node]:
+            raise KeyError(name)
+        self._is_variable[node] = 0
+        self._num_variables -= 1
+
+        removed = None
+        while node != ROOT and not self._is_variable[node] and \
+                self._child_nodes[node] is None:
+            parent = self._parent[node]
+            keys = self._child_keys[parent]
+            pos = bisect_left(keys, self._segment[node])
+            del keys[pos]
+            del self._child_nodes[parent][pos]
+            if not keys:
+                self._child_keys[parent] = None
+                self._child_nodes[parent] = None
+            self._sorted.pop(parent, None)
+            self._segment[node] = -1
+            removed = node
+            node = parent
+        return removed
+
+    def is_removed(self, node):
+        return node != ROOT and self._segment[node] < 0
+
+    def child(self, node, segment):
+        ''' The child of 'node' for 'segment', or None. '''
+        segment_id = self._segment_ids.get(segment)
+        keys = self._child_keys[node]
+        if segment_id is None or keys is None:
+            return None
+        pos = bisect_left(keys, segment_id)
+        if pos < len(keys) and keys[pos] == segment_id:
+            return self._child_nodes[node][pos]
+        return None
+
+    def find(self, name):
+        ''' The node of 'name' (a variable or a branch), or None. '''
+        node = ROOT
+        for segment in name.split('.'):
+            node = self.child(node, segment)
+            if node is None:
+                return None
+        return node
+
+    def children(self, node=ROOT):
+        ''' The child nodes of 'node', sorted by segment. Don't modify the result. '''
+        children = self._sorted.get(node)
+        if children is None:
+            nodes = self._child_nodes[node]
+            if nodes is None:
+                return ()
+            segments = self._segments
+            segment = self._segment
+            children = array('i', sorted(nodes, key=lambda c: segments[segment[c]]))
+            self._sorted[node] = children
+        return children
+
+    def num_children(self, node=ROOT):
+        nodes = self._child_nodes[node]
+        return len(nodes) if nodes is not None else 0
+
+    def has_children(self, node=ROOT):
+        return self._child_nodes[node] is not None
+
+    def parent(self, node):
+        ''' The parent node, -1 for the root. '''
+        return self._parent[node]
+
+    def segment(self, node):
+        ''' The path segment of 'node', None for the root and removed nodes. '''
+        segment_id = self._segment[node]
+        return self._segments[segment_id] if segment_id >= 0 else None
+
+    def is_variable(self, node):
+        return bool(self._is_variable[node])
+
+    def depth(self, node):
+        depth = 0
+        while node != ROOT:
+            node = self._parent[node]
+            depth += 1
+        return depth
+
+    def full_name(self, node):
+        ''' The dotted name of 'node', found by following the parent pointers. '''
+        parts = []
+        segments = self._segments
+        while node != ROOT:
+            parts.append(segments[self._segment[node]])
+            node = self._parent[node]
+        return '.'.join(reversed(parts))
+
+    def iter_nodes(self, node=ROOT):
+        ''' All nodes below 'node' in depth first (sorted) order. '''
+        stack = [iter(self.children(node))]
+        while stack:
+            for child in stack[-1]:
+                yield child
+                if self._child_nodes[child] is not None:
+                    stack.append(iter(self.children(child)))
+                break
+            else:
+                stack.pop()
+
+    def iter_items(self, node=ROOT):
+        '''
+            (node, full name) of all nodes below 'node' (variables and branches) in depth
+            first (sorted) order.
+        '''
+        # Walk the subtree with a stack of (children iterator, prefix) so every name is
+        # built from its parent's prefix instead of by following the parent pointers.
+        segments = self._segments
+        segment = self._segment
+        child_nodes = self._child_nodes
+        prefix = self.full_name(node)
+        stack = [(iter(self.children(node)), prefix + '.' if prefix else '')]
+        while stack:
+            children, prefix = stack[-1]
+            for child in children:
+                name = prefix + segments[segment[child]]
+                yield child, name
+                if child_nodes[child] is not None:
+                    stack.append((iter(self.children(child)), name + '.'))
+                break
+            else:
+                stack.pop()
+
+    def iter_variables(self, node=ROOT):
+        ''' The full names of the variables in the subtree of 'node', in sorted order. '''
+        if node != ROOT and self._is_variable[node]:
+            yield self.full_name(node)
+        is_variable = self._is_variable
+        for child, name in self.iter_items(node):
+            if is_variable[child]:
+                yield name
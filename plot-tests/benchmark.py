@@ -0,0 +1,232 @@
+# This Python file uses the following encoding: utf-8
+'''
+    Headless benchmark of the load -> drag -> drop pipeline of the plot tool.
+
+    For every requested scale a synthetic log (same layout as test_data*.csv: tick, time
+    and a number of variables) is generated and every stage is timed in a fresh child
+    process, so the reported peak RSS belongs to that scale alone. One JSON object per
+    scale is written to stdout (or appended to --output), e.g.
+
+        python benchmark.py --scale 100000x10 --scale 1000000x10 --output bench.jsonl
+'''
+
+import os
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import json
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DEFAULT_SCALES = ("10000x10", "100000x10", "1000000x10", "100000x200")
+
+
+def parseScale(scale):
+    rows, cols = scale.lower().split('x')
+    return int(rows), int(cols)
+
+
+def generateLog(filename, rows, cols, chunk_rows=100000):
+    ''' Writes a synthetic log with 'rows' samples of 'cols' variables at 500 Hz. '''
+    rng = np.random.default_rng(0)
+    header = ','.join(['tick', 'time'] + [f"var{i+1}" for i in range(cols)])
+    with open(filename, 'w') as fp:
+        fp.write(header + '\n')
+        for start in range(0, rows, chunk_rows):
+            n = min(chunk_rows, rows - start)
+            tick = np.arange(start, start + n)
+            block = np.empty((n, cols + 2))
+            block[:, 0] = tick
+            block[:, 1] = (tick + 1) * 0.002
+            block[:, 2:] = np.cumsum(rng.standard_normal((n, cols)), axis=0)
+            np.savetxt(fp, block, delimiter=',', fmt=['%d', '%.17g'] + ['%.17g'] * cols)
+
+
+def peakRssMb():
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
+class _DropEvent(object):
+    ''' The parts of QDropEvent used by MyPlotWidget.dropEvent. '''
+    def __init__(self, mime_data, source):
+        self._mime_data = mime_data
+        self._source = source
+
+    def mimeData(self):
+        return self._mime_data
+
+    def source(self):
+        return self._source
+
+    def accept(self):
+        pass
+
+    def ignore(self):
+        pass
+
+
+def _waitFor(app, condition, timeout=600):
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise RuntimeError("Timed out")
+        app.processEvents()
+        time.sleep(0.0005)
+
+
+def runScale(filename, rows, cols, drops, drag_repeats):
+    from PyQt5.QtCore import QMimeData, Qt
+    from PyQt5.QtWidgets import QApplication
+
+    app = QApplication.instance() or QApplication([])
+
+    from column_store import ColumnStore
+    from data import VarListWidget, dataItemMimeType, encodeDataItemRef, decodeDataItemRef, \
+        lookupDataItem
+    from main import MyPlotWidget
+
+    file_mb = os.path.getsize(filename) / (1 << 20)
+    result = {'rows': rows, 'cols': cols, 'file_mb': round(file_mb, 3), 'stages': {}}
+    stages = result['stages']
+
+    def record(name, seconds, **extra):
+        stage = {'seconds': seconds, 'peak_rss_mb': round(peakRssMb(), 1)}
+        stage.update(extra)
+        stages[name] = stage
+
+    # Load: time until the variable list is filled and until the file is indexed.
+    shutil.rmtree(ColumnStore.defaultCacheDir(filename), ignore_errors=True)
+    start = time.perf_counter()
+    var_list = VarListWidget(None, filename)
+    model = var_list.dataModel()
+    _waitFor(app, lambda: model.rowCount() > 0)
+    header_s = time.perf_counter() - start
+    _waitFor(app, lambda: model.is_loaded)
+    load_s = time.perf_counter() - start
+    record('load', load_s, time_to_list_s=header_s, mb_per_s=file_mb / load_s,
+           rows_per_s=rows / load_s)
+
+    # Reopening uses the cached index.
+    start = time.perf_counter()
+    warm_list = VarListWidget(None, filename)
+    _waitFor(app, lambda: warm_list.dataModel().is_loaded)
+    record('reopen', time.perf_counter() - start)
+    warm_list.close()
+
+    var_names = [f"var{i+1}" for i in range(min(drops, cols))]
+
+    # Requesting the columns to drop (as pressing their items does) until they can be
+    # dragged: they are parsed in the background, the other columns are not.
+    start = time.perf_counter()
+    for name in var_names:
+        model.requestColumn(name)
+    _waitFor(app, lambda: all(model.isReady(name) for name in var_names))
+    record('parse_columns', time.perf_counter() - start, columns=len(var_names) + 1)
+
+    # The first access of a parsed column only maps it.
+    start = time.perf_counter()
+    model.time
+    for name in var_names:
+        model.item(name).data
+    record('map_columns', time.perf_counter() - start, columns=len(var_names) + 1)
+
+    # Drag: building the payload and resolving it again on the drop side.
+    start = time.perf_counter()
+    for i in range(drag_repeats):
+        name = var_names[i % len(var_names)]
+        mime_data = QMimeData()
+        mime_data.setData(dataItemMimeType(), encodeDataItemRef(model.file_id, name))
+        file_id, var_name = decodeDataItemRef(mime_data.data(dataItemMimeType()))
+        lookupDataItem(file_id, var_name)
+    drag_s = time.perf_counter() - start
+    record('drag', drag_s / drag_repeats, payload_bytes=mime_data.data(dataItemMimeType()).size(),
+           drags_per_s=drag_repeats / drag_s)
+
+    # Drop: building the pyramid, plotting and rendering the widget once per drop.
+    plot = MyPlotWidget()
+    plot.resize(1280, 720)
+    plot.show()
+    app.processEvents()
+    start = time.perf_counter()
+    for name in var_names:
+        mime_data = QMimeData()
+        mime_data.setData(dataItemMimeType(), encodeDataItemRef(model.file_id, name))
+        plot.dropEvent(_DropEvent(mime_data, var_list))
+        plot.grab()
+    drop_s = time.perf_counter() - start
+    record('drop', drop_s / len(var_names), drops=len(var_names),
+           rows_per_s=len(var_names) * rows / drop_s)
+
+    # Zoom: one level-of-detail update and repaint for a range change.
+    view_box = plot.pw.getPlotItem().getViewBox()
+    t_end = float(model.time[-1])
+    start = time.perf_counter()
+    for frac in (0.5, 0.1, 0.01, 1.0):
+        view_box.setXRange(0, t_end * frac, padding=0)
+        app.processEvents()
+        plot.grab()
+    record('zoom', (time.perf_counter() - start) / 4)
+
+    var_list.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--scale', action='append', default=[],
+                        help="ROWSxCOLS of a synthetic log (can be given several times)")
+    parser.add_argument('--drops', type=int, default=3, help="Variables dropped per run")
+    parser.add_argument('--drag-repeats', type=int, default=1000)
+    parser.add_argument('-o', '--output', help="Append the results to this file")
+    parser.add_argument('--workdir', help="Directory for the synthetic logs")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # Runs a single scale in this (fresh) process and prints the result.
+        rows, cols = parseScale(args.scale[0])
+        result = runScale(args.child, rows, cols, args.drops, args.drag_repeats)
+        print(json.dumps(result))
+        return 0
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="plot-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    for scale in args.scale or DEFAULT_SCALES:
+        rows, cols = parseScale(scale)
+        filename = os.path.join(workdir, f"bench_{rows}x{cols}.csv")
+        if not os.path.exists(filename):
+            generateLog(filename, rows, cols)
+
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', filename,
+                               '--scale', scale, '--drops', str(args.drops),
+                               '--drag-repeats', str(args.drag_repeats)],
+                              cwd=here, capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            return proc.returncode
+
+        # The child prints progress messages as well, the result is the last line.
+        line = proc.stdout.strip().splitlines()[-1]
+        if args.output:
+            with open(args.output, 'a') as fp:
+                fp.write(line + '\n')
+        print(line)
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnStore(object):
+    '''
+        On-disk columnar cache of a CSV log file.
+
+        Opening a file only parses the header and makes one pass over the raw bytes to
+        build a row-offset index (the byte offset of every ROW_BLOCK-th row). The columns
+        are parsed by parseColumns(), in one pass over the file for any number of them,
+        block by block and in parallel using the index. Every column goes into one
+        contiguous float64 file inside a cache directory next to the CSV. A parsed column
+        is memory-mapped and every later access (also after reopening the file) just maps
+        it again.
+
+        The cache directory holds one subdirectory per version (size and modification
+        time) of the CSV, so a cache that is in use is never replaced underneath a reader.
+    '''
+
+    VERSION = 3
+    ROW_BLOCK = 1 << 16
+    _META_FILE = "meta.json"
+    _READ_SIZE = 1 << 24
+
+    def __init__(self, filename, cache_dir=None, progress=None):
+        '''
+            'progress' is an optional callable that is passed the fraction (0 to 1) of the
+            file that has been indexed. It may raise an exception to abort the index pass.
+        '''
+        self._filename = os.path.abspath(filename)
+        self._progress = progress
+        if cache_dir is None:
+            cache_dir = ColumnStore.defaultCacheDir(self._filename)
+        self._cache_root = cache_dir
+        self._source = self._sourceStat()
+        self._cache_dir = os.path.join(cache_dir, "v{}-{}-{}".format(
+            ColumnStore.VERSION, self._source['size'], self._source['mtime_ns']))
+
+        meta = self._readMeta()
+        if meta is None:
+            meta = self._buildIndex()
+
+        self._columns = meta['columns']
+        self._num_rows = meta['num_rows']
+        self._block_offsets = meta['block_offsets']
+        self._col_index = {name: idx for idx, name in enumerate(self._columns)}
+        self._mapped = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def readHeader(filename):
+        ''' Returns the column names of the CSV file without reading any data. '''
+        return list(pd.read_csv(filename, nrows=0).columns)
+
+    @staticmethod
+    def defaultCacheDir(filename):
+        head, tail = os.path.split(os.path.abspath(filename))
+        return os.path.join(head, f".{tail}.colstore")
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def num_rows(self):
+        return self._num_rows
+
+    def __contains__(self, name):
+        return name in self._col_index
+
+    def isParsed(self, name):
+        return name in self._mapped or os.path.exists(self._columnPath(self._col_index[name]))
+
+    def column(self, name):
+        '''
+            Returns a read-only memory-mapped view of the column called 'name', parsing it
+            from the CSV first if it hasn't been parsed yet.
+        '''
+        try:
+            return self._mapped[name]
+        except KeyError:
+            pass
+
+        path = self._columnPath(self._col_index[name])
+        if not os.path.exists(path):
+            self.parseColumns([name])
+
+        with self._lock:
+            if name in self._mapped:
+                return self._mapped[name]
+            if self._num_rows == 0:
+                # np.memmap refuses to map empty files.
+                arr = np.empty(0, dtype=np.float64)
+            else:
+                arr = np.memmap(path, dtype=np.float64, mode='r', shape=(self._num_rows,))
+            self._mapped[name] = arr
+            return arr
+
+    def parseColumns(self, names, progress=None):
+        '''
+            Parses the columns 'names' that are not cached yet out of the CSV. The file is
+            only tokenized once for all of them. 'progress' is an optional callable that is
+            passed the fraction (0 to 1) of the rows that have been parsed. It may raise an
+            exception to abort the parse, which leaves no column behind.
+        '''
+        names = [name for name in names if not self.isParsed(name)]
+        if not names:
+            return
+
+        # The columns are written under temporary names and moved into place, so an
+        # interrupted parse never leaves a half-written column behind. Every parse has its
+        # own temporary files, the same column may be parsed by several loads at once.
+        tmp_paths = {}
+        try:
+            for name in names:
+                fd, tmp_paths[name] = tempfile.mkstemp(suffix=".tmp", dir=self._cache_dir)
+                os.close(fd)
+            if self._num_rows > 0:
+                self._parseBlocks(names, tmp_paths, progress)
+            for name in names:
+                os.replace(tmp_paths.pop(name), self._columnPath(self._col_index[name]))
+        finally:
+            for tmp_path in tmp_paths.values():
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _columnPath(self, idx):
+        return os.path.join(self._cache_dir, f"{idx}.f64")
+
+    def _sourceStat(self):
+        st = os.stat(self._filename)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    def _readMeta(self):
+        ''' Returns the cache metadata, or None if the cache is missing or stale. '''
+        try:
+            with open(os.path.join(self._cache_dir, ColumnStore._META_FILE)) as fp:
+                meta = json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('version') != ColumnStore.VERSION or meta.get('source') != self._source:
+            return None
+        return meta
+
+    def _buildIndex(self):
+        source = self._source
+        columns = ColumnStore.readHeader(self._filename)
+
+        # Find the line breaks in binary blocks. Like pandas, lines that only contain
+        # whitespace are skipped: the first other line is the header and data row 'r' is
+        # the one after it. The offset of every ROW_BLOCK-th row is kept.
+        is_content = np.ones(256, dtype=bool)
+        is_content[list(b' \t\r\n\x0b\x0c')] = False
+        block_offsets = []
+        lines = 0
+        pos = 0
+        # Start of the line that continues into the next block and whether it has content
+        line_start = 0
+        line_content = False
+        with open(self._filename, 'rb') as fp:
+            while True:
+                block = fp.read(ColumnStore._READ_SIZE)
+                if not block:
+                    break
+                data = np.frombuffer(block, dtype=np.uint8)
+                breaks = np.flatnonzero(data == ord('\n'))
+
+                # Every segment is a line including its line break, the last one is the
+                # (partial) line that runs to the end of the block.
+                segments = np.concatenate(([0], breaks + 1))
+                if segments[-1] == len(data):
+                    segments = segments[:-1]
+                content = np.logical_or.reduceat(is_content[data], segments)
+                starts = pos + segments
+                starts[0] = line_start
+                content[0] |= line_content
+
+                if len(breaks) and breaks[-1] + 1 < len(data):
+                    # The last segment is not complete yet.
+                    line_start = int(starts[-1])
+                    line_content = bool(content[-1])
+                    starts, content = starts[:-1], content[:-1]
+                elif len(breaks):
+                    line_start = pos + len(data)
+                    line_content = False
+                else:
+                    line_content = bool(content[0])
+                    starts, content = starts[:0], content[:0]
+
+                line_starts = starts[content]
+                line_numbers = lines + np.arange(len(line_starts))
+                keep = (line_numbers >= 1) & ((line_numbers - 1) % ColumnStore.ROW_BLOCK == 0)
+                block_offsets.extend(int(off) for off in line_starts[keep])
+                lines += len(line_starts)
+                pos += len(block)
+                if self._progress is not None:
+                    self._progress(pos / max(source['size'], 1))
+
+        # A last line without a line break
+        if line_content:
+            if lines >= 1 and (lines - 1) % ColumnStore.ROW_BLOCK == 0:
+                block_offsets.append(line_start)
+            lines += 1
+        num_rows = max(lines - 1, 0)
+
+        meta = {'version': ColumnStore.VERSION, 'source': source, 'columns': columns,
+                'num_rows': num_rows, 'block_offsets': block_offsets}
+
+        # The index is written to a new directory that is then moved into place, so a file
+        # that is opened twice at the same time never sees a half-built cache.
+        os.makedirs(self._cache_root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp", dir=self._cache_root)
+        with open(os.path.join(tmp_dir, ColumnStore._META_FILE), 'w') as fp:
+            json.dump(meta, fp)
+        try:
+            os.rename(tmp_dir, self._cache_dir)
+        except OSError:
+            # Another load of the same file was faster. Its index is just as good.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            current = self._readMeta()
+            if current is None:
+                raise
+            meta = current
+        self._removeStaleCaches(source)
+        return meta
+
+    def _removeStaleCaches(self, source):
+        ''' Removes the caches of older versions of the CSV (and of older cache formats). '''
+        for entry in os.listdir(self._cache_root):
+            if entry.startswith(".tmp"):
+                # A build that may still be running
+                continue
+            path = os.path.join(self._cache_root, entry)
+            try:
+                version, size, mtime_ns = entry[1:].split('-')
+                stale = int(version) != ColumnStore.VERSION or int(mtime_ns) < source['mtime_ns']
+            except ValueError:
+                # The files of the flat cache layout of older versions
+                stale = True
+            if not stale:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _parseBlock(self, names, block_idx, outs):
+        start = self._block_offsets[block_idx]
+        with open(self._filename, 'rb') as fp:
+            fp.seek(start)
+            if block_idx + 1 < len(self._block_offsets):
+                raw = fp.read(self._block_offsets[block_idx + 1] - start)
+            else:
+                raw = fp.read()
+
+        frame = pd.read_csv(io.BytesIO(raw), header=None, names=self._columns, usecols=names)
+
+        row0 = block_idx * ColumnStore.ROW_BLOCK
+        rows = min(len(frame), self._num_rows - row0)
+        for name in names:
+            values = frame[name].to_numpy(dtype=np.float64, na_value=np.nan)
+            outs[name][row0:row0 + rows] = values[:rows]
+
+    def _parseBlocks(self, names, paths, progress):
+        outs = {}
+        for name in names:
+            outs[name] = np.memmap(paths[name], dtype=np.float64, mode='w+',
+                                   shape=(self._num_rows,))
+            outs[name][:] = np.nan
+
+        # Thanks to the row index the blocks are independent. The tokenizer releases the
+        # GIL, so the blocks are parsed in parallel.
+        num_blocks = len(self._block_offsets)
+        with ThreadPoolExecutor() as pool:
+            futures = [pool.submit(self._parseBlock, names, block_idx, outs)
+                       for block_idx in range(num_blocks)]
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    future.result()
+                    if progress is not None:
+                        progress(done / num_blocks)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        for out in outs.values():
+            out.flush()
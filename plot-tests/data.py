@@ -2,23 +2,81 @@
 
 #from PyQt5 import QtGui
 from PyQt5.QtGui import QDrag
-from PyQt5.QtCore import QAbstractListModel, QModelIndex, QVariant, Qt, pyqtSignal, QMimeData
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QTabWidget, QListView
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QVariant, Qt, pyqtSignal, QMimeData, \
+    QByteArray, QDataStream, QIODevice, QObject, QRunnable, QThreadPool, QTimer, \
+    QSortFilterProxyModel, QRegularExpression
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QTabWidget, QListView, QProgressBar, QLineEdit
 
 
+import itertools
 import numpy as np
-import pandas as pd
-import pickle
 import random
 
+from column_store import ColumnStore
+from tail import CsvTail
+from timebase import internTimeBase
+
+
+def dataItemMimeType():
+    return "application/x-DataItem"
+
+# All models of the currently open files, keyed by their file id. Drag payloads only carry
+# a (file id, variable name) reference that the drop side resolves against this registry,
+# so the cost of a drag does not depend on the length of the data.
+_model_registry = {}
+_file_ids = itertools.count(1)
+
+def registerModel(model):
+    file_id = next(_file_ids)
+    _model_registry[file_id] = model
+    return file_id
+
+def unregisterModel(file_id):
+    _model_registry.pop(file_id, None)
+
+def lookupDataItem(file_id, var_name):
+    ''' Returns the DataItem for 'var_name' in the file 'file_id' or None if that file has
+        been closed in the meantime.
+    '''
+    model = _model_registry.get(file_id)
+    if model is None:
+        return None
+    return model.item(var_name)
+
+def encodeDataItemRef(file_id, var_name):
+    item_ref = QByteArray()
+    data_stream = QDataStream(item_ref, QIODevice.WriteOnly)
+    data_stream.writeUInt32(file_id)
+    data_stream.writeQString(var_name)
+    return item_ref
+
+def decodeDataItemRef(item_ref):
+    data_stream = QDataStream(item_ref, QIODevice.ReadOnly)
+    file_id = data_stream.readUInt32()
+    var_name = data_stream.readQString()
+    return file_id, var_name
+
+
+def globToRegularExpression(pattern):
+    ''' Regular expression for the glob 'pattern' ('*' and '?'), matching whole names. '''
+    parts = []
+    for char in pattern:
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        else:
+            parts.append(QRegularExpression.escape(char))
+    return QRegularExpression('^' + ''.join(parts) + '$')
+
+
 class DataItem(object):
     '''
         Data structure for storing data items in the list widget
     '''
-    def __init__(self, var_name, data):
+    def __init__(self, var_name, model):
         self._var_name = var_name
-        self._data = data
-        self._time = None
+        self._model = model
         self.file = None
 
     @property
@@ -27,31 +85,296 @@ class DataItem(object):
 
     @property
     def data(self):
-        return self._data
+        # The column is mapped from the cache on first access (and parsed first if that
+        # hasn't been requested, see DataModel.requestColumn).
+        return self._model.column(self._var_name)
 
     @property
     def time(self):
-        return self._time
+        return self._model.time
+
+    @property
+    def model(self):
+        return self._model
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class FileLoaderSignals(QObject):
+    '''
+        QRunnable is not a QObject, so the signals of the loader (and of the column parser)
+        live here. The object is created on the GUI thread, which makes all connections to
+        it queued.
+    '''
+    header = pyqtSignal(list)
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class FileLoader(QRunnable):
+    '''
+        Parses the header and indexes the rows of a file (or opens its cached index) on a
+        worker thread. Several files are loaded in parallel by the thread pool; the scan
+        for line breaks happens in numpy with the GIL released.
+    '''
+    def __init__(self, filename):
+        super().__init__()
+        self._filename = filename
+        self._cancelled = False
+        self._percent = -1
+        self.signals = FileLoaderSignals()
+
+    def cancel(self):
+        self._cancelled = True
+
+    def _reportProgress(self, fraction):
+        if self._cancelled:
+            raise LoadCancelled()
+        # Only forward whole percent steps so that the GUI thread is not flooded.
+        percent = int(100 * fraction)
+        if percent != self._percent:
+            self._percent = percent
+            self.signals.progress.emit(percent)
+
+    def _load(self):
+        self.signals.header.emit(ColumnStore.readHeader(self._filename))
+        return ColumnStore(self._filename, progress=self._reportProgress)
+
+    def run(self):
+        try:
+            result = self._load()
+        except LoadCancelled:
+            return
+        except Exception as e:
+            self.signals.failed.emit(f"Failed to load {self._filename}: {e}")
+            return
+        self.signals.finished.emit(result)
+
+
+class ColumnParser(FileLoader):
+    '''
+        Parses the columns 'names' of an indexed file into its ColumnStore on a worker
+        thread, in one pass over the file. Finishes with the list of names.
+    '''
+    def __init__(self, store, names):
+        super().__init__(store.filename)
+        self._store = store
+        self._names = names
+
+    def _load(self):
+        self._store.parseColumns(self._names, progress=self._reportProgress)
+        return self._names
 
 
 class DataModel(QAbstractListModel):
-    def __init__(self, filename, parent=None):
+
+    # Number of requested columns that are parsed in one pass over the file.
+    PARSE_BATCH = 4
+
+    loadProgress = pyqtSignal(int)
+    loaded = pyqtSignal()
+    dataAppended = pyqtSignal()
+
+    def __init__(self, filename, tail=False, refresh_rate=30, parent=None):
+        '''
+            With 'tail' set, the file is followed as it grows instead of being loaded once.
+            New rows are picked up 'refresh_rate' times per second.
+        '''
         super().__init__(parent)
 
-        # Produce random data:
-        data = pd.read_csv(filename)
+        # The variable list is filled in as soon as the header has been parsed. A column is
+        # only parsed once it is requested (pressing its item does that) and until then
+        # its item can't be dragged, so a drop never has to parse anything on the GUI
+        # thread. Requested columns are parsed on the thread pool, the latest requests
+        # first.
+        self._store = None
+        self._ready = set()
+        self._requested = []
+        self._parser = None
+        self._tail = None
+        self._loader = None
+        self._time_base = None
         self._data = []
-        for var in sorted(data.columns):
-            self._data.append(DataItem(var, data[var]))
-        self._time = data['time']
+        self._items = {}
+        self._progress = 0
+
+        self._file_id = registerModel(self)
+
+        if tail:
+            # Everything appended between two polls is parsed in one go, so polling at the
+            # refresh rate also throttles the updates of the plots.
+            self._tail = CsvTail(filename)
+            self._progress = 100
+            self._tail_timer = QTimer(self)
+            self._tail_timer.timeout.connect(self._pollTail)
+            self._tail_timer.start(int(1000 / refresh_rate))
+            self._pollTail()
+            return
+
+        # The header and the row index are read on the thread pool. Columns that are cached
+        # already can be used as soon as the index is there.
+        self._loader = FileLoader(filename)
+        self._loader.signals.header.connect(self._setColumns)
+        self._loader.signals.progress.connect(self._setProgress)
+        self._loader.signals.finished.connect(self._setStore)
+        self._loader.signals.failed.connect(self._loadFailed)
+        QThreadPool.globalInstance().start(self._loader)
+
+    @property
+    def file_id(self):
+        return self._file_id
+
+    @property
+    def is_loaded(self):
+        return self._store is not None or self._tail is not None
+
+    @property
+    def is_parsing(self):
+        return self._parser is not None
+
+    @property
+    def is_tailing(self):
+        return self._tail is not None
+
+    @property
+    def progress(self):
+        return self._progress
+
+    @property
+    def total_rows(self):
+        ''' Number of rows appended to a tailed file since its header was (re)read. '''
+        return self._tail.total_rows
+
+    def item(self, var_name):
+        return self._items.get(var_name)
+
+    def isReady(self, var_name):
+        ''' Whether the column of 'var_name' and the time have been parsed. '''
+        if self._tail is not None:
+            return True
+        return var_name in self._ready and ('time' in self._ready or 'time' not in self._store)
+
+    def requestColumn(self, var_name):
+        '''
+            Queues the column of 'var_name' (and the time) to be parsed in the background,
+            ahead of the columns that were requested before. The item becomes draggable
+            once it has been parsed.
+        '''
+        if self._tail is not None:
+            return
+        names = [var_name, 'time'] if var_name != 'time' else [var_name]
+        for name in reversed(names):
+            if name in self._ready or name not in self._items:
+                continue
+            if name in self._requested:
+                self._requested.remove(name)
+            self._requested.insert(0, name)
+        self._parseNext()
+
+    def close(self):
+        if self._loader is not None:
+            self._loader.cancel()
+        if self._parser is not None:
+            self._parser.cancel()
+        if self._tail is not None:
+            self._tail_timer.stop()
+        unregisterModel(self._file_id)
+
+    def column(self, name):
+        if self._tail is not None:
+            return self._tail.column(name)
+        return self._store.column(name)
 
     @property
     def time(self):
-        return self._time
+        if self._tail is not None:
+            # The time of a tailed file changes with every poll, but it already is a single
+            # ring buffer that is shared by all variables of the file.
+            return self._tail.column('time')
+        # Identical time vectors (of this file or any other open file) share one buffer.
+        if self._time_base is None:
+            self._time_base = internTimeBase(self._store.column('time'))
+        return self._time_base.values
+
+    def _pollTail(self):
+        try:
+            header_changed, rows = self._tail.poll()
+        except Exception as e:
+            print(f"Failed to read {self._tail.filename}: {e}")
+            return
+        if header_changed:
+            self._setColumns(self._tail.columns or [])
+        if rows > 0:
+            self.dataAppended.emit()
+
+    def _setColumns(self, columns):
+        self.beginResetModel()
+        self._data = [DataItem(var, self) for var in sorted(columns)]
+        self._items = {item.var_name: item for item in self._data}
+        self.endResetModel()
+
+    def _setProgress(self, percent):
+        self._progress = percent
+        self.loadProgress.emit(percent)
+
+    def _setStore(self, store):
+        self._store = store
+        self._setReady(name for name in store.columns if store.isParsed(name))
+        self._setProgress(100)
+        self.loaded.emit()
+        self._parseNext()
+
+    def _parseNext(self):
+        ''' Starts parsing the next few requested columns, unless a parse is running. '''
+        if self._parser is not None or self._store is None:
+            return
+        names = []
+        while self._requested and len(names) < DataModel.PARSE_BATCH:
+            name = self._requested.pop(0)
+            if name in self._store and name not in self._ready:
+                names.append(name)
+        if not names:
+            return
+        self._parser = ColumnParser(self._store, names)
+        self._parser.signals.progress.connect(self._setProgress)
+        self._parser.signals.finished.connect(self._parseFinished)
+        self._parser.signals.failed.connect(self._parseFailed)
+        self._setProgress(0)
+        QThreadPool.globalInstance().start(self._parser)
+
+    def _parseFinished(self, names):
+        self._parser = None
+        self._setReady(names)
+        self._setProgress(100)
+        self._parseNext()
+
+    def _parseFailed(self, message):
+        self._parser = None
+        self._loadFailed(message)
+        self._setProgress(100)
+        self._parseNext()
+
+    def _setReady(self, names):
+        self._ready.update(names)
+        if self._data:
+            self.dataChanged.emit(self.index(0), self.index(len(self._data) - 1))
+
+    def _loadFailed(self, message):
+        print(message)
 
     def rowCount(self, parent=QModelIndex()):
         return len(self._data)
 
+    def flags(self, index):
+        if not index.isValid() or not self.is_loaded:
+            return Qt.NoItemFlags
+        if not self.isReady(self._data[index.row()].var_name):
+            return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+
     def data(self, index, role):
         if role == Qt.DisplayRole:
             item = self._data[index.row()]
@@ -68,13 +391,29 @@ class DataFileWidget(QWidget):
 
         layout = QVBoxLayout(self)
 
+        # Filters the variable list of the current tab by name.
+        self.filter = QLineEdit()
+        self.filter.setPlaceholderText("Filter, e.g. HX.tau or *.HX.q")
+        self.filter.setClearButtonEnabled(True)
+        self.filter.textChanged.connect(self._applyFilter)
+        layout.addWidget(self.filter)
+
         self.tabs = QTabWidget()
         self.tabs.setTabsClosable(True)
         self.tabs.tabCloseRequested.connect(self.closeFile)
+        self.tabs.currentChanged.connect(self._updateProgress)
+        self.tabs.currentChanged.connect(self._applyFilter)
         layout.addWidget(self.tabs)
 
-    def openFile(self, filename):
-        var_list = VarListWidget(self, filename)
+        # Shows the load progress of the current tab while its file is being loaded.
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 100)
+        self.progress.hide()
+        layout.addWidget(self.progress)
+
+    def openFile(self, filename, tail=False):
+        var_list = VarListWidget(self, filename, tail)
+        var_list.dataModel().loadProgress.connect(self._updateProgress)
         # Create a new tab and add the varListWidget to it.
         self.tabs.addTab(var_list, filename)
         self.tabs.setCurrentWidget(var_list)
@@ -85,42 +424,81 @@ class DataFileWidget(QWidget):
         self.tabs.widget(index).deleteLater()
         self.tabs.removeTab(index)
 
+    def _updateProgress(self, *args):
+        var_list = self.tabs.currentWidget()
+        model = var_list.dataModel() if var_list is not None else None
+        if model is None or (model.is_loaded and not model.is_parsing):
+            self.progress.hide()
+        else:
+            self.progress.setValue(model.progress)
+            self.progress.show()
+
+    def _applyFilter(self, *args):
+        var_list = self.tabs.currentWidget()
+        if var_list is not None:
+            var_list.setFilter(self.filter.text())
+
 
 
 class VarListWidget(QListView):
 
     onClose = pyqtSignal()
 
-    def __init__(self, parent, filename):
+    def __init__(self, parent, filename, tail=False):
         super().__init__(parent)
 
-        model = DataModel(filename)
+        # Keep a reference to the model, the registry only tracks open files.
+        self._model = DataModel(filename, tail=tail)
 
-        self.setModel(model)
+        # The view shows the variables through a proxy that filters them by name.
+        self._proxy = QSortFilterProxyModel(self)
+        self._proxy.setSourceModel(self._model)
+        self.setModel(self._proxy)
 
         self.setDragEnabled(True)
 
         self.filename = filename
 
+    def dataModel(self):
+        return self._model
+
+    def setFilter(self, text):
+        '''
+            Only shows the variables that contain 'text', or that match it as a whole if it
+            is a glob pattern (contains '*' or '?').
+        '''
+        if '*' in text or '?' in text:
+            self._proxy.setFilterRegularExpression(globToRegularExpression(text))
+        else:
+            self._proxy.setFilterFixedString(text)
+
     def close(self):
         print(f"Emitting 'onClose' signal for {self.filename}")
+        self._model.close()
         self.onClose.emit()
 
+    def mousePressEvent(self, e):
+        # Pressing a variable whose column hasn't been parsed yet requests it, so it can
+        # be dragged as soon as that is done.
+        index = self.indexAt(e.pos())
+        if index.isValid() and not (index.flags() & Qt.ItemIsDragEnabled):
+            self._model.requestColumn(self.model().data(index, Qt.UserRole).var_name)
+        super().mousePressEvent(e)
+
     def mouseMoveEvent(self, e):
         self.startDrag(e)
 
     def startDrag(self, e):
         index = self.indexAt(e.pos())
-        if not index.isValid():
+        if not index.isValid() or not (index.flags() & Qt.ItemIsDragEnabled):
             return
 
         selected = self.model().data(index, Qt.UserRole)
-        selected._time = self.model().time
-        # selected.file = self;
 
-        bstream = pickle.dumps(selected)
+        # Only a reference to the item is put into the payload, the data stays where it is.
         mimeData = QMimeData()
-        mimeData.setData("application/x-DataItem", bstream)
+        mimeData.setData(dataItemMimeType(),
+                         encodeDataItemRef(self._model.file_id, selected.var_name))
 
         drag = QDrag(self)
         drag.setMimeData(mimeData)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+
+class MinMaxPyramid(object):
+    '''
+        Multi-resolution min/max decimation of a (time, data) series.
+
+        Level 0 is the raw data. Every further level splits the samples into bins that are
+        'factor' times wider than the bins of the level below and keeps the index and
+        value of the minimum and the maximum of each bin. Drawing the min and max sample of
+        every bin in the order they occur means that peaks are never lost, no matter how
+        far the view is zoomed out.
+
+        New samples are added with extend(), which only reduces the bins at the end of
+        every level again, so a series that grows is not decimated from scratch each time.
+    '''
+
+    def __init__(self, time, data, factor=8, min_bins=256):
+        self._time = time
+        self._data = data
+        self._factor = factor
+        self._min_bins = min_bins
+        # Samples [_start, _size) of the arrays are in use. Until extend() is called the
+        # arrays are the ones that were passed in and they are never written to.
+        self._start = 0
+        self._size = len(data)
+        self._owned = False
+
+        # Each level is a list of [bin_size, imin, imax, vmin, vmax, num_bins]. The bins are
+        # counted from the start of the arrays, also when samples have been dropped.
+        self._levels = []
+        self._reduce(0)
+
+    @property
+    def num_levels(self):
+        return len(self._levels) + 1
+
+    def extend(self, time, data, keep=None):
+        '''
+            Appends the samples (time, data). Only the bins from the last (partial) one of
+            every level on are reduced again. With 'keep' given, only the last 'keep'
+            samples remain in the pyramid afterwards, like in a ring buffer of that size.
+        '''
+        k = len(data)
+        start = self._start
+        size = self._size
+        if not self._owned or size + k > len(self._data):
+            # Out of room: the samples in use move to new arrays that have room for as many
+            # again and the levels are rebuilt. When following a ring buffer that happens
+            # once every time it wraps, so appending stays O(1) amortized.
+            used = size - start
+            capacity = 2 * max(used + k, self._min_bins)
+            self._time = MinMaxPyramid._moved(self._time[start:size], capacity)
+            self._data = MinMaxPyramid._moved(self._data[start:size], capacity)
+            self._start = start = 0
+            self._size = size = used
+            self._owned = True
+            self._levels = []
+
+        self._time[size:size + k] = time
+        self._data[size:size + k] = data
+        self._size = size + k
+        if keep is not None:
+            self._start = max(start, self._size - keep)
+        self._reduce(size)
+
+    @staticmethod
+    def _moved(values, capacity):
+        arr = np.empty(capacity, dtype=np.float64)
+        arr[:len(values)] = values
+        return arr
+
+    def _reduce(self, changed):
+        ''' Reduces the bins of every level that depend on the samples from 'changed' on. '''
+        factor = self._factor
+        n = self._size - self._start
+        bin_size = factor
+        lower = None
+        depth = 0
+        while n // (bin_size // factor) > self._min_bins:
+            first = changed // factor
+            if depth == len(self._levels):
+                first = 0
+                self._levels.append([bin_size, None, None, None, None, 0])
+            level = self._levels[depth]
+
+            if lower is None:
+                imin, imax, vmin, vmax = MinMaxPyramid._reduceRaw(
+                    self._data[first * factor:self._size], factor)
+                imin += first * factor
+                imax += first * factor
+            else:
+                _, imin, imax, vmin, vmax, count = lower
+                lo = first * factor
+                imin, imax, vmin, vmax = MinMaxPyramid._reduceLevel(
+                    imin[lo:count], imax[lo:count], vmin[lo:count], vmax[lo:count], factor)
+
+            count = first + len(imin)
+            for k, values in enumerate((imin, imax, vmin, vmax), 1):
+                level[k] = MinMaxPyramid._grow(level[k], first, count, values.dtype)
+                level[k][first:count] = values
+            level[5] = count
+
+            lower = level
+            changed = first
+            bin_size *= factor
+            depth += 1
+
+    @staticmethod
+    def _grow(arr, used, needed, dtype):
+        '''
+            Returns 'arr', or if it can't hold 'needed' values, a larger array with its first
+            'used' values.
+        '''
+        if arr is not None and len(arr) >= needed:
+            return arr
+        grown = np.empty(max(needed, 2 * len(arr) if arr is not None else 0), dtype=dtype)
+        if arr is not None:
+            grown[:used] = arr[:used]
+        return grown
+
+    @staticmethod
+    def _reduceRaw(data, factor):
+        n = len(data)
+        n_full = n // factor
+
+        bins = np.asarray(data[:n_full * factor]).reshape(n_full, factor)
+        offsets = np.arange(n_full) * factor
+        amin = bins.argmin(axis=1)
+        amax = bins.argmax(axis=1)
+        rows = np.arange(n_full)
+        imin = offsets + amin
+        imax = offsets + amax
+        vmin = bins[rows, amin]
+        vmax = bins[rows, amax]
+
+        if n_full * factor < n:
+            tail = np.asarray(data[n_full * factor:])
+            imin = np.append(imin, n_full * factor + tail.argmin())
+            imax = np.append(imax, n_full * factor + tail.argmax())
+            vmin = np.append(vmin, tail.min())
+            vmax = np.append(vmax, tail.max())
+
+        return imin, imax, vmin, vmax
+
+    @staticmethod
+    def _reduceLevel(imin, imax, vmin, vmax, factor):
+        n = len(vmin)
+        n_full = n // factor
+        rows = np.arange(n_full)
+
+        vmin_bins = vmin[:n_full * factor].reshape(n_full, factor)
+        vmax_bins = vmax[:n_full * factor].reshape(n_full, factor)
+        amin = vmin_bins.argmin(axis=1)
+        amax = vmax_bins.argmax(axis=1)
+        new_imin = imin[:n_full * factor].reshape(n_full, factor)[rows, amin]
+        new_imax = imax[:n_full * factor].reshape(n_full, factor)[rows, amax]
+        new_vmin = vmin_bins[rows, amin]
+        new_vmax = vmax_bins[rows, amax]
+
+        if n_full * factor < n:
+            start = n_full * factor
+            tmin = start + vmin[start:].argmin()
+            tmax = start + vmax[start:].argmax()
+            new_imin = np.append(new_imin, imin[tmin])
+            new_imax = np.append(new_imax, imax[tmax])
+            new_vmin = np.append(new_vmin, vmin[tmin])
+            new_vmax = np.append(new_vmax, vmax[tmax])
+
+        return new_imin, new_imax, new_vmin, new_vmax
+
+    def select(self, x_min=None, x_max=None, pixels=1000):
+        '''
+            Returns the (x, y) arrays to draw for the time window [x_min, x_max] on a plot
+            that is 'pixels' wide. The coarsest level that still has at least one bin per
+            pixel is used. The time vector must be monotonically increasing.
+        '''
+        start = self._start
+        n = self._size
+        if n == start:
+            return np.empty(0), np.empty(0)
+
+        # Include one sample on either side of the window so the curve runs off the edges
+        # of the plot instead of stopping short.
+        time = self._time[start:n]
+        i0 = start
+        i1 = n
+        if x_min is not None:
+            i0 = max(start + int(np.searchsorted(time, x_min, side='left')) - 1, start)
+        if x_max is not None:
+            i1 = min(start + int(np.searchsorted(time, x_max, side='right')) + 1, n)
+        if i1 <= i0:
+            return np.empty(0), np.empty(0)
+
+        samples_per_pixel = (i1 - i0) / max(pixels, 1)
+        level = None
+        for lvl in self._levels:
+            if lvl[0] > samples_per_pixel:
+                break
+            level = lvl
+
+        if level is None:
+            return np.asarray(self._time[i0:i1]), np.asarray(self._data[i0:i1])
+
+        bin_size, imin, imax, vmin, vmax, num_bins = level
+        b0 = i0 // bin_size
+        b1 = min(-(-i1 // bin_size), num_bins)
+
+        lo = imin[b0:b1]
+        hi = imax[b0:b1]
+        min_first = lo <= hi
+        idx = np.empty(2 * len(lo), dtype=np.int64)
+        idx[0::2] = np.where(min_first, lo, hi)
+        idx[1::2] = np.where(min_first, hi, lo)
+        y = np.empty(2 * len(lo), dtype=np.float64)
+        y[0::2] = np.where(min_first, vmin[b0:b1], vmax[b0:b1])
+        y[1::2] = np.where(min_first, vmax[b0:b1], vmin[b0:b1])
+
+        # The first and last bin may reach past the window, which matters when their
+        # extremes are samples that have already been dropped.
+        inside = (idx >= i0) & (idx < i1)
+        idx = idx[inside]
+        y = y[inside]
+
+        # Always keep the first and last sample of the window so that the extent of the
+        # curve does not change between levels (this keeps auto-ranging stable).
+        idx = np.concatenate(([i0], idx, [i1 - 1]))
+        y = np.concatenate(([self._data[i0]], y, [self._data[i1 - 1]]))
+
+        return np.asarray(self._time)[idx], y
@@ -1,17 +1,19 @@
 # This Python file uses the following encoding: utf-8
 from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QSizePolicy
-from PyQt5.QtCore import QSize, QVariant
+from PyQt5.QtCore import QSize
 from PyQt5.QtGui import QPalette
 
+import argparse
 import pyqtgraph as pg
 
-import pickle
+import numpy as np
 
 from data import DataFileWidget
-from data import DataItem
+from data import dataItemMimeType, decodeDataItemRef, lookupDataItem
+from decimate import MinMaxPyramid
 
 class PlotTool(QMainWindow):
-    def __init__(self):
+    def __init__(self, tail_files=()):
         QMainWindow.__init__(self)
 
         self.setMinimumSize(QSize(640, 480))
@@ -32,6 +34,10 @@ class PlotTool(QMainWindow):
         for idx in range(3):
             data_file_widget.openFile(f"test_data{idx+1}.csv")
 
+        # Files that are still being written are followed as they grow.
+        for filename in tail_files:
+            data_file_widget.openFile(filename, tail=True)
+
         
 class MyPlotWidget(QWidget):
     COLORS=('r','g','b','c','m')
@@ -56,33 +62,115 @@ class MyPlotWidget(QWidget):
 
         self.cidx = 0
 
+        # Every curve is drawn from a min/max pyramid. Only the level of detail that
+        # matches the visible range and the width of the plot is handed to pyqtgraph.
+        self._pyramids = {}
+        # Plot item -> [data item, rows seen, dataAppended connection] of tailed curves
+        self._tails = {}
+        view_box = self.pw.getPlotItem().getViewBox()
+        view_box.sigXRangeChanged.connect(self.updateLevelOfDetail)
+        view_box.sigResized.connect(self.updateLevelOfDetail)
+
     def dragEnterEvent(self, e):
-        if e.mimeData().hasFormat("application/x-DataItem"):
+        if e.mimeData().hasFormat(dataItemMimeType()):
             e.accept()
         else:
             e.ignore()
 
     def dropEvent(self, e):
-        data = e.mimeData()
-        bstream = data.retrieveData("application/x-DataItem", QVariant.ByteArray)
-        selected = pickle.loads(bstream)
+        file_id, var_name = decodeDataItemRef(e.mimeData().data(dataItemMimeType()))
+        selected = lookupDataItem(file_id, var_name)
+        if selected is None:
+            # The file was closed while the drag was in progress.
+            e.ignore()
+            return
 
         name = f"{e.source().filename} : {selected.var_name}"
-        
-        print(type(selected.data))
-        item = self.pw.getPlotItem().plot(x=selected.time.to_numpy(),
-                                          y=selected.data.to_numpy(),
+
+        pyramid = MyPlotWidget.buildPyramid(selected)
+        x_min, x_max = self._visibleXRange()
+        x, y = pyramid.select(x_min, x_max, self._plotWidthPixels())
+        item = self.pw.getPlotItem().plot(x=x, y=y,
                                           pen=pg.mkPen(color=MyPlotWidget.COLORS[self.cidx],
                                                        width=2),
                                           name=name)
+        self._pyramids[item] = pyramid
+        # Curves of files that are being tailed are extended whenever new rows come in.
+        if selected.model.is_tailing:
+            connection = selected.model.dataAppended.connect(lambda : self.extendItem(item))
+            self._tails[item] = [selected, selected.model.total_rows, connection]
         label = self.makeLabel(item)
         self._labels.insertWidget(self._labels.count()-1, label)
         e.source().onClose.connect(lambda : self.removeItem(item, label))
         
-        self.pw.autoRange()
+        # Keep auto-ranging (until the user pans or zooms) so that the view follows
+        # curves that grow while a file is being tailed.
+        self.pw.enableAutoRange()
         self.cidx = (self.cidx + 1) % len(MyPlotWidget.COLORS)
         e.accept()
 
+    def _visibleXRange(self):
+        # Nothing has been plotted yet, so the current view range is meaningless. While
+        # the x axis auto-ranges the whole curve must be handed over, otherwise the view
+        # would never grow to include data that is appended to a tailed file.
+        view_box = self.pw.getPlotItem().getViewBox()
+        if not self._pyramids or view_box.autoRangeEnabled()[0]:
+            return None, None
+        return view_box.viewRange()[0]
+
+    def _plotWidthPixels(self):
+        return max(int(self.pw.getPlotItem().getViewBox().width()), 1)
+
+    def updateLevelOfDetail(self, *args):
+        x_min, x_max = self._visibleXRange()
+        pixels = self._plotWidthPixels()
+        for item, pyramid in self._pyramids.items():
+            x, y = pyramid.select(x_min, x_max, pixels)
+            item.setData(x=x, y=y)
+
+    @staticmethod
+    def buildPyramid(selected):
+        time = selected.time
+        data = selected.data
+        if selected.model.is_tailing:
+            # The ring buffers of a tailed file are overwritten in place, so the pyramid
+            # needs its own copy.
+            time = np.array(time)
+            data = np.array(data)
+        return MinMaxPyramid(np.asarray(time), np.asarray(data))
+
+    def extendItem(self, item):
+        if item not in self._tails:
+            return
+        selected, seen_rows, connection = self._tails[item]
+        model = selected.model
+        current = model.item(selected.var_name)
+        if current is None or model.item('time') is None:
+            # The column is gone since the header of the file changed. The curve keeps its
+            # data and continues if the column comes back.
+            return
+
+        data = current.data
+        total_rows = model.total_rows
+        new_rows = total_rows - seen_rows
+        if current is not selected or new_rows > len(data):
+            # The file was started over (the items were recreated with the new header) or
+            # more rows came in than the ring buffers hold.
+            pyramid = MyPlotWidget.buildPyramid(current)
+            self._pyramids[item] = pyramid
+        else:
+            # Only the new rows are added to the pyramid, the rows that have dropped out of
+            # the ring buffers are dropped from it as well.
+            time = current.time
+            first = len(data) - new_rows
+            pyramid = self._pyramids[item]
+            pyramid.extend(time[first:], data[first:], keep=len(data))
+        self._tails[item] = [current, total_rows, connection]
+
+        x_min, x_max = self._visibleXRange()
+        x, y = pyramid.select(x_min, x_max, self._plotWidthPixels())
+        item.setData(x=x, y=y)
+
     def makeLabel(self, plot_item):
         label = QLabel(plot_item.name())
         label.setSizePolicy(QSizePolicy(QSizePolicy.Minimum, QSizePolicy.Fixed))
@@ -95,6 +183,10 @@ class MyPlotWidget(QWidget):
         return label
 
     def removeItem(self, item, label):
+        self._pyramids.pop(item, None)
+        tail = self._tails.pop(item, None)
+        if tail is not None:
+            tail[0].model.dataAppended.disconnect(tail[2])
         self.pw.removeItem(item)
         self._labels.removeWidget(label)
         # self._labels.takeAt(self._labels.indexOf(label))
@@ -102,9 +194,15 @@ class MyPlotWidget(QWidget):
         
 
 if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--tail', action='append', default=[],
+                        help="CSV log to follow while it is being written")
+    args = parser.parse_args()
+
     MainEventThread = QApplication([])
 
-    MainApplication = PlotTool()
+    MainApplication = PlotTool(args.tail)
     MainApplication.show()
 
     MainEventThread.exec()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class RingBuffer(object):
+    '''
+        Fixed capacity float64 ring buffer.
+
+        Every value is written twice, at 'i' and at 'i + capacity', so the contents can
+        always be returned as one contiguous (zero-copy) view in insertion order.
+    '''
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._buf = np.full(2 * capacity, np.nan, dtype=np.float64)
+        self._head = 0
+        self._size = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        cap = self._capacity
+        k = len(values)
+        if k == 0:
+            return
+
+        if k >= cap:
+            values = values[-cap:]
+            self._buf[:cap] = values
+            self._buf[cap:] = values
+            self._head = 0
+            self._size = cap
+            return
+
+        pos = self._head
+        first = min(k, cap - pos)
+        self._buf[pos:pos + first] = values[:first]
+        self._buf[pos + cap:pos + cap + first] = values[:first]
+        rest = k - first
+        if rest > 0:
+            self._buf[:rest] = values[first:]
+            self._buf[cap:cap + rest] = values[first:]
+
+        self._head = (pos + k) % cap
+        self._size = min(self._size + k, cap)
+
+    def view(self):
+        ''' Returns a read-only view of the contents, oldest value first. '''
+        start = (self._head - self._size) % self._capacity
+        arr = self._buf[start:start + self._size]
+        arr.flags.writeable = False
+        return arr
+
+
+class CsvTail(object):
+    '''
+        Follows a CSV log that is being appended to. Each call to poll() parses only the
+        complete lines that were added since the previous call and appends them to one
+        ring buffer per column. A partially written last line is kept until the rest of
+        it arrives.
+    '''
+    def __init__(self, filename, capacity=1 << 20):
+        self._filename = filename
+        self._capacity = capacity
+        self._columns = None
+        self._buffers = {}
+        self._offset = 0
+        self._partial = b''
+        self._total_rows = 0
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @property
+    def total_rows(self):
+        ''' Number of rows appended since the header was read (the buffers may hold fewer). '''
+        return self._total_rows
+
+    def column(self, name):
+        return self._buffers[name].view()
+
+    def _reset(self):
+        self._columns = None
+        self._buffers = {}
+        self._offset = 0
+        self._partial = b''
+        self._total_rows = 0
+
+    def poll(self):
+        '''
+            Reads whatever was appended to the file. Returns a tuple of (header_changed,
+            rows_appended).
+        '''
+        try:
+            size = os.path.getsize(self._filename)
+        except OSError:
+            return False, 0
+
+        header_changed = False
+        if size < self._offset:
+            # The file was truncated or replaced, start over.
+            self._reset()
+            header_changed = True
+        if size == self._offset:
+            return header_changed, 0
+
+        with open(self._filename, 'rb') as fp:
+            fp.seek(self._offset)
+            new_bytes = fp.read(size - self._offset)
+
+        text = self._partial + new_bytes
+        end = text.rfind(b'\n') + 1
+        partial = text[end:]
+        text = text[:end]
+
+        columns = self._columns
+        if columns is None:
+            header_end = text.find(b'\n') + 1
+            if header_end == 0:
+                # The header line isn't complete yet.
+                self._offset += len(new_bytes)
+                self._partial = text + partial
+                return header_changed, 0
+            columns = [c.strip() for c in text[:header_end].decode().split(',')]
+            text = text[header_end:]
+
+        values = {}
+        rows = 0
+        if text.strip():
+            chunk = pd.read_csv(io.BytesIO(text), header=None, names=columns)
+            values = {name: chunk[name].to_numpy(dtype=np.float64, na_value=np.nan)
+                      for name in columns}
+            rows = len(chunk)
+
+        # Nothing is changed until the new lines have been parsed, so if that fails they
+        # are read again by the next poll instead of being lost.
+        self._offset += len(new_bytes)
+        self._partial = partial
+        if self._columns is None:
+            self._columns = columns
+            self._buffers = {name: RingBuffer(self._capacity) for name in columns}
+            header_changed = True
+        for name, column in values.items():
+            self._buffers[name].extend(column)
+        self._total_rows += rows
+
+        return header_changed, rows
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import weakref
+
+import numpy as np
+
+
+class TimeBase(object):
+    '''
+        An interned, read-only time vector. All curves that are plotted against the same
+        time vector (from the same file, or from several files that were sampled the same
+        way) share a single TimeBase and therefore a single buffer.
+    '''
+    def __init__(self, key, values):
+        self._key = key
+        self._values = values
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def values(self):
+        return self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def sample_period(self):
+        if len(self._values) < 2:
+            return None
+        return float(np.median(np.diff(self._values)))
+
+
+class TimeBaseRegistry(object):
+    '''
+        Interns time vectors by content. A time vector is identified by its length and a
+        digest of its bytes, and only shared after comparing the values themselves. The
+        registry only holds weak references, so a TimeBase goes away with the last curve
+        that uses it.
+    '''
+    def __init__(self):
+        self._bases = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def makeKey(values):
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        digest = hashlib.blake2b(memoryview(values).cast('B'), digest_size=16).hexdigest()
+        return (len(values), digest)
+
+    def intern(self, values):
+        key = TimeBaseRegistry.makeKey(values)
+        base = self._bases.get(key)
+        if base is not None and np.array_equal(base.values, values, equal_nan=True):
+            return base
+
+        values = np.asarray(values, dtype=np.float64)
+        if values.flags.writeable:
+            values = values.view()
+            values.flags.writeable = False
+        if base is not None:
+            # A digest collision: the vector is used as it is instead of being shared.
+            return TimeBase(key, values)
+        base = TimeBase(key, values)
+        self._bases[key] = base
+        return base
+
+    def __len__(self):
+        return len(self._bases)
+
+
+_registry = TimeBaseRegistry()
+
+def internTimeBase(values):
+    ''' Returns the shared TimeBase for the time vector 'values'. '''
+    return _registry.intern(values)
+
+
+def resample(time, data, target_time, method='linear'):
+    '''
+        Resamples the series (time, data) onto 'target_time'. 'method' is either 'linear'
+        for linear interpolation or 'previous' for a zero-order hold, which is the right
+        choice for discrete signals (states, flags, counters). Samples of 'target_time'
+        outside of the range of 'time' are NaN.
+    '''
+    time = np.asarray(time)
+    data = np.asarray(data, dtype=np.float64)
+    target_time = np.asarray(target_time)
+    if len(time) == 0:
+        return np.full(len(target_time), np.nan)
+
+    if method == 'linear':
+        out = np.interp(target_time, time, data)
+    elif method == 'previous':
+        idx = np.searchsorted(time, target_time, side='right') - 1
+        out = data[np.clip(idx, 0, len(data) - 1)]
+    else:
+        raise ValueError(f"Unknown resampling method '{method}'")
+
+    out[(target_time < time[0]) | (target_time > time[-1])] = np.nan
+    return out
+
+
+def alignedTimeBase(*times):
+    '''
+        Returns a common time vector for overlaying series with different sample rates:
+        it covers the range where all of them overlap, at the finest of their sample
+        periods. Returns None if the series don't overlap.
+    '''
+    times = [np.asarray(t) for t in times if len(t) > 1]
+    if not times:
+        return None
+
+    start = max(t[0] for t in times)
+    stop = min(t[-1] for t in times)
+    if stop < start:
+        return None
+
+    period = min(float(np.median(np.diff(t))) for t in times)
+    if period <= 0:
+        return None
+    count = int(np.floor((stop - start) / period + 1e-9)) + 1
+    return start + period * np.arange(count)
+
+
+def align(series, method='linear'):
+    '''
+        Aligns a list of (time, data) series onto their common time base (see
+        alignedTimeBase). Returns (time, [data, ...]) or (None, []) if the series don't
+        overlap. A series whose time vector already is the common one is not copied.
+    '''
+    time = alignedTimeBase(*[t for t, _ in series])
+    if time is None:
+        return None, []
+
+    aligned = []
+    for t, d in series:
+        if len(t) == len(time) and np.array_equal(t, time):
+            aligned.append(np.asarray(d))
+        else:
+            aligned.append(resample(t, d, time, method))
+    return time, aligned
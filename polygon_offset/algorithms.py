@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+import math
+import sys
 import numpy as np
 
 @dataclass
@@ -7,30 +9,318 @@ class Point:
     y : float = 0
     
 
-def is_convex(pt1 : Point, pt2 : Point, pt3 : Point) -> bool:
-    if triangle_area(pt1, pt2, pt3) < 0:
-        return True
-
-    return False
+# Orientation predicate after Shewchuk, "Adaptive Precision Floating-Point Arithmetic and
+# Fast Robust Geometric Predicates". The determinant is first evaluated in floating point.
+# If its magnitude exceeds the bound on the rounding error, its sign is certain, which is
+# the case for all but (nearly) collinear points. Otherwise it is recomputed exactly in
+# integer arithmetic, which is slow but only needed close to degeneracy. The array version
+# refines the uncertain entries in stages instead, with the floating point expansions of
+# the paper (see _orient2d_adapt).
+_EPS = np.finfo(np.float64).eps / 2
+_ORIENT_ERR_BOUND = (3.0 + 16.0 * _EPS) * _EPS
+_ORIENT_ERR_BOUND_B = (2.0 + 12.0 * _EPS) * _EPS
+_ORIENT_ERR_BOUND_C = (9.0 + 64.0 * _EPS) * _EPS * _EPS
+_RESULT_ERR_BOUND = (3.0 + 8.0 * _EPS) * _EPS
+# 2^27 + 1, splits a float into two halves of 26 bits whose products are exact.
+_SPLITTER = 134217729.0
+# Below this sum of the magnitudes of the two products, their rounding errors are not
+# bounded by the error bounds (as they may be subnormal). Above the largest float they
+# overflowed.
+_ORIENT_MIN_DETSUM = 2.0 ** -960
+_ORIENT_MAX_DETSUM = sys.float_info.max
+# Within this range (or zero) the expansions neither overflow nor underflow.
+_EXPANSION_MIN = 2.0 ** -400
+_EXPANSION_MAX = 2.0 ** 400
+# Number of uncertain entries orient2d_array refines at once.
+_ADAPT_BLOCK = 4096
 
-def triangle_area(pt1 : Point, pt2 : Point, pt3 : Point) -> float:
-    area = 0
+def _orient2d_exact(ax, ay, bx, by, cx, cy) -> float:
+    coords = (ax, ay, bx, by, cx, cy)
+    if not all(math.isfinite(v) for v in coords):
+        # inf and nan have no exact value, the floating point result is all there is.
+        return (ax - cx) * (by - cy) - (ay - cy) * (bx - cx)
+    # Every float is an integer mantissa (53 bits) times a power of two. Scaled to the
+    # smallest exponent they all become integers and the determinant is exact.
+    parts = [math.frexp(v) for v in coords]
+    emin = min(e for _, e in parts)
+    ax, ay, bx, by, cx, cy = (int(m * 9007199254740992.0) << (e - emin) for m, e in parts)
+    det = (ax - cx) * (by - cy) - (ay - cy) * (bx - cx)
+    # Rounded back to a float, the sign is kept.
+    shift = max(det.bit_length() - 63, 0)
+    try:
+        value = math.ldexp(det >> shift, shift + 2 * (emin - 53))
+    except OverflowError:
+        return math.inf if det > 0 else -math.inf
+    if value == 0 and det != 0:
+        # Too small for a float, the smallest one has the sign.
+        return 5e-324 if det > 0 else -5e-324
+    return value
 
-    area += pt1.x * (pt3.y - pt2.y)
-    area += pt2.x * (pt1.y - pt3.y)
-    area += pt3.x * (pt2.y - pt1.y)
+def orient2d(pt1 : Point, pt2 : Point, pt3 : Point) -> float:
+    '''
+        Twice the signed area of the triangle, positive if the points are in
+        counter-clockwise order, negative if clockwise and zero if they are collinear. The
+        sign is always exact.
+    '''
+    cx = pt3.x
+    cy = pt3.y
+    acx = pt1.x - cx
+    bcy = pt2.y - cy
+    acy = pt1.y - cy
+    bcx = pt2.x - cx
+    detleft = acx * bcy
+    detright = acy * bcx
+    det = detleft - detright
+    # With the products of opposite signs (or one of them zero) there is no cancellation.
+    # A product that underflowed to zero is smaller than the other one. If both are zero,
+    # they are only exactly zero if one of the differences of each is.
+    if detleft > 0:
+        if detright <= 0:
+            return det
+        detsum = detleft + detright
+    elif detleft < 0:
+        if detright >= 0:
+            return det
+        detsum = -detleft - detright
+    elif detleft == 0 and (detright != 0 or
+                           ((acx == 0 or bcy == 0) and (acy == 0 or bcx == 0))):
+        return det
+    else:
+        detsum = 0.0
+    err_bound = _ORIENT_ERR_BOUND * detsum
+    if (det >= err_bound or -det >= err_bound) and \
+            _ORIENT_MIN_DETSUM <= detsum <= _ORIENT_MAX_DETSUM:
+        return det
+    return _orient2d_exact(pt1.x, pt1.y, pt2.x, pt2.y, cx, cy)
 
-    # For the actual area, we need to multiple 'area' by 0.5, but we
-    # only care about the sign of the area
+def is_convex(pt1 : Point, pt2 : Point, pt3 : Point) -> bool:
+    # triangle_area(pt1, pt2, pt3) < 0, without the extra call
+    return orient2d(pt1, pt2, pt3) > 0
 
-    return area
+def triangle_area(pt1 : Point, pt2 : Point, pt3 : Point) -> float:
+    # Negative for a counter-clockwise turn. For the actual area, we need to multiply by
+    # -0.5, but we only care about the sign of the area, which orient2d gets right also
+    # for (nearly) collinear points.
+    return -orient2d(pt1, pt2, pt3)
 
 def calc_midpoint(pt1 : Point, pt2 : Point):
     return Point(0.5 * (pt1.x + pt2.x), 0.5 * (pt1.y + pt2.y))
 
 def calc_normal(pt1 : Point, pt2 : Point):
-    vec = np.array([pt2.x, pt2.y], dtype=np.float64) - np.array([pt1.x, pt1.y])
-    print(f"vec: {vec}, norm: {np.linalg.norm(vec)}")
-    vec /= np.linalg.norm(vec)
+    ''' Left hand unit normal of the edge, [0, 0] if the points coincide. '''
+    vx = pt2.x - pt1.x
+    vy = pt2.y - pt1.y
+    norm = math.hypot(vx, vy)
+    if norm == 0:
+        return [0.0, 0.0]
+
+    return [-vy / norm, vx / norm]
+
+# Array-based counterparts of the functions above. They operate on a whole polygon given
+# as an (N, 2) array of vertices at once. Vertex 'i' is connected to vertex 'i+1' by edge
+# 'i', and the last vertex is connected back to the first one.
+
+def next_vertices(vertices : np.ndarray) -> np.ndarray:
+    # Same as np.roll(vertices, -1, axis=0), but without its (considerable) overhead on the
+    # small polygons this is usually called with.
+    return np.concatenate((vertices[1:], vertices[:1]))
+
+def prev_vertices(vertices : np.ndarray) -> np.ndarray:
+    return np.concatenate((vertices[-1:], vertices[:-1]))
+
+def as_vertex_array(pts) -> np.ndarray:
+    if isinstance(pts, np.ndarray) or hasattr(pts, '__array__'):
+        # Arrays and polygon.Polygon (whose buffer is used as it is)
+        vertices = pts
+    elif len(pts) > 0 and hasattr(pts[0], 'x') and hasattr(pts[0], 'y'):
+        # Points, or anything else with the same x/y interface (e.g. polygon.PointView)
+        vertices = np.array([(pt.x, pt.y) for pt in pts], dtype=np.float64)
+    else:
+        vertices = np.asarray(pts)
+    vertices = np.asarray(vertices, dtype=np.float64)
+    if vertices.ndim != 2 or vertices.shape[1] != 2:
+        raise ValueError(f"Expected an (N, 2) array of vertices, got shape {vertices.shape}")
+    return vertices
+
+def _two_sum(a, b):
+    ''' a + b as the rounded sum and its rounding error (exact, for arrays). '''
+    x = a + b
+    bv = x - a
+    av = x - bv
+    return x, (a - av) + (b - bv)
+
+def _two_diff_tail(a, b, x):
+    ''' The rounding error of x = a - b. '''
+    bv = a - x
+    av = x + bv
+    return (a - av) + (bv - b)
+
+def _split(a):
+    c = _SPLITTER * a
+    hi = c - (c - a)
+    return hi, a - hi
+
+def _two_product(a, b):
+    ''' a * b as the rounded product and its rounding error (exact, for arrays). '''
+    x = a * b
+    ahi, alo = _split(a)
+    bhi, blo = _split(b)
+    return x, alo * blo - (x - ahi * bhi - alo * bhi - ahi * blo)
+
+def _grow_expansion(e, b):
+    '''
+        Adds 'b' to the expansion 'e', a list of arrays whose (exact) sum is the value,
+        ordered by increasing magnitude, without overlapping bits.
+    '''
+    grown = []
+    for comp in e:
+        b, err = _two_sum(b, comp)
+        grown.append(err)
+    grown.append(b)
+    return grown
+
+def _estimate(e):
+    ''' Approximate value of the expansion 'e', with the exact sign. '''
+    value = np.zeros_like(e[0])
+    top = value
+    for comp in e:
+        value = value + comp
+        top = np.where(comp != 0, comp, top)
+    # The largest nonzero component decides the sign.
+    return np.where(np.sign(value) == np.sign(top), value, top)
+
+def _orient2d_adapt(ax, ay, bx, by, cx, cy, detsum):
+    '''
+        orient2d for arrays of coordinates where the floating point determinant was
+        uncertain ('detsum' is the sum of the magnitudes of its two products). Like
+        orient2dadapt of the paper, the determinant of the rounded differences is computed
+        exactly first, then corrected by their rounding errors, and only where the sign is
+        still uncertain everything is added up exactly.
+    '''
+    result = np.empty(len(ax))
+    rows = np.arange(len(ax))
+
+    acx = ax - cx
+    bcx = bx - cx
+    acy = ay - cy
+    bcy = by - cy
+    acx_tail = _two_diff_tail(ax, cx, acx)
+    bcx_tail = _two_diff_tail(bx, cx, bcx)
+    acy_tail = _two_diff_tail(ay, cy, acy)
+    bcy_tail = _two_diff_tail(by, cy, bcy)
+    left, left_tail = _two_product(acx, bcy)
+    right, right_tail = _two_product(acy, bcx)
+
+    # With exact differences (the common case) the rounded products already order the
+    # exact ones, unless they are equal and their rounding errors decide.
+    done = (acx_tail == 0) & (bcx_tail == 0) & (acy_tail == 0) & (bcy_tail == 0)
+    result[done] = np.where(left != right, left - right, left_tail - right_tail)[done]
+    keep = ~done
+    if not keep.any():
+        return result
+    rows, detsum, acx, bcx, acy, bcy, acx_tail, bcx_tail, acy_tail, bcy_tail, \
+        left, left_tail, right, right_tail = (
+            arr[keep] for arr in (rows, detsum, acx, bcx, acy, bcy, acx_tail, bcx_tail,
+                                  acy_tail, bcy_tail, left, left_tail, right, right_tail))
+
+    # The determinant of the rounded differences, exactly.
+    b = _grow_expansion(_grow_expansion([left_tail, left], -right_tail), -right)
+    det = _estimate(b)
+    done = np.abs(det) >= _ORIENT_ERR_BOUND_B * detsum
+    result[rows[done]] = det[done]
+    keep = ~done
+    if not keep.any():
+        return result
+    rows, det, detsum, acx, bcx, acy, bcy, acx_tail, bcx_tail, acy_tail, bcy_tail = (
+        arr[keep] for arr in (rows, det, detsum, acx, bcx, acy, bcy,
+                              acx_tail, bcx_tail, acy_tail, bcy_tail))
+    b = [comp[keep] for comp in b]
+
+    # Corrected by the rounding errors of the differences
+    err_bound = _ORIENT_ERR_BOUND_C * detsum + _RESULT_ERR_BOUND * np.abs(det)
+    det = det + ((acx * bcy_tail + bcy * acx_tail) - (acy * bcx_tail + bcx * acy_tail))
+    done = np.abs(det) >= err_bound
+    result[rows[done]] = det[done]
+    keep = ~done
+    if not keep.any():
+        return result
+
+    # All the products of the differences and their rounding errors, exactly.
+    expansion = [comp[keep] for comp in b]
+    for x, y, sign in ((acx_tail, bcy, 1.0), (acx, bcy_tail, 1.0),
+                       (acy_tail, bcx, -1.0), (acy, bcx_tail, -1.0),
+                       (acx_tail, bcy_tail, 1.0), (acy_tail, bcx_tail, -1.0)):
+        product, product_tail = _two_product(x[keep], y[keep])
+        expansion = _grow_expansion(expansion, sign * product_tail)
+        expansion = _grow_expansion(expansion, sign * product)
+    result[rows[keep]] = _estimate(expansion)
+    return result
+
+def _orient2d_refine(pts1, pts2, pts3, detsum):
+    ''' orient2d for the points where orient2d_array found the sign uncertain. '''
+    coords = [pts[:, axis] for pts in (pts1, pts2, pts3) for axis in (0, 1)]
+    out_of_range = np.zeros(len(detsum), dtype=bool)
+    for values in coords:
+        magnitude = np.abs(values)
+        out_of_range |= ~(magnitude <= _EXPANSION_MAX)
+        out_of_range |= (magnitude < _EXPANSION_MIN) & (magnitude != 0)
+    if not out_of_range.any():
+        return _orient2d_adapt(*coords, detsum)
+
+    # Coordinates that are huge, tiny or not finite (rarely the case) are left to the
+    # integers.
+    det = np.empty(len(detsum))
+    for i in np.flatnonzero(out_of_range).tolist():
+        det[i] = _orient2d_exact(*(float(values[i]) for values in coords))
+    in_range = ~out_of_range
+    det[in_range] = _orient2d_adapt(*(values[in_range] for values in coords),
+                                    detsum[in_range])
+    return det
+
+def orient2d_array(pts1 : np.ndarray, pts2 : np.ndarray, pts3 : np.ndarray) -> np.ndarray:
+    ''' orient2d for arrays of points. Only the uncertain entries are refined. '''
+    detleft = (pts1[:, 0] - pts3[:, 0]) * (pts2[:, 1] - pts3[:, 1])
+    detright = (pts1[:, 1] - pts3[:, 1]) * (pts2[:, 0] - pts3[:, 0])
+    det = detleft - detright
+    detsum = np.abs(detleft) + np.abs(detright)
+    # Also where the products overflowed or underflowed (see orient2d). Exact zeros are
+    # sorted out quickly by _orient2d_adapt.
+    uncertain = np.flatnonzero(~((np.abs(det) >= _ORIENT_ERR_BOUND * detsum) &
+                                 (detsum >= _ORIENT_MIN_DETSUM) &
+                                 (detsum <= _ORIENT_MAX_DETSUM)))
+    if len(uncertain) == 0:
+        return det
+
+    # In blocks, so that the many temporary arrays of the expansions stay small.
+    for start in range(0, len(uncertain), _ADAPT_BLOCK):
+        idx = uncertain[start:start + _ADAPT_BLOCK]
+        det[idx] = _orient2d_refine(pts1[idx], pts2[idx], pts3[idx], detsum[idx])
+    return det
+
+def triangle_areas(pts1 : np.ndarray, pts2 : np.ndarray, pts3 : np.ndarray) -> np.ndarray:
+    # Same sign convention as triangle_area (i.e. negative for a counter-clockwise turn).
+    return -orient2d_array(pts1, pts2, pts3)
+
+def convex_vertices(pts) -> np.ndarray:
+    ''' Boolean mask that is True for each vertex of the polygon that is convex. '''
+    vertices = as_vertex_array(pts)
+    prev = prev_vertices(vertices)
+    nxt = next_vertices(vertices)
+    return triangle_areas(prev, vertices, nxt) < 0
+
+def edge_midpoints(pts) -> np.ndarray:
+    vertices = as_vertex_array(pts)
+    return 0.5 * (vertices + next_vertices(vertices))
 
-    return [-vec[1], vec[0]]
+def edge_normals(pts) -> np.ndarray:
+    ''' Unit normal of each edge of the polygon (see calc_normal). Zero-length edges get a
+        normal of (0, 0).
+    '''
+    vertices = as_vertex_array(pts)
+    vec = next_vertices(vertices) - vertices
+    norm = np.hypot(vec[:, 0], vec[:, 1])
+    normals = np.zeros_like(vec)
+    valid = norm > 0
+    normals[valid, 0] = -vec[valid, 1] / norm[valid]
+    normals[valid, 1] = vec[valid, 0] / norm[valid]
+    return normals
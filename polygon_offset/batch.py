@@ -0,0 +1,176 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+
+import numpy as np
+
+import algorithms as alg
+import offset as off
+
+# Batch offsetting of many polygons.
+#
+# A collection of polygons is passed around packed: the vertices of all polygons one after
+# the other in one (V, 2) float64 array, plus an int64 array of P + 1 offsets such that the
+# vertices of polygon 'k' are vertices[offsets[k]:offsets[k + 1]]. The batch is split into
+# chunks of polygons with about the same number of vertices and the chunks are offset in a
+# pool of worker processes. The inputs are placed in shared memory once and every worker
+# packs its results into a shared memory block of its own, so only block names and sizes
+# travel through the pool, never the polygons themselves.
+
+def pack_polygons(polygons) -> tuple:
+    ''' Packs a list of polygons (Points or (N, 2) arrays) into (vertices, offsets). '''
+    arrays = [alg.as_vertex_array(poly) for poly in polygons]
+    counts = np.array([len(arr) for arr in arrays], dtype=np.int64)
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    if arrays:
+        vertices = np.concatenate(arrays)
+    else:
+        vertices = np.empty((0, 2))
+    return vertices, offsets
+
+def unpack_polygons(vertices : np.ndarray, offsets : np.ndarray) -> list:
+    ''' Inverse of pack_polygons, the returned arrays are views into 'vertices'. '''
+    return [vertices[offsets[k]:offsets[k + 1]] for k in range(len(offsets) - 1)]
+
+def _offset_range(vertices, offsets, distances, first, last, join, miter_limit, arc_tolerance):
+    ''' Offsets polygons [first, last) and returns the results packed. '''
+    results = []
+    source = []
+    for k in range(first, last):
+        for poly in off.offset_polygon(vertices[offsets[k]:offsets[k + 1]], distances[k],
+                                       join, miter_limit, arc_tolerance):
+            results.append(poly)
+            source.append(k)
+    out_vertices, out_offsets = pack_polygons(results)
+    return out_vertices, out_offsets, np.array(source, dtype=np.int64)
+
+# Shared inputs of a worker process, set up once by _init_worker.
+_inputs = None
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _init_worker(blocks, join, miter_limit, arc_tolerance):
+    global _inputs
+    attached = [_attach(*block) for block in blocks]
+    # The blocks have to stay open for as long as the arrays are used.
+    _inputs = ([shm for shm, _ in attached], [arr for _, arr in attached],
+               join, miter_limit, arc_tolerance)
+
+def _run_chunk(first, last):
+    '''
+        Offsets one chunk inside a worker. The result is written to a new shared memory
+        block laid out as [offsets (int64), source (int64), vertices (float64)] and only
+        (block name, number of polygons, number of vertices) is sent back. The caller
+        unlinks the block after copying the results out.
+    '''
+    _, (vertices, offsets, distances), join, miter_limit, arc_tolerance = _inputs
+    out_vertices, out_offsets, source = _offset_range(vertices, offsets, distances, first, last,
+                                                      join, miter_limit, arc_tolerance)
+    n_polys = len(source)
+    n_verts = len(out_vertices)
+    size = (2 * n_polys + 1) * 8 + n_verts * 16
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    buf = np.ndarray(size // 8, dtype=np.int64, buffer=shm.buf)
+    buf[:n_polys + 1] = out_offsets
+    buf[n_polys + 1:2 * n_polys + 1] = source
+    buf[2 * n_polys + 1:].view(np.float64)[:] = out_vertices.ravel()
+    del buf
+    shm.close()
+    return shm.name, n_polys, n_verts
+
+def _unlink(name):
+    shm = shared_memory.SharedMemory(name=name)
+    shm.close()
+    shm.unlink()
+
+def _chunk_bounds(offsets, n_chunks):
+    ''' Splits the polygons into at most n_chunks ranges with similar vertex counts. '''
+    n_polys = len(offsets) - 1
+    targets = np.linspace(0, offsets[-1], n_chunks + 1)[1:-1]
+    cuts = np.searchsorted(offsets, targets)
+    bounds = np.unique(np.concatenate(([0], np.clip(cuts, 0, n_polys), [n_polys])))
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+def offset_polygons(vertices : np.ndarray, offsets : np.ndarray, distance,
+                    join : str = off.JOIN_MITER, miter_limit : float = 2.0,
+                    arc_tolerance : float = None, workers : int = None,
+                    chunks_per_worker : int = 4) -> tuple:
+    '''
+        Offsets every polygon of a packed batch (see the comment at the top) by 'distance',
+        which is either one value for all polygons or one value per polygon. The other
+        arguments are passed on to offset.offset_polygon.
+
+        Returns (vertices, offsets, source) in the same packed layout, where source[k] is
+        the index of the input polygon that output polygon 'k' came from. An input polygon
+        can give any number of output polygons (see offset.offset_polygon), the outputs
+        are ordered by input polygon.
+
+        The work is spread over 'workers' processes (by default one per CPU). With a single
+        worker, or for a small batch, everything runs in the calling process.
+    '''
+    vertices = np.ascontiguousarray(vertices, dtype=np.float64).reshape(-1, 2)
+    offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+    n_polys = len(offsets) - 1
+    distances = np.ascontiguousarray(np.broadcast_to(np.asarray(distance, dtype=np.float64),
+                                                     (n_polys,)))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, n_polys))
+    if workers == 1 or len(vertices) < 1000:
+        return _offset_range(vertices, offsets, distances, 0, n_polys,
+                             join, miter_limit, arc_tolerance)
+
+    shared = []
+    try:
+        blocks = []
+        for arr in (vertices, offsets, distances):
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            shared.append(shm)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+            blocks.append((shm.name, arr.shape, arr.dtype.str))
+
+        bounds = _chunk_bounds(offsets, workers * chunks_per_worker)
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(blocks, join, miter_limit, arc_tolerance)) as pool:
+            futures = [pool.submit(_run_chunk, first, last) for first, last in bounds]
+            try:
+                parts = [future.result() for future in futures]
+            except BaseException:
+                # Don't leave the result blocks of the chunks that did finish behind.
+                for future in futures:
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        _unlink(future.result()[0])
+                raise
+    finally:
+        for shm in shared:
+            shm.close()
+            shm.unlink()
+
+    total_polys = sum(n for _, n, _ in parts)
+    total_verts = sum(n for _, _, n in parts)
+    out_vertices = np.empty((total_verts, 2))
+    out_offsets = np.zeros(total_polys + 1, dtype=np.int64)
+    source = np.empty(total_polys, dtype=np.int64)
+
+    poly_pos = 0
+    vert_pos = 0
+    for name, n_polys, n_verts in parts:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            buf = np.ndarray(shm.size // 8, dtype=np.int64, buffer=shm.buf)
+            out_offsets[poly_pos + 1:poly_pos + n_polys + 1] = buf[1:n_polys + 1] + vert_pos
+            source[poly_pos:poly_pos + n_polys] = buf[n_polys + 1:2 * n_polys + 1]
+            out_vertices[vert_pos:vert_pos + n_verts] = \
+                buf[2 * n_polys + 1:2 * n_polys + 1 + 2 * n_verts].view(np.float64).reshape(-1, 2)
+            del buf
+        finally:
+            shm.close()
+            shm.unlink()
+        poly_pos += n_polys
+        vert_pos += n_verts
+
+    return out_vertices, out_offsets, source
@@ -0,0 +1,86 @@
+'''
+    Benchmark of the orientation predicate behind is_convex and convex_vertices.
+
+    Compares the adaptive orient2d (and orient2d_array) against the plain floating point
+    determinant it replaced, on random points and on nearly collinear points, where the
+    adaptive version has to fall back to exact arithmetic. Also counts how often the plain
+    determinant gets the sign wrong.
+
+        python benchmark.py --count 200000
+'''
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import algorithms as alg
+
+def naive_triangle_area(pt1, pt2, pt3):
+    # The floating point determinant triangle_area used to compute.
+    return pt1.x * (pt3.y - pt2.y) + pt2.x * (pt1.y - pt3.y) + pt3.x * (pt2.y - pt1.y)
+
+def naive_triangle_areas(pts1, pts2, pts3):
+    return pts1[:, 0] * (pts3[:, 1] - pts2[:, 1]) + \
+           pts2[:, 0] * (pts1[:, 1] - pts3[:, 1]) + \
+           pts3[:, 0] * (pts2[:, 1] - pts1[:, 1])
+
+def random_points(rng, count):
+    return [rng.uniform(-1.0, 1.0, (count, 2)) for _ in range(3)]
+
+def near_collinear_points(rng, count):
+    ''' Third point on (or within a few ulps of) the line through the other two. '''
+    pts1 = rng.uniform(-1.0, 1.0, (count, 2))
+    pts2 = rng.uniform(-1.0, 1.0, (count, 2))
+    t = rng.uniform(-2.0, 3.0, (count, 1))
+    pts3 = pts1 + t * (pts2 - pts1)
+    pts3 = pts3 + rng.integers(-4, 5, pts3.shape) * np.spacing(pts3)
+    return [pts1, pts2, pts3]
+
+def to_points(arr):
+    return [alg.Point(x, y) for x, y in arr.tolist()]
+
+def time_scalar(func, pts1, pts2, pts3):
+    start = time.perf_counter()
+    result = [func(a, b, c) for a, b, c in zip(pts1, pts2, pts3)]
+    return time.perf_counter() - start, np.array(result)
+
+def time_array(func, pts1, pts2, pts3, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = func(pts1, pts2, pts3)
+    return (time.perf_counter() - start) / repeats, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--count', type=int, default=100000, help="Triangles per case")
+    parser.add_argument('--repeats', type=int, default=10, help="Repeats of the array timings")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cases = (('random', random_points(rng, args.count)),
+             ('near collinear', near_collinear_points(rng, args.count)))
+
+    print(f"{'case':<16}{'variant':<10}{'naive [ns]':>12}{'adaptive [ns]':>15}{'ratio':>8}"
+          f"{'wrong signs':>13}")
+    for name, arrays in cases:
+        points = [to_points(arr) for arr in arrays]
+        naive_s, naive = time_scalar(naive_triangle_area, *points)
+        robust_s, robust = time_scalar(alg.triangle_area, *points)
+        naive_a, naive_arr = time_array(naive_triangle_areas, *arrays, args.repeats)
+        robust_a, _ = time_array(alg.triangle_areas, *arrays, args.repeats)
+
+        wrong = int(np.count_nonzero(np.sign(naive) != np.sign(robust)))
+        wrong_arr = int(np.count_nonzero(np.sign(naive_arr) != np.sign(robust)))
+        scale = 1e9 / args.count
+        print(f"{name:<16}{'scalar':<10}{naive_s * scale:>12.1f}{robust_s * scale:>15.1f}"
+              f"{robust_s / naive_s:>8.2f}{wrong:>13}")
+        print(f"{name:<16}{'array':<10}{naive_a * scale:>12.2f}{robust_a * scale:>15.2f}"
+              f"{robust_a / naive_a:>8.2f}{wrong_arr:>13}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
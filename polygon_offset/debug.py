@@ -1,44 +1,28 @@
 
 import algorithms as alg
+from polygon import Polygon
+
+import numpy as np
 
 import matplotlib.pyplot as plt
 
 def draw_poly(pts, draw_vertices=False, draw_normals=False):
+    poly = Polygon(pts)
 
-    x = [pt.x for pt in pts]
-    x.append(pts[0].x)
-
-    y = [pt.y for pt in pts]
-    y.append(pts[0].y)
-    
-    plt.plot(x, y, color='b')
+    outline = poly.closed()
+    plt.plot(outline[:, 0], outline[:, 1], color='b')
 
     if draw_vertices:
-        v_c = vertex_convexity(pts)
-        plt.scatter(x[:-1], y[:-1], c=v_c, marker='o')
+        v_c = vertex_convexity(poly)
+        plt.scatter(poly.x, poly.y, c=v_c, marker='o')
 
     if draw_normals:
         sc = 0.1
-        n_pts = len(pts)
-        for i in range(n_pts):
-            ip1 = (i+1) % n_pts
-
-            mid = alg.calc_midpoint(pts[i], pts[ip1])
-            n_vec = alg.calc_normal(pts[i], pts[ip1])
-            plt.plot([mid.x, mid.x + sc*n_vec[0]], [mid.y, mid.y + sc*n_vec[1]], color='green')
+        mid = alg.edge_midpoints(poly)
+        n_vec = alg.edge_normals(poly)
+        # Each column is one line segment from the midpoint along the normal.
+        plt.plot(np.vstack((mid[:, 0], mid[:, 0] + sc*n_vec[:, 0])),
+                 np.vstack((mid[:, 1], mid[:, 1] + sc*n_vec[:, 1])), color='green')
 
 def vertex_convexity(pts):
-
-    n_pts = len(pts)
-
-    convex = []
-    for i in range(n_pts):
-        im1 = (i-1) % n_pts
-        ip1 = (i+1) % n_pts
-    
-        if alg.is_convex(pts[im1], pts[i], pts[ip1]):
-            convex.append('b')
-        else:
-            convex.append('r')
-
-    return convex
+    return np.where(alg.convex_vertices(pts), 'b', 'r')
@@ -0,0 +1,418 @@
+import numpy as np
+
+import algorithms as alg
+
+# Polygon offsetting (inset/outset).
+#
+# The offset is built in two steps. First the raw offset curve is constructed: every edge
+# is moved outwards along its normal (see calc_normal) and consecutive edges are joined
+# at each vertex. Vertices on the outer side of the offset (convex vertices when growing,
+# reflex vertices when shrinking) get a miter, square or round join. At vertices
+# on the inner side the moved edges overlap, they are connected through the original
+# vertex and the resulting small loop is removed in the second step.
+#
+# The raw curve generally intersects itself. It is cut at every self-intersection into
+# simple loops and the loops that bound the region with a winding number of one are kept,
+# which is the same result a union with the 'positive' fill rule would give.
+
+JOIN_MITER = 'miter'
+JOIN_ROUND = 'round'
+JOIN_SQUARE = 'square'
+
+def signed_area(vertices : np.ndarray) -> float:
+    ''' Signed area of the polygon, positive for counter-clockwise polygons. '''
+    nxt = alg.next_vertices(vertices)
+    return 0.5 * float(np.dot(vertices[:, 0], nxt[:, 1]) - np.dot(nxt[:, 0], vertices[:, 1]))
+
+def remove_duplicate_vertices(vertices : np.ndarray, tol : float = 0.0) -> np.ndarray:
+    ''' Drops vertices that coincide with their successor (including the wraparound). '''
+    if len(vertices) < 2:
+        return vertices
+    step = alg.next_vertices(vertices) - vertices
+    keep = np.hypot(step[:, 0], step[:, 1]) > tol
+    if not keep.any():
+        return vertices[:1]
+    return vertices[keep]
+
+def _joins(vertices, distance, join, miter_limit, arc_tolerance):
+    '''
+        Builds the raw offset curve of a counter-clockwise polygon. Returns the curve and
+        whether it is known to be simple, which is the case for convex polygons as long as
+        no edge vanishes.
+    '''
+    n = len(vertices)
+    # calc_normal gives the left hand normal, which points inwards for a CCW polygon.
+    normals = -alg.edge_normals(vertices)
+    a = alg.prev_vertices(normals)  # normal of the edge ending at each vertex
+    b = normals                     # normal of the edge starting at each vertex
+
+    cos_t = np.clip(np.einsum('ij,ij->i', a, b), -1.0, 1.0)
+    sin_t = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    angle = np.arctan2(sin_t, cos_t)    # signed turn from 'a' to 'b' (positive = convex)
+
+    # Outer side vertices need a join, inner side vertices are connected through the vertex.
+    eps = 1e-12
+    outer = angle * distance > eps
+    inner = angle * distance < -eps
+
+    # On the inner side the moved edges usually just cross close to the vertex. If that is
+    # within the first half of both edges the crossing (which is the miter point) is used
+    # directly, which avoids creating a loop that has to be removed again.
+    step = alg.next_vertices(vertices) - vertices
+    length = np.hypot(step[:, 0], step[:, 1])
+    with np.errstate(divide='ignore'):
+        trim = np.abs(distance * sin_t / (1.0 + cos_t))
+    inner &= ~(trim <= 0.5 * np.minimum(length, alg.prev_vertices(length)))
+
+    # The miter point is 'distance * (a + b) / (1 + cos_t)' away from the vertex, which is a
+    # length of 'distance * sqrt(2 / (1 + cos_t))'. Beyond the limit the corner is cut off.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        miter = distance * (a + b) / (1.0 + cos_t)[:, None]
+    simple = not inner.any() and bool((angle >= -eps).all())
+    if join != JOIN_ROUND:
+        too_long = outer if join == JOIN_SQUARE else outer & (2.0 > miter_limit**2 * (1.0 + cos_t))
+        if not (inner.any() or too_long.any()):
+            # Common case: every vertex simply becomes a miter point.
+            return vertices + miter, simple
+
+    # 0: single point (miter or straight), 1: square, 2: inner, 3: round
+    kind = np.zeros(n, dtype=np.int64)
+    counts = np.ones(n, dtype=np.int64)
+    kind[inner] = 2
+    counts[inner] = 3
+
+    if join == JOIN_ROUND:
+        arc_step = 2.0 * np.arccos(max(1.0 - arc_tolerance / abs(distance), -1.0))
+        steps = np.ceil(np.abs(angle) / arc_step).astype(np.int64)
+        rnd = outer & (steps >= 1)
+        kind[rnd] = 3
+        counts[rnd] = steps[rnd] + 1
+    else:
+        kind[too_long] = 1
+        counts[too_long] = 2
+
+    owner = np.repeat(np.arange(n), counts)
+    starts = np.cumsum(counts) - counts
+    sub = np.arange(len(owner)) - starts[owner]
+    k = kind[owner]
+
+    v = vertices[owner]
+    ao = a[owner]
+    bo = b[owner]
+    out = np.empty_like(v)
+
+    single = k == 0
+    out[single] = v[single] + miter[owner[single]]
+
+    first = ((k == 1) | (k == 2)) & (sub == 0)
+    out[first] = v[first] + distance * ao[first]
+    last = ((k == 1) & (sub == 1)) | ((k == 2) & (sub == 2))
+    out[last] = v[last] + distance * bo[last]
+    middle = (k == 2) & (sub == 1)
+    out[middle] = v[middle]
+
+    # A square join cuts the corner off perpendicular to the bisector, at 'distance' from
+    # the vertex (where the round join would be halfway). That extends both moved edges
+    # by 'distance * tan(angle / 4)' along their direction.
+    square_first = (k == 1) & (sub == 0)
+    square_last = (k == 1) & (sub == 1)
+    if square_first.any():
+        ext = distance * np.tan(angle[owner] / 4.0)
+        out[square_first, 0] -= ext[square_first] * ao[square_first, 1]
+        out[square_first, 1] += ext[square_first] * ao[square_first, 0]
+        out[square_last, 0] += ext[square_last] * bo[square_last, 1]
+        out[square_last, 1] -= ext[square_last] * bo[square_last, 0]
+
+    arc = k == 3
+    if arc.any():
+        theta = angle[owner[arc]] * sub[arc] / (counts[owner[arc]] - 1)
+        c = np.cos(theta)
+        s = np.sin(theta)
+        ax = ao[arc, 0]
+        ay = ao[arc, 1]
+        out[arc, 0] = v[arc, 0] + distance * (c * ax - s * ay)
+        out[arc, 1] = v[arc, 1] + distance * (s * ax + c * ay)
+
+    return out, simple
+
+def expand_ranges(starts, counts):
+    ''' Concatenation of the ranges [start, start + count) as one index array. '''
+    total = int(counts.sum())
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+def grid_cell_size(lo_xy : np.ndarray, hi_xy : np.ndarray) -> float:
+    '''
+        Cell size of a uniform grid for hashing segments with the given bounding boxes.
+        A segment with a w x h bounding box is registered in about (w/c + 1) * (h/c + 1)
+        cells of size c. The cell size is chosen such that this adds up to about three
+        registrations per segment, which keeps both the cells per segment and the segments
+        per cell small, also when a few segments are much longer than the rest. The grid
+        never has more than 4096 cells along either axis.
+    '''
+    m = len(lo_xy)
+    size = hi_xy - lo_xy
+    area_sum = float(np.dot(size[:, 0], size[:, 1]))
+    perimeter_sum = float(size.sum())
+    cell = (perimeter_sum + np.sqrt(perimeter_sum**2 + 8.0 * m * area_sum)) / (4.0 * m)
+    extent = hi_xy.max(axis=0) - lo_xy.min(axis=0)
+    return max(cell, float(extent.max()) / 4096, 1e-300)
+
+_pair_cache = {}
+
+def _all_pairs(m):
+    ''' All pairs (i < j) of non-adjacent segments of a ring with m segments. '''
+    try:
+        return _pair_cache[m]
+    except KeyError:
+        pass
+    i, j = np.triu_indices(m, 2)
+    keep = ~((i == 0) & (j == m - 1))
+    _pair_cache[m] = (i[keep], j[keep])
+    return _pair_cache[m]
+
+def _candidate_pairs(p0, p1):
+    '''
+        Pairs (i < j) of non-adjacent segments whose bounding boxes overlap. Small rings
+        simply test all pairs, larger ones are hashed into a uniform grid first.
+    '''
+    m = len(p0)
+    if m <= 64:
+        # Cheaper to test all pairs exactly than to filter them first.
+        return _all_pairs(m)
+
+    lo_xy = np.minimum(p0, p1)
+    hi_xy = np.maximum(p0, p1)
+
+    cell = grid_cell_size(lo_xy, hi_xy)
+    origin = lo_xy.min(axis=0)
+    c0 = np.floor((lo_xy - origin) / cell).astype(np.int64)
+    c1 = np.floor((hi_xy - origin) / cell).astype(np.int64)
+    nx = int(c1[:, 0].max()) + 1
+
+    span = c1 - c0 + 1
+    counts = span[:, 0] * span[:, 1]
+    seg = np.repeat(np.arange(m), counts)
+    local = np.arange(len(seg)) - np.repeat(np.cumsum(counts) - counts, counts)
+    cx = c0[seg, 0] + local % span[seg, 0]
+    cy = c0[seg, 1] + local // span[seg, 0]
+    cell_id = cy * nx + cx
+
+    order = np.argsort(cell_id, kind='stable')
+    seg = seg[order]
+    cell_id = cell_id[order]
+    # Every registration is paired with the ones after it in the same cell.
+    group_end = np.searchsorted(cell_id, cell_id, side='right')
+    pos = np.arange(len(seg))
+    n_after = group_end - pos - 1
+    first = np.repeat(pos, n_after)
+    second = expand_ranges(pos + 1, n_after)
+    i = np.minimum(seg[first], seg[second])
+    j = np.maximum(seg[first], seg[second])
+    # Segments that share several cells show up more than once.
+    keys = np.unique(i * m + j)
+    i = keys // m
+    j = keys % m
+
+    keep = np.all(lo_xy[i] <= hi_xy[j], axis=1) & np.all(lo_xy[j] <= hi_xy[i], axis=1)
+    # Neighbouring segments share an end point, that's not an intersection.
+    keep &= (j - i != 1) & ~((i == 0) & (j == m - 1))
+    return i[keep], j[keep]
+
+def _self_intersections(ring):
+    ''' Returns (seg_i, t_i, seg_j, t_j, points) for all crossings of the closed ring. '''
+    p0 = ring
+    p1 = alg.next_vertices(ring)
+    i, j = _candidate_pairs(p0, p1)
+    if len(i) == 0:
+        empty = np.empty(0)
+        return i, empty, j, empty, np.empty((0, 2))
+
+    r = p1[i] - p0[i]
+    s = p1[j] - p0[j]
+    qp = p0[j] - p0[i]
+    denom = r[:, 0] * s[:, 1] - r[:, 1] * s[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (qp[:, 0] * s[:, 1] - qp[:, 1] * s[:, 0]) / denom
+        u = (qp[:, 0] * r[:, 1] - qp[:, 1] * r[:, 0]) / denom
+    # Half open parameter ranges, so a crossing exactly at a vertex is only found once.
+    # Parallel (and collinear) segments have a zero denominator and are skipped.
+    hit = (denom != 0) & (t >= 0) & (t < 1) & (u >= 0) & (u < 1)
+    i = i[hit]
+    j = j[hit]
+    t = t[hit]
+    u = u[hit]
+    points = p0[i] + t[:, None] * r[hit]
+    return i, t, j, u, points
+
+def _split_loops(ring):
+    '''
+        Cuts a closed, self-intersecting ring at its crossings into simple loops. At a
+        crossing the walk continues along the other strand, so every edge of the split
+        curve ends up in exactly one loop. The loops are returned packed: their vertices
+        one after the other in one array plus the index at which each loop starts.
+    '''
+    seg_i, t_i, seg_j, t_j, cross_pts = _self_intersections(ring)
+    if len(seg_i) == 0:
+        return ring, np.zeros(1, dtype=np.int64)
+
+    m = len(ring)
+    k = len(seg_i)
+    # Every crossing is inserted twice, once on each of the two segments.
+    seg = np.concatenate((np.arange(m), seg_i, seg_j))
+    param = np.concatenate((np.full(m, -1.0), t_i, t_j))
+    crossing = np.concatenate((np.full(m, -1), np.arange(k), np.arange(k)))
+    points = np.concatenate((ring, cross_pts, cross_pts))
+
+    order = np.lexsort((param, seg))
+    points = points[order]
+    crossing = crossing[order]
+    n = len(order)
+
+    partner = np.arange(n)
+    is_cross = crossing >= 0
+    pos = np.flatnonzero(is_cross)
+    by_id = pos[np.argsort(crossing[pos], kind='stable')]
+    partner[by_id[0::2]] = by_id[1::2]
+    partner[by_id[1::2]] = by_id[0::2]
+
+    # next_edge is a permutation of the edges, its cycles are the loops.
+    arrive = (np.arange(n) + 1) % n
+    next_edge = np.where(is_cross[arrive], partner[arrive], arrive).tolist()
+
+    walk = []
+    starts = []
+    visited = bytearray(n)
+    for start in range(n):
+        if visited[start]:
+            continue
+        starts.append(len(walk))
+        edge = start
+        while not visited[edge]:
+            visited[edge] = 1
+            walk.append(edge)
+            edge = next_edge[edge]
+    return points[walk], np.array(starts, dtype=np.int64)
+
+def winding_numbers(ring : np.ndarray, pts : np.ndarray) -> np.ndarray:
+    '''
+        Winding numbers of the closed ring around each of the points. The edges are bucketed
+        into horizontal slabs, so a point is only tested against the edges of its slab.
+    '''
+    pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+    nxt = alg.next_vertices(ring)
+    y_lo = np.minimum(ring[:, 1], nxt[:, 1])
+    y_hi = np.maximum(ring[:, 1], nxt[:, 1])
+
+    n_slabs = max(1, min(len(ring), 1 << 16))
+    y0 = float(y_lo.min())
+    height = max((float(y_hi.max()) - y0) / n_slabs, 1e-300)
+    s0 = np.clip(((y_lo - y0) / height).astype(np.int64), 0, n_slabs - 1)
+    s1 = np.clip(((y_hi - y0) / height).astype(np.int64), 0, n_slabs - 1)
+
+    counts = s1 - s0 + 1
+    edge = np.repeat(np.arange(len(ring)), counts)
+    slab = expand_ranges(s0, counts)
+    order = np.argsort(slab, kind='stable')
+    edge = edge[order]
+    slab_start = np.searchsorted(slab[order], np.arange(n_slabs + 1))
+
+    py = pts[:, 1]
+    inside = (py >= y0) & (py <= y0 + height * n_slabs)
+    q_slab = np.clip(((py - y0) / height).astype(np.int64), 0, n_slabs - 1)
+    q_counts = np.where(inside, slab_start[q_slab + 1] - slab_start[q_slab], 0)
+    query = np.repeat(np.arange(len(pts)), q_counts)
+    e = edge[expand_ranges(slab_start[q_slab], q_counts)]
+
+    x0 = ring[e, 0]
+    y0e = ring[e, 1]
+    x1 = nxt[e, 0]
+    y1 = nxt[e, 1]
+    px = pts[query, 0]
+    py = pts[query, 1]
+    side = (x1 - x0) * (py - y0e) - (px - x0) * (y1 - y0e)
+    up = (y0e <= py) & (y1 > py) & (side > 0)
+    down = (y0e > py) & (y1 <= py) & (side < 0)
+    return np.bincount(query, weights=up.astype(np.int64) - down.astype(np.int64),
+                       minlength=len(pts)).astype(np.int64)
+
+def _select_loops(raw, points, starts, tol):
+    '''
+        Returns the loops (packed as returned by _split_loops) that bound the region where
+        the winding number of the raw curve is one. A loop is such a boundary if the
+        winding number just to the left of it is one: crossing it from right to left
+        raises the winding number by one, so the right side is then zero.
+    '''
+    n = len(points)
+    counts = np.diff(np.append(starts, n))
+    loop_id = np.repeat(np.arange(len(starts)), counts)
+    nxt = np.arange(1, n + 1)
+    nxt[starts + counts - 1] = starts
+
+    # Drop repeated vertices (crossings that coincide with a vertex) and degenerate loops.
+    step = points[nxt] - points
+    length = np.hypot(step[:, 0], step[:, 1])
+    cross = points[:, 0] * points[nxt, 1] - points[nxt, 0] * points[:, 1]
+    area = 0.5 * np.bincount(loop_id, weights=cross, minlength=len(starts))
+    n_valid = np.bincount(loop_id, weights=length > tol, minlength=len(starts))
+    candidate = (n_valid >= 3) & (np.abs(area) > tol * tol)
+    if not candidate.any():
+        return []
+
+    # Sample just to the left of the longest edge of every loop.
+    order = np.lexsort((-length, loop_id))
+    longest = order[starts]
+    sample = points[longest] + 0.5 * step[longest] + \
+        1e-6 * np.column_stack((-step[longest, 1], step[longest, 0]))
+
+    ids = np.flatnonzero(candidate)
+    keep = ids[winding_numbers(raw, sample[ids]) == 1]
+    return [remove_duplicate_vertices(points[starts[i]:starts[i] + counts[i]], tol) for i in keep]
+
+def offset_polygon(pts, distance : float, join : str = JOIN_MITER, miter_limit : float = 2.0,
+                   arc_tolerance : float = None) -> list:
+    '''
+        Offsets the polygon by 'distance': positive values grow the polygon (outset),
+        negative values shrink it (inset). 'join' is one of 'miter', 'square' or 'round'
+        and determines the shape at vertices on the outer side of the offset. Miters that
+        are longer than 'miter_limit' times the distance are cut off square. Round joins
+        deviate at most 'arc_tolerance' (by default 1% of the distance) from a true arc.
+
+        Returns a list of (M, 2) arrays: one per resulting polygon, with the same
+        orientation as the input. Shrinking can split a polygon into several parts or
+        make it vanish (an empty list). Holes are returned with the opposite orientation.
+    '''
+    vertices = alg.as_vertex_array(pts)
+    if distance == 0:
+        return [vertices.copy()]
+
+    scale = float(np.abs(vertices).max()) if len(vertices) else 0.0
+    vertices = remove_duplicate_vertices(vertices, 1e-12 * scale)
+    if len(vertices) < 3:
+        return []
+
+    area = signed_area(vertices)
+    if area == 0:
+        return []
+    ccw = area > 0
+    if not ccw:
+        vertices = vertices[::-1]
+
+    if arc_tolerance is None:
+        arc_tolerance = 0.01 * abs(distance)
+    raw, simple = _joins(vertices, distance, join, miter_limit, arc_tolerance)
+
+    tol = 1e-12 * scale
+    if simple:
+        points, starts = raw, np.zeros(1, dtype=np.int64)
+    else:
+        points, starts = _split_loops(raw)
+    if len(starts) == 1:
+        # The raw curve doesn't cross itself, it's the result unless it is turned inside
+        # out (which happens when shrinking by more than the polygon is wide).
+        loop = remove_duplicate_vertices(points, tol)
+        if len(loop) < 3 or signed_area(loop) <= tol * tol:
+            return []
+        return [loop if ccw else loop[::-1]]
+
+    return [loop if ccw else loop[::-1] for loop in _select_loops(raw, points, starts, tol)]
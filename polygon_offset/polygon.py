@@ -0,0 +1,143 @@
+import numpy as np
+
+import algorithms as alg
+
+# A polygon stored as one contiguous (N, 2) float64 buffer instead of a list of Point
+# objects. Indexing a single vertex returns a PointView, which has the same x/y interface
+# as Point (so it can be passed to the Point based functions in algorithms) but reads and
+# writes the buffer directly. Vertex indices wrap around, so poly[i - 1] and poly[i + 1]
+# are the neighbours of vertex 'i' for every 'i', including the first and the last one.
+
+class PointView:
+    ''' A vertex of a Polygon, behaves like a Point. '''
+    __slots__ = ('_buf', '_idx')
+
+    def __init__(self, buf : np.ndarray, idx : int):
+        self._buf = buf
+        self._idx = idx
+
+    @property
+    def x(self) -> float:
+        return float(self._buf[self._idx, 0])
+
+    @x.setter
+    def x(self, value : float):
+        self._buf[self._idx, 0] = value
+
+    @property
+    def y(self) -> float:
+        return float(self._buf[self._idx, 1])
+
+    @y.setter
+    def y(self, value : float):
+        self._buf[self._idx, 1] = value
+
+    def to_point(self) -> alg.Point:
+        return alg.Point(self.x, self.y)
+
+    def __eq__(self, other):
+        if isinstance(other, (PointView, alg.Point)):
+            return self.x == other.x and self.y == other.y
+        return NotImplemented
+
+    def __repr__(self):
+        return f"PointView(x={self.x}, y={self.y})"
+
+class Polygon:
+    '''
+        Polygon backed by a contiguous (N, 2) float64 array. It can be created from a list
+        of Points (or PointViews), from anything that converts to an (N, 2) array, or from
+        another Polygon. Arrays are used as they are (without a copy) if they already have
+        the right type and layout, pass copy=True to get a polygon with its own buffer.
+
+        np.asarray(poly) returns the buffer itself, so the polygon can be handed to NumPy,
+        matplotlib and the array based functions in algorithms without a copy.
+    '''
+    __slots__ = ('_buf',)
+
+    def __init__(self, pts=(), copy : bool = False):
+        if isinstance(pts, Polygon):
+            buf = pts._buf
+        elif isinstance(pts, np.ndarray):
+            buf = alg.as_vertex_array(pts)
+        else:
+            pts = list(pts)
+            buf = alg.as_vertex_array(pts) if pts else np.empty((0, 2))
+        if copy or not buf.flags.c_contiguous:
+            buf = np.array(buf, dtype=np.float64, order='C')
+        self._buf = buf
+
+    @classmethod
+    def from_xy(cls, x, y) -> 'Polygon':
+        return cls(np.column_stack((x, y)))
+
+    @property
+    def vertices(self) -> np.ndarray:
+        ''' The (N, 2) buffer, changes to it change the polygon. '''
+        return self._buf
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._buf[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._buf[:, 1]
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or np.dtype(dtype) == self._buf.dtype:
+            return self._buf.copy() if copy else self._buf
+        return self._buf.astype(dtype)
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    def _wrap(self, idx) -> int:
+        if len(self._buf) == 0:
+            raise IndexError("index into an empty polygon")
+        return int(idx) % len(self._buf)
+
+    def __getitem__(self, idx):
+        '''
+            An integer index returns a PointView of the vertex and wraps around. A slice
+            returns a Polygon. A slice with a step of one shares the buffer (a view, like
+            NumPy slicing); other steps give a copy, as the buffer has to be contiguous.
+        '''
+        if isinstance(idx, slice):
+            return Polygon(self._buf[idx])
+        return PointView(self._buf, self._wrap(idx))
+
+    def __setitem__(self, idx, value):
+        if isinstance(value, (PointView, alg.Point)):
+            value = (value.x, value.y)
+        if isinstance(idx, slice):
+            self._buf[idx] = np.asarray(value)
+        else:
+            self._buf[self._wrap(idx)] = value
+
+    def __iter__(self):
+        for idx in range(len(self._buf)):
+            yield PointView(self._buf, idx)
+
+    def __eq__(self, other):
+        if isinstance(other, Polygon):
+            return np.array_equal(self._buf, other._buf)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Polygon({len(self)} vertices)"
+
+    def next_vertices(self) -> np.ndarray:
+        ''' Vertex i+1 for every vertex i (wrapping around). '''
+        return alg.next_vertices(self._buf)
+
+    def prev_vertices(self) -> np.ndarray:
+        ''' Vertex i-1 for every vertex i (wrapping around). '''
+        return alg.prev_vertices(self._buf)
+
+    def closed(self) -> np.ndarray:
+        ''' The vertices with the first one repeated at the end, e.g. for plotting. '''
+        return np.concatenate((self._buf, self._buf[:1]))
+
+    def to_points(self) -> list:
+        return [alg.Point(x, y) for x, y in self._buf.tolist()]
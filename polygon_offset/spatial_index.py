@@ -0,0 +1,285 @@
+import numpy as np
+
+import algorithms as alg
+from batch import pack_polygons
+import offset as off
+
+# Spatial index over the edges of a set of polygons.
+#
+# The edges are hashed into a uniform grid (see offset.grid_cell_size), on top of which a
+# pyramid of coarser grids is built: a cell of level k + 1 covers 2 x 2 cells of level k.
+# Every cell that holds at least one edge keeps one of them as a representative.
+#
+# A nearest edge query walks down the pyramid for all points of a batch at once. For each
+# point and each non-empty cell, the distance to the cell box is a lower bound for the
+# distance to the edges in it, and the distance to the representative edge is an upper
+# bound for the distance to the nearest edge. Cells whose lower bound exceeds the best
+# upper bound of the point are dropped before their children are visited, so only the
+# cells close to the nearest edge reach the finest level, where their edges are tested.
+# Unlike a search in rings of cells this doesn't visit the empty space around the point.
+#
+# Signed distances and point-in-polygon queries are answered from the nearest edge: a
+# point is inside if it lies on the inner side of its nearest edge. This assumes that the
+# polygons don't overlap, as is the case for a map of terrain regions or support polygons.
+
+class PolygonIndex:
+    '''
+        Index over a set of (non-overlapping) polygons for batched nearest edge, signed
+        distance and point-in-polygon queries. The polygons are either given packed
+        (vertices and offsets, see batch.py) or as a list with from_polygons. Their
+        orientation doesn't matter.
+    '''
+
+    def __init__(self, vertices : np.ndarray, offsets : np.ndarray):
+        vertices = np.ascontiguousarray(vertices, dtype=np.float64).reshape(-1, 2)
+        offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+        self._vertices = vertices
+        self._offsets = offsets
+
+        n = len(vertices)
+        counts = np.diff(offsets)
+        self._edge_polygon = np.repeat(np.arange(len(counts)), counts)
+        # Edge 'i' goes from vertex 'i' to the next vertex of the same polygon.
+        nxt = np.arange(1, n + 1)
+        nonempty = counts > 0
+        nxt[offsets[1:][nonempty] - 1] = offsets[:-1][nonempty]
+        prv = np.empty(n, dtype=np.int64)
+        prv[nxt] = np.arange(n)
+        self._next = nxt
+
+        # Normals pointing out of the polygon, whatever its orientation. calc_normal gives
+        # the left hand normal, which points inwards for a counter-clockwise polygon.
+        p0 = vertices
+        p1 = vertices[nxt]
+        step = p1 - p0
+        cross = p0[:, 0] * p1[:, 1] - p1[:, 0] * p0[:, 1]
+        area = np.bincount(self._edge_polygon, weights=cross, minlength=len(counts))
+        ccw = np.where(area[self._edge_polygon] >= 0, 1.0, -1.0)
+        length = np.hypot(step[:, 0], step[:, 1])
+        normals = np.zeros_like(step)
+        valid = length > 0
+        normals[valid, 0] = step[valid, 1] / length[valid]
+        normals[valid, 1] = -step[valid, 0] / length[valid]
+        normals *= ccw[:, None]
+        self._edge_normals = normals
+        # Pseudo normal of each vertex, for points whose nearest point is a vertex: it
+        # points out of the polygon at convex and at reflex vertices alike.
+        self._vertex_normals = normals + normals[prv]
+
+        # Flat per edge arrays for the distance computations of the queries.
+        self._edge_x = p0[:, 0].copy()
+        self._edge_y = p0[:, 1].copy()
+        self._edge_dx = step[:, 0].copy()
+        self._edge_dy = step[:, 1].copy()
+        with np.errstate(divide='ignore'):
+            self._edge_inv_len2 = np.where(valid, 1.0 / (length * length), 0.0)
+
+        self._build_grid(p0, p1)
+
+    @classmethod
+    def from_polygons(cls, polygons) -> 'PolygonIndex':
+        ''' Index over a list of polygons (lists of Points, (N, 2) arrays or Polygons). '''
+        return cls(*pack_polygons(polygons))
+
+    @property
+    def num_polygons(self) -> int:
+        return len(self._offsets) - 1
+
+    def _build_grid(self, p0, p1):
+        '''
+            Hashes the edges into the grid and builds the pyramid on top of it. Only
+            non-empty cells are stored: level k is a sorted array of cell keys (see
+            _cell_key) with a representative edge per cell. The edges of the cells of the
+            finest level are cell_edges[cell_start[i]:cell_start[i + 1]].
+        '''
+        m = len(p0)
+        self._levels = []
+        if m == 0:
+            self._origin = np.zeros(2)
+            self._cell = 1.0
+            return
+
+        lo_xy = np.minimum(p0, p1)
+        hi_xy = np.maximum(p0, p1)
+        origin = lo_xy.min(axis=0)
+        cell = off.grid_cell_size(lo_xy, hi_xy)
+        c0 = np.floor((lo_xy - origin) / cell).astype(np.int64)
+        c1 = np.floor((hi_xy - origin) / cell).astype(np.int64)
+
+        span = c1 - c0 + 1
+        counts = span[:, 0] * span[:, 1]
+        edge = np.repeat(np.arange(m), counts)
+        local = off.expand_ranges(np.zeros(m, dtype=np.int64), counts)
+        keys = PolygonIndex._cell_key(c0[edge, 0] + local % span[edge, 0],
+                                      c0[edge, 1] + local // span[edge, 0])
+
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        self._origin = origin
+        self._cell = cell
+        self._cell_edges = edge[order]
+        first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self._cell_start = np.append(first, len(keys))
+
+        keys = keys[first]
+        rep = self._cell_edges[first]
+        self._levels.append((keys, rep))
+        while len(keys) > 1:
+            parent = PolygonIndex._cell_key(PolygonIndex._cell_x(keys) >> 1,
+                                            PolygonIndex._cell_y(keys) >> 1)
+            order = np.argsort(parent, kind='stable')
+            parent = parent[order]
+            first = np.flatnonzero(np.r_[True, parent[1:] != parent[:-1]])
+            keys = parent[first]
+            rep = rep[order][first]
+            self._levels.append((keys, rep))
+
+    # Cells are identified by a single key. The grid has at most 4096 cells per axis (see
+    # offset.grid_cell_size), so both coordinates comfortably fit in 32 bits.
+    @staticmethod
+    def _cell_key(cx, cy):
+        return (cy << 32) | cx
+
+    @staticmethod
+    def _cell_x(keys):
+        return keys & 0xFFFFFFFF
+
+    @staticmethod
+    def _cell_y(keys):
+        return keys >> 32
+
+    def _segment_distance2(self, px, py, edges):
+        ''' Squared distance from each point to the edge with the same index, and the
+            parameter (0 to 1) of the closest point on the edge. '''
+        ex = self._edge_x[edges]
+        ey = self._edge_y[edges]
+        dx = self._edge_dx[edges]
+        dy = self._edge_dy[edges]
+        rx = px - ex
+        ry = py - ey
+        t = np.clip((rx * dx + ry * dy) * self._edge_inv_len2[edges], 0.0, 1.0)
+        rx -= t * dx
+        ry -= t * dy
+        return rx * rx + ry * ry, t
+
+    def nearest_edge(self, points) -> tuple:
+        '''
+            Finds the nearest polygon edge of each point. Returns (polygon, edge, closest,
+            distance): the index of the polygon, the index of the edge within that polygon
+            (edge 'i' connects vertex 'i' and 'i+1'), the closest point on the edge and the
+            (unsigned) distance to it. Without any polygons, polygon and edge are -1 and
+            the distance is infinite.
+        '''
+        edge, _, closest, dist = self._nearest(points)
+        found = edge >= 0
+        polygon = np.full(len(edge), -1, dtype=np.int64)
+        local = np.full(len(edge), -1, dtype=np.int64)
+        polygon[found] = self._edge_polygon[edge[found]]
+        local[found] = edge[found] - self._offsets[polygon[found]]
+        return polygon, local, closest, dist
+
+    def signed_distance(self, points) -> np.ndarray:
+        ''' Distance to the nearest polygon boundary, negative inside a polygon. '''
+        return self._signed(points)[1]
+
+    def locate(self, points) -> np.ndarray:
+        ''' Index of the polygon that contains each point, or -1. '''
+        edge, dist = self._signed(points)
+        inside = dist < 0
+        result = np.full(len(edge), -1, dtype=np.int64)
+        result[inside] = self._edge_polygon[edge[inside]]
+        return result
+
+    def _signed(self, points):
+        pts = alg.as_vertex_array(points).reshape(-1, 2)
+        edge, t, closest, dist = self._nearest(pts)
+        found = edge >= 0
+        e = edge[found]
+        rel = pts[found] - closest[found]
+        # The closest point is either inside the edge or one of its end points, in which
+        # case the pseudo normal of that vertex decides the side.
+        at_start = t[found] <= 0.0
+        at_end = t[found] >= 1.0
+        normal = self._edge_normals[e]
+        normal = np.where(at_start[:, None], self._vertex_normals[e], normal)
+        normal = np.where(at_end[:, None], self._vertex_normals[self._next[e]], normal)
+        side = np.einsum('ij,ij->i', rel, normal)
+        dist[found] = np.where(side < 0, -dist[found], dist[found])
+        return edge, dist
+
+    def _nearest(self, points):
+        pts = alg.as_vertex_array(points).reshape(-1, 2)
+        q = len(pts)
+        best_edge = np.full(q, -1, dtype=np.int64)
+        best_d2 = np.full(q, np.inf)
+        best_t = np.full(q, np.nan)
+        if q == 0 or not self._levels:
+            return best_edge, best_t, np.full((q, 2), np.nan), np.sqrt(best_d2)
+
+        pts_x = np.ascontiguousarray(pts[:, 0])
+        pts_y = np.ascontiguousarray(pts[:, 1])
+        # (point, cell) pairs that are still candidates, always grouped by point. The search
+        # starts at the single cell at the top of the pyramid.
+        query = np.arange(q)
+        cell_idx = np.zeros(q, dtype=np.int64)
+        bound = np.full(q, np.inf)  # best upper bound (squared) of each point
+
+        for level in range(len(self._levels) - 1, -1, -1):
+            keys, rep = self._levels[level]
+            if level < len(self._levels) - 1:
+                # Expand every pair to the non-empty children of its cell.
+                parent_keys = self._levels[level + 1][0][cell_idx]
+                px2 = 2 * PolygonIndex._cell_x(parent_keys)
+                py2 = 2 * PolygonIndex._cell_y(parent_keys)
+                child = PolygonIndex._cell_key(np.repeat(px2, 4) + np.tile([0, 1, 0, 1], len(px2)),
+                                               np.repeat(py2, 4) + np.tile([0, 0, 1, 1], len(py2)))
+                query = np.repeat(query, 4)
+                cell_idx = np.minimum(np.searchsorted(keys, child), len(keys) - 1)
+                exists = keys[cell_idx] == child
+                query = query[exists]
+                cell_idx = cell_idx[exists]
+                if len(query) == 0:
+                    break
+
+            size = self._cell * (1 << level)
+            cell_keys = keys[cell_idx]
+            px = pts_x[query]
+            py = pts_y[query]
+            x0 = self._origin[0] + size * PolygonIndex._cell_x(cell_keys)
+            y0 = self._origin[1] + size * PolygonIndex._cell_y(cell_keys)
+            gap_x = np.maximum(np.maximum(x0 - px, px - (x0 + size)), 0.0)
+            gap_y = np.maximum(np.maximum(y0 - py, py - (y0 + size)), 0.0)
+            lower = gap_x * gap_x + gap_y * gap_y
+            upper, _ = self._segment_distance2(px, py, rep[cell_idx])
+            groups = np.flatnonzero(np.r_[True, query[1:] != query[:-1]])
+            first = query[groups]
+            bound[first] = np.minimum(bound[first], np.minimum.reduceat(upper, groups))
+
+            keep = lower <= bound[query]
+            query = query[keep]
+            cell_idx = cell_idx[keep]
+
+        # Test the edges of the remaining cells of the finest level.
+        n_edges = self._cell_start[cell_idx + 1] - self._cell_start[cell_idx]
+        query = np.repeat(query, n_edges)
+        if len(query):
+            edge = self._cell_edges[off.expand_ranges(self._cell_start[cell_idx], n_edges)]
+            d2, t = self._segment_distance2(pts_x[query], pts_y[query], edge)
+
+            # The pairs are grouped by point, pick the best pair per group.
+            new_group = np.r_[True, query[1:] != query[:-1]]
+            group = np.cumsum(new_group) - 1
+            group_min = np.minimum.reduceat(d2, np.flatnonzero(new_group))
+            hits = np.flatnonzero(d2 == group_min[group])
+            first = hits[np.r_[True, group[hits][1:] != group[hits][:-1]]]
+            qi = query[first]
+            best_d2[qi] = d2[first]
+            best_edge[qi] = edge[first]
+            best_t[qi] = t[first]
+
+        found = best_edge >= 0
+        best_pt = np.full((q, 2), np.nan)
+        a = self._vertices[best_edge[found]]
+        b = self._vertices[self._next[best_edge[found]]]
+        best_pt[found] = a + best_t[found, None] * (b - a)
+        return best_edge, best_t, best_pt, np.sqrt(best_d2)
@@ -0,0 +1,205 @@
+import ctypes
+
+from OpenGL import GL
+from PyQt5.QtGui import QOpenGLBuffer, QOpenGLContext
+
+import pyqtgraph.opengl as gl
+from pyqtgraph.opengl import shaders
+import numpy as np
+
+
+class _Group(object):
+    ''' The meshes of one toggleable part of a BatchedMesh and their index ranges. '''
+
+    def __init__(self):
+        self.meshes = []
+        self.visible = True
+        # (first index, number of indices) in the face and edge index buffers
+        self.faces = (0, 0)
+        self.edges = (0, 0)
+
+
+class BatchedMesh(gl.GLGraphicsItem.GLGraphicsItem):
+    '''
+        All static meshes of an item (e.g. a robot link) in one vertex buffer. Every mesh
+        is added with its fixed transform relative to the item, which is applied to the
+        vertices once, so the whole batch is drawn with the transform of the item alone.
+
+        Meshes are added to named groups ('visuals', 'collisions', ...) that can be shown
+        and hidden separately. The vertices and indices of a group are contiguous, in the
+        order in which the groups were first used, so the shown groups are drawn with one
+        glDrawElements call per run of adjacent shown groups: one call for the faces and
+        one for the edges when everything is shown. The buffers are uploaded on the first
+        paint after the meshes changed.
+    '''
+
+    def __init__(self, parentItem=None, glOptions='translucent'):
+        gl.GLGraphicsItem.GLGraphicsItem.__init__(self, parentItem=parentItem)
+        self.setGLOptions(glOptions)
+
+        # group name -> _Group, in drawing order
+        self._groups = {}
+        self._dirty = False
+
+        # Merged data, built from the groups when the meshes changed
+        self.vertexes = None
+        self.colors = None
+        self.edgeColors = None
+        self.faces = None
+        self.edges = None
+
+        self.m_vbo_position = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+        self.m_vbo_color = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+        self.m_vbo_edgeColor = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+        self.m_ibo_faces = QOpenGLBuffer(QOpenGLBuffer.IndexBuffer)
+        self.m_ibo_edges = QOpenGLBuffer(QOpenGLBuffer.IndexBuffer)
+
+    def addMesh(self, group, vertexes, faces, color, transform=None, edge_color=None):
+        '''
+            Adds the triangle mesh ('vertexes' Nx3, 'faces' Mx3) to 'group'. 'transform' is
+            a 4x4 matrix applied to the vertices (the origin of the mesh in the item).
+            The edges are only drawn if an 'edge_color' is given.
+        '''
+        vertexes = np.asarray(vertexes, dtype=np.float64).reshape(-1, 3)
+        if transform is not None:
+            transform = np.asarray(transform, dtype=np.float64)
+            vertexes = vertexes @ transform[:3, :3].T + transform[:3, 3]
+        faces = np.asarray(faces, dtype=np.uint32).reshape(-1, 3)
+        edges = None
+        if edge_color is not None:
+            edges = gl.MeshData(vertexes=vertexes, faces=faces).edges().astype(np.uint32)
+        self._groups.setdefault(group, _Group()).meshes.append(
+            (vertexes.astype(np.float32), faces, color, edges, edge_color))
+        self._dirty = True
+        self.update()
+
+    def groups(self):
+        return list(self._groups)
+
+    def isGroupVisible(self, group):
+        return self._groups[group].visible
+
+    def setGroupVisible(self, group, visible):
+        self._groups[group].visible = visible
+        self.update()
+
+    def _build(self):
+        ''' Merges the meshes of all groups into the arrays that are uploaded. '''
+        vertexes = []
+        colors = []
+        edge_colors = []
+        faces = []
+        edges = []
+        num_vertexes = 0
+        num_faces = 0
+        num_edges = 0
+        for group in self._groups.values():
+            first_face = num_faces
+            first_edge = num_edges
+            for mesh_vertexes, mesh_faces, color, mesh_edges, edge_color in group.meshes:
+                count = len(mesh_vertexes)
+                vertexes.append(mesh_vertexes)
+                colors.append(np.tile(np.asarray(color, dtype=np.float32), (count, 1)))
+                edge_colors.append(np.tile(np.asarray(
+                    edge_color if edge_color is not None else color, dtype=np.float32),
+                    (count, 1)))
+                faces.append(mesh_faces.ravel() + num_vertexes)
+                num_faces += mesh_faces.size
+                if mesh_edges is not None:
+                    edges.append(mesh_edges.ravel() + num_vertexes)
+                    num_edges += mesh_edges.size
+                num_vertexes += count
+            group.faces = (first_face, num_faces - first_face)
+            group.edges = (first_edge, num_edges - first_edge)
+
+        def merged(arrays, shape, dtype):
+            return np.concatenate(arrays).astype(dtype) if arrays else np.zeros(shape, dtype)
+
+        self.vertexes = merged(vertexes, (0, 3), np.float32)
+        self.colors = merged(colors, (0, 4), np.float32)
+        self.edgeColors = merged(edge_colors, (0, 4), np.float32)
+        self.faces = merged(faces, (0,), np.uint32)
+        self.edges = merged(edges, (0,), np.uint32)
+
+    def _upload(self):
+        def upload_vbo(vbo, arr):
+            if not vbo.isCreated():
+                vbo.create()
+            vbo.bind()
+            vbo.allocate(arr, arr.nbytes)
+            vbo.release()
+
+        upload_vbo(self.m_vbo_position, self.vertexes)
+        upload_vbo(self.m_vbo_color, self.colors)
+        upload_vbo(self.m_vbo_edgeColor, self.edgeColors)
+        upload_vbo(self.m_ibo_faces, self.faces)
+        upload_vbo(self.m_ibo_edges, self.edges)
+
+    def drawRanges(self, kind):
+        '''
+            The (first, count) index ranges of the shown groups for 'kind' ('faces' or
+            'edges'), with adjacent ranges merged into one.
+        '''
+        ranges = []
+        for group in self._groups.values():
+            first, count = getattr(group, kind)
+            if not group.visible or count == 0:
+                continue
+            if ranges and ranges[-1][0] + ranges[-1][1] == first:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + count)
+            else:
+                ranges.append((first, count))
+        return ranges
+
+    def paint(self):
+        if self._dirty:
+            self._build()
+            self._dirty = False
+            if len(self.vertexes):
+                self._upload()
+        if self.vertexes is None or not len(self.vertexes):
+            return
+
+        self.setupGLState()
+
+        mat_mvp = np.array(self.mvpMatrix().data(), dtype=np.float32)
+        context = QOpenGLContext.currentContext()
+        es2_compat = context.hasExtension(b'GL_ARB_ES2_compatibility')
+        shader = shaders.getShaderProgram(None)
+        program = shader.program(es2_compat=es2_compat)
+
+        self._draw(shader, program, mat_mvp, GL.GL_TRIANGLES, self.m_vbo_color,
+                   self.m_ibo_faces, self.drawRanges('faces'))
+        self._draw(shader, program, mat_mvp, GL.GL_LINES, self.m_vbo_edgeColor,
+                   self.m_ibo_edges, self.drawRanges('edges'))
+
+    def _draw(self, shader, program, mat_mvp, mode, vbo_color, ibo, ranges):
+        if not ranges:
+            return
+
+        enabled_locs = []
+        if (loc := GL.glGetAttribLocation(program, "a_position")) != -1:
+            self.m_vbo_position.bind()
+            GL.glVertexAttribPointer(loc, 3, GL.GL_FLOAT, False, 0, None)
+            self.m_vbo_position.release()
+            enabled_locs.append(loc)
+        if (loc := GL.glGetAttribLocation(program, "a_color")) != -1:
+            vbo_color.bind()
+            GL.glVertexAttribPointer(loc, 4, GL.GL_FLOAT, False, 0, None)
+            vbo_color.release()
+            enabled_locs.append(loc)
+
+        for loc in enabled_locs:
+            GL.glEnableVertexAttribArray(loc)
+
+        with shader:
+            loc = GL.glGetUniformLocation(program, "u_mvp")
+            GL.glUniformMatrix4fv(loc, 1, False, mat_mvp)
+            ibo.bind()
+            for first, count in ranges:
+                GL.glDrawElements(mode, count, GL.GL_UNSIGNED_INT,
+                                  ctypes.c_void_p(first * np.dtype(np.uint32).itemsize))
+            ibo.release()
+
+        for loc in enabled_locs:
+            GL.glDisableVertexAttribArray(loc)
@@ -11,6 +11,7 @@ import math
 import os
 
 import utils
+from batched_mesh import BatchedMesh
 
 import trimesh
 
@@ -31,7 +32,21 @@ class RobotLink(gl.GLGraphicsItem.GLGraphicsItem):
         self._static_transform = QMatrix4x4()
         self._pos = 0
 
-        self.visuals = []
+        # All static geometry of the link (visuals, collisions, the CoM sphere and the
+        # inertia ellipsoid) is merged into one vertex buffer that is drawn with the
+        # transform of the link. Each kind is a group that can be shown and hidden.
+        self.mesh = BatchedMesh(parentItem=self, glOptions=__DEFAULT_GL_OPT__)
+
+        # Add a sphere representing the mass of the link (at the CoM location)
+        # The sphere radius is determined using a representative sphere with the density of lead
+        # It is added first, so it is drawn first like the separate sphere item was (with
+        # a lower depth value).
+        lead_volume = link_info.inertial.mass / __LEAD_DENSITY__
+        lead_radius = (lead_volume * 3 / 4 / math.pi) ** (1/3)
+        sphere = gl.MeshData.sphere(rows=10, cols=10, radius=lead_radius)
+        self.mesh.addMesh('com', sphere.vertexes(), sphere.faces(), (0., 0., 1., 0.9),
+                          link_info.inertial.origin)
+
         for visual in link_info.visuals:
             color = [0.7, 0.7, 0.7, 1.0]
             opt='opaque'
@@ -41,15 +56,9 @@ class RobotLink(gl.GLGraphicsItem.GLGraphicsItem):
                     opt='translucent'
             edge_color = 0.8 * np.array(color)  # Make the edge colors slightly darker than the face colors
             for mesh in visual.geometry.meshes:
-                mesh_data = gl.MeshData(vertexes=mesh.vertices, faces=mesh.faces)
-                mesh = gl.GLMeshItem(meshdata=mesh_data, drawEdges=True, color=color, edgeColor=edge_color, \
-                                     glOptions='translucent') #, shader='shaded')
-                mesh.setGLOptions(__DEFAULT_GL_OPT__)
-                mesh.setTransform(visual.origin)
-                mesh.setParentItem(self)
-                self.visuals.append(mesh)
-
-        self.collisions = []
+                self.mesh.addMesh('visuals', mesh.vertices, mesh.faces, color, visual.origin,
+                                  edge_color=edge_color)
+
         for collision in link_info.collisions:
             print(collision.name, collision.origin, collision.geometry)
             color = [0.0, 0.5, 0.0, 0.8]
@@ -67,41 +76,26 @@ class RobotLink(gl.GLGraphicsItem.GLGraphicsItem):
                 )]
 
             for mesh in collision.geometry.meshes:
-                mesh_data = gl.MeshData(vertexes=mesh.vertices, faces=mesh.faces)
-                mesh = gl.GLMeshItem(meshdata=mesh_data, drawEdges=True, color=color, edgeColor=edge_color, \
-                                     glOptions='translucent') #, shader='shaded')
-                mesh.setGLOptions(__DEFAULT_GL_OPT__)
-                mesh.setTransform(collision.origin)
-                mesh.setParentItem(self)
-                self.collisions.append(mesh)
-
-        # Add a sphere representing the mass of the link (at the CoM location)
-        # The sphere radius is determined using a representative sphere with the density of lead
-        lead_volume = link_info.inertial.mass / __LEAD_DENSITY__
-        lead_radius = (lead_volume * 3 / 4 / math.pi) ** (1/3)
-        self.com = utils.createSphere(radius=lead_radius, color=(0., 0., 1., 0.9))
-        self.com.setParentItem(self)
-        self.com.setTransform(link_info.inertial.origin)
-        self.com.setGLOptions(__DEFAULT_GL_OPT__)
-        self.com.setDepthValue(-20)
+                self.mesh.addMesh('collisions', mesh.vertices, mesh.faces, color,
+                                  collision.origin, edge_color=edge_color)
 
         # Add an ellipsoid representing the inertia of the link (at the CoM location)
         # First, we must compute the principle axes and principle moments of inertia of the
         # inertia tensor
         I_principal, I_axes = np.linalg.eig(link_info.inertial.inertia)
 
-        self.inertia = utils.createSphere(radius=1, color=(1., 0, 0, 0.6))
-        self.inertia.setParentItem(self)
-        self.inertia.setTransform(link_info.inertial.origin)
         ellipsoid_inertia = math.sqrt(10 / link_info.inertial.mass) * np.sqrt(
             np.array([-I_principal[0] + I_principal[1] + I_principal[2],
                        I_principal[0] - I_principal[1] + I_principal[2],
                        I_principal[0] + I_principal[1] - I_principal[2]])) / 2
-        self.inertia.scale(*ellipsoid_inertia)
         R = np.eye(4)
         R[:3,:3] = I_axes.T
-        #self.inertia.applyTransform(pg.Transform3D(*R.ravel()), False)
-        self.inertia.setGLOptions(__DEFAULT_GL_OPT__)
+        #ellipsoid = R @ ellipsoid
+        # A unit sphere, scaled in the frame of the CoM
+        ellipsoid = link_info.inertial.origin @ np.diag([*ellipsoid_inertia, 1])
+        sphere = gl.MeshData.sphere(rows=10, cols=10, radius=1)
+        self.mesh.addMesh('inertia', sphere.vertexes(), sphere.faces(), (1., 0, 0, 0.6),
+                          ellipsoid)
 
         self.axis = utils.createAxis(size=0.2)
         self.axis.setParentItem(self)
@@ -141,7 +135,10 @@ class RobotLink(gl.GLGraphicsItem.GLGraphicsItem):
         self.applyTransform(j_transform, local=True)
 
     def hideObj(self, name):
-        obj = getattr(self, name)
+        if name in self.mesh.groups():
+            self.mesh.setGroupVisible(name, False)
+            return
+        obj = getattr(self, name, None)
         if obj:
             try:
                 obj.hide()
@@ -152,7 +149,10 @@ class RobotLink(gl.GLGraphicsItem.GLGraphicsItem):
             print(f"Object attribute '{name}' not valid!")
 
     def showObj(self, name):
-        obj = getattr(self, name)
+        if name in self.mesh.groups():
+            self.mesh.setGroupVisible(name, True)
+            return
+        obj = getattr(self, name, None)
         if obj:
             try:
                 obj.show()